@@ -1,5 +1,12 @@
-from typing import Dict, List
+import json
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional
 from enum import Enum
+from models.achievement_rules import (
+    BALANCE, LEVEL, COMPLETED_GOALS, DEPOSIT_STREAK_DAYS, WEEKLY_DEPOSIT_STREAK, ALL_FIELDS,
+    RuleContext, compile_condition, threshold_of
+)
 
 class AchievementType(Enum):
     FIRST_DEPOSIT = "first_deposit"
@@ -8,19 +15,43 @@ class AchievementType(Enum):
     CONSISTENCY = "consistency"
     LEVEL_UP = "level_up"
 
+class _ThresholdIndex:
+    """Achievements for one field kept sorted by the value that unlocks them"""
+
+    def __init__(self):
+        # Parallel sorted arrays: met when value >= threshold / value > threshold
+        self.inclusive_thresholds, self.inclusive_ids = [], []
+        self.strict_thresholds, self.strict_ids = [], []
+
+    def add(self, threshold, achievement_id: str, strict: bool = False):
+        thresholds = self.strict_thresholds if strict else self.inclusive_thresholds
+        ids = self.strict_ids if strict else self.inclusive_ids
+        position = bisect_right(thresholds, threshold)
+        thresholds.insert(position, threshold)
+        ids.insert(position, achievement_id)
+
+    def reached(self, value) -> List[str]:
+        """Get ids of every achievement whose threshold value has crossed"""
+        return (self.inclusive_ids[:bisect_right(self.inclusive_thresholds, value)]
+                + self.strict_ids[:bisect_left(self.strict_thresholds, value)])
+
 class Achievement:
+    __slots__ = ('achievement_id', 'title', 'description', 'points_reward',
+                 'achievement_type', 'requirements', 'condition')
+    
     def __init__(self, achievement_id: str, title: str, description: str, 
                  points_reward: int, achievement_type: AchievementType, 
-                 requirements: Dict = None):
+                 requirements: Dict = None, condition: Dict = None):
         self.achievement_id = achievement_id
         self.title = title
         self.description = description
         self.points_reward = points_reward
         self.achievement_type = achievement_type
         self.requirements = requirements or {}
+        self.condition = condition
     
     def to_dict(self) -> Dict:
-        return {
+        data = {
             'achievement_id': self.achievement_id,
             'title': self.title,
             'description': self.description,
@@ -28,10 +59,54 @@ class Achievement:
             'achievement_type': self.achievement_type.value,
             'requirements': self.requirements
         }
+        if self.condition is not None:
+            data['condition'] = self.condition
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict):
+        return cls(
+            data['achievement_id'],
+            data['title'],
+            data['description'],
+            data['points_reward'],
+            AchievementType(data['achievement_type']),
+            data.get('requirements'),
+            data.get('condition')
+        )
+    
+    def effective_condition(self) -> Optional[Dict]:
+        """Get the declarative condition, deriving one from the type if unset"""
+        if self.condition is not None:
+            return self.condition
+        if self.achievement_type == AchievementType.FIRST_DEPOSIT:
+            return {"field": BALANCE, "op": ">", "value": 0}
+        elif self.achievement_type == AchievementType.SAVINGS_MILESTONE:
+            return {"field": BALANCE, "op": ">=", "value": self.requirements.get("amount", 0)}
+        elif self.achievement_type == AchievementType.GOAL_COMPLETION:
+            return {"field": COMPLETED_GOALS, "op": ">=", "value": self.requirements.get("count", 1)}
+        elif self.achievement_type == AchievementType.LEVEL_UP:
+            return {"field": LEVEL, "op": ">=", "value": self.requirements.get("level", 0)}
+        elif self.achievement_type == AchievementType.CONSISTENCY:
+            if "weeks" in self.requirements:
+                return {"field": WEEKLY_DEPOSIT_STREAK, "op": ">=", "value": self.requirements["weeks"]}
+            return {"field": DEPOSIT_STREAK_DAYS, "op": ">=", "value": self.requirements.get("days", 1)}
+        return None
 
 class AchievementManager:
-    def __init__(self):
-        self.achievements = self._create_default_achievements()
+    def __init__(self, catalogue_file: str = None):
+        self.achievements = []
+        self._by_id = {}
+        self._order = {}
+        self._predicates = {}
+        self._indexes = {}  # field -> _ThresholdIndex for single lower-bound conditions
+        self._rules = []    # (achievement_id, predicate, fields) for everything else
+        if catalogue_file:
+            achievements = self.load_catalogue(catalogue_file)
+        else:
+            achievements = self._create_default_achievements()
+        for achievement in achievements:
+            self.add_achievement(achievement)
     
     def _create_default_achievements(self) -> List[Achievement]:
         """Create default achievements"""
@@ -75,44 +150,130 @@ class AchievementManager:
                 "Reach Level 10", 500, 
                 AchievementType.LEVEL_UP,
                 {"level": 10}
+            ),
+            Achievement(
+                "streak_7", "Week Warrior", 
+                "Deposit 7 days in a row", 150, 
+                AchievementType.CONSISTENCY,
+                {"days": 7}
+            ),
+            Achievement(
+                "weekly_4", "Steady Saver", 
+                "Save every week for a month", 200, 
+                AchievementType.CONSISTENCY,
+                {"weeks": 4}
             )
         ]
     
+    @staticmethod
+    def load_catalogue(catalogue_file: str) -> List[Achievement]:
+        """Load and validate achievements from a JSON catalogue file"""
+        with open(catalogue_file, 'r') as f:
+            catalogue = json.load(f)
+        
+        achievements = []
+        for data in catalogue.get("achievements", []):
+            try:
+                achievement = Achievement.from_dict(data)
+                condition = achievement.effective_condition()
+                if condition is not None:
+                    compile_condition(condition)
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Invalid achievement {data.get('achievement_id', '?')}: {e}") from e
+            achievements.append(achievement)
+        return achievements
+    
+    def add_achievement(self, achievement: Achievement):
+        """Register an achievement and compile or index its condition"""
+        self._by_id[achievement.achievement_id] = achievement
+        self._order[achievement.achievement_id] = len(self.achievements)
+        self.achievements.append(achievement)
+        
+        condition = achievement.effective_condition()
+        if condition is None:
+            return
+        predicate, fields = compile_condition(condition)
+        self._predicates[achievement.achievement_id] = predicate
+        
+        threshold = threshold_of(condition)
+        if threshold:
+            field, value, strict = threshold
+            self._indexes.setdefault(field, _ThresholdIndex()).add(value, achievement.achievement_id, strict)
+        else:
+            self._rules.append((achievement.achievement_id, predicate, fields))
+    
     def get_achievement(self, achievement_id: str) -> Achievement:
         """Get achievement by ID"""
-        for achievement in self.achievements:
-            if achievement.achievement_id == achievement_id:
-                return achievement
-        return None
+        return self._by_id.get(achievement_id)
     
-    def check_achievements(self, user, goals: List) -> List[str]:
-        """Check which achievements user has earned"""
-        earned_achievements = []
+    def check_achievements(self, user, goals: List,
+                           changed_fields: Optional[Iterable[str]] = None) -> List[str]:
+        """Check which achievements user has earned
+
+        Only achievements depending on changed_fields are evaluated; by default
+        every field is checked.
+        """
+        context = RuleContext(user, goals)
+        fields = None if changed_fields is None else set(changed_fields)
+        owned = set(user.achievements)
+        earned_achievements = set()
         
-        for achievement in self.achievements:
-            if achievement.achievement_id in user.achievements:
-                continue  # Already earned
-            
-            if self._check_achievement_condition(user, goals, achievement):
-                earned_achievements.append(achievement.achievement_id)
+        for field, index in self._indexes.items():
+            if fields is None or field in fields:
+                for achievement_id in index.reached(context.get(field)):
+                    if achievement_id not in owned:
+                        earned_achievements.add(achievement_id)
         
-        return earned_achievements
-    
-    def _check_achievement_condition(self, user, goals, achievement: Achievement) -> bool:
-        """Check if user meets achievement requirements"""
-        if achievement.achievement_type == AchievementType.FIRST_DEPOSIT:
-            return user.balance > 0
+        for achievement_id, predicate, rule_fields in self._rules:
+            if achievement_id in owned or achievement_id in earned_achievements:
+                continue
+            if (fields is None or not fields.isdisjoint(rule_fields)) and predicate(context):
+                earned_achievements.add(achievement_id)
         
-        elif achievement.achievement_type == AchievementType.SAVINGS_MILESTONE:
-            required_amount = achievement.requirements.get("amount", 0)
-            return user.balance >= required_amount
+        return sorted(earned_achievements, key=self._order.get)
+    
+    def award_achievements(self, user, goals: List,
+                           changed_fields: Optional[Iterable[str]] = None) -> List[Achievement]:
+        """Award every newly earned achievement to user in place, including its points"""
+        earned_achievement_ids = self.check_achievements(user, goals, changed_fields)
         
-        elif achievement.achievement_type == AchievementType.GOAL_COMPLETION:
-            completed_goals = [g for g in goals if g.user_id == user.user_id and g.is_completed]
-            return len(completed_goals) > 0
+        awarded_achievements = []
+        while earned_achievement_ids:
+            level_before = user.level
+            for achievement_id in earned_achievement_ids:
+                achievement = self.get_achievement(achievement_id)
+                if achievement and user.add_achievement(achievement_id):
+                    user.add_points(achievement.points_reward)
+                    awarded_achievements.append(achievement)
+            # Reward points can unlock level achievements in the same pass
+            earned_achievement_ids = []
+            if user.level > level_before:
+                earned_achievement_ids = self.check_achievements(user, goals, [LEVEL])
         
-        elif achievement.achievement_type == AchievementType.LEVEL_UP:
-            required_level = achievement.requirements.get("level", 0)
-            return user.level >= required_level
+        return awarded_achievements
+    
+    def _check_achievement_condition(self, user, goals, achievement: Achievement) -> bool:
+        """Check if user meets achievement requirements"""
+        predicate = self._predicates.get(achievement.achievement_id)
+        if predicate is None:
+            condition = achievement.effective_condition()
+            if condition is None:
+                return False
+            predicate, _ = compile_condition(condition)
+        return predicate(RuleContext(user, goals))
+    
+    def profile_rules(self, users: List, goals: List, repeat: int = 10) -> Dict[str, float]:
+        """Get mean seconds per evaluation of each achievement over sample users"""
+        contexts = [RuleContext(user, goals) for user in users]
+        for context in contexts:
+            for field in ALL_FIELDS[:-1]:
+                context.get(field)  # Warm field values so only the predicate is timed
         
-        return False
+        timings = {}
+        for achievement_id, predicate in self._predicates.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for context in contexts:
+                    predicate(context)
+            timings[achievement_id] = (time.perf_counter() - start) / (repeat * max(len(contexts), 1))
+        return timings
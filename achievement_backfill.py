@@ -0,0 +1,174 @@
+# controllers/achievement_backfill.py
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from models.user import User
+from models.savings_goal import SavingsGoal
+from models.achievement import AchievementManager
+from utils.database import ConcurrentUpdateError
+from utils.metrics import METRICS
+
+Chunk = List[Tuple[Dict, List[Dict]]]
+Earned = List[Tuple[str, List[str]]]  # (user_id, achievement ids newly earned)
+
+# Transaction attempts before a chunk that keeps losing to other writers gives up
+MAX_CHUNK_ATTEMPTS = 5
+
+_worker_manager = None
+
+
+def _init_worker(catalogue_file: Optional[str]):
+    global _worker_manager
+    _worker_manager = AchievementManager(catalogue_file)
+
+
+def _evaluate_chunk(chunk: Chunk, manager: AchievementManager = None) -> Earned:
+    """Evaluate a chunk of users, getting the achievement ids each newly earned"""
+    manager = manager or _worker_manager
+    earned = []
+    for user_data, goal_data in chunk:
+        user = User.from_dict(dict(user_data, achievements=list(user_data['achievements'])))
+        goals = [SavingsGoal.from_dict(g) for g in goal_data]
+        awarded = manager.award_achievements(user, goals)
+        if awarded:
+            earned.append((user.user_id, [a.achievement_id for a in awarded]))
+    return earned
+
+
+class AchievementBackfill:
+    """Re-evaluate the achievement catalogue for every stored user
+
+    Users are streamed from the database in its storage order and evaluated in
+    chunks, optionally across a process pool. Each chunk's awards are written
+    back in one transaction, after which a checkpoint records the last user_id
+    so an interrupted run can resume where it stopped. Writes re-read each
+    user and add only the newly earned achievements and their points with
+    compare-and-swap, so changes made while a chunk was evaluated are kept.
+    """
+
+    def __init__(self, db, catalogue_file: str = None, chunk_size: int = 500,
+                 workers: int = 0, checkpoint_file: str = None):
+        self.db = db
+        self.catalogue_file = catalogue_file
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.checkpoint_file = checkpoint_file
+
+    def _load_checkpoint(self) -> Dict:
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)
+        return {"last_user_id": None, "users": 0, "awarded_users": 0}
+
+    def _save_checkpoint(self, checkpoint: Dict):
+        if not self.checkpoint_file:
+            return
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def _chunks(self, after_user_id: Optional[str]) -> Iterator[Chunk]:
+        records = self.db.iter_user_records(after_user_id)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _results(self, chunks: Iterator[Chunk]) -> Iterator[Tuple[Chunk, Earned]]:
+        """Yield (chunk, earned achievements) in order, evaluating in a pool if configured"""
+        if self.workers <= 0:
+            manager = AchievementManager(self.catalogue_file)
+            for chunk in chunks:
+                yield chunk, _evaluate_chunk(chunk, manager)
+            return
+
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.catalogue_file,)) as pool:
+            # Keep a bounded window in flight so users are never all in memory
+            in_flight = []
+            for chunk in chunks:
+                in_flight.append((chunk, pool.submit(_evaluate_chunk, chunk)))
+                if len(in_flight) >= self.workers * 2:
+                    chunk, future = in_flight.pop(0)
+                    yield chunk, future.result()
+            for chunk, future in in_flight:
+                yield chunk, future.result()
+
+    def _apply(self, manager: AchievementManager, earned: Earned):
+        """Add a chunk's earned achievements and their points in one transaction, retried on conflicts"""
+        for attempt in range(MAX_CHUNK_ATTEMPTS):
+            try:
+                with self.db.transaction():
+                    for user_id, achievement_ids in earned:
+                        user = self.db.get_user_for_update(user_id)
+                        if user is None:
+                            continue
+                        # Points added since the scan stay; only the awards are applied again
+                        added = [a for a in achievement_ids if user.add_achievement(a)]
+                        for achievement_id in added:
+                            user.add_points(manager.get_achievement(achievement_id).points_reward)
+                        if added:
+                            self.db.compare_and_swap_user(user)
+                return
+            except ConcurrentUpdateError:
+                if attempt == MAX_CHUNK_ATTEMPTS - 1:
+                    raise
+                METRICS.increment("backfill.chunk_conflicts")
+
+    def run(self) -> Dict:
+        """Run or resume the backfill and get throughput statistics"""
+        checkpoint = self._load_checkpoint()
+        manager = AchievementManager(self.catalogue_file)
+        processed = 0
+        start = time.perf_counter()
+
+        for chunk, earned in self._results(self._chunks(checkpoint["last_user_id"])):
+            self._apply(manager, earned)
+            processed += len(chunk)
+            checkpoint["last_user_id"] = chunk[-1][0]['user_id']
+            checkpoint["users"] += len(chunk)
+            checkpoint["awarded_users"] += len(earned)
+            self._save_checkpoint(checkpoint)
+
+        elapsed = time.perf_counter() - start
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)  # Finished; the next run starts over
+        return {
+            "users": processed,
+            "total_users": checkpoint["users"],
+            "awarded_users": checkpoint["awarded_users"],
+            "seconds": elapsed,
+            "users_per_second": processed / elapsed if elapsed else 0.0
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    from utils.database import Database
+    from utils.metrics import configure_from_env
+
+    # Database files have a single owning process and nothing guards them across
+    # processes, so stop any server using data_file before running this
+    parser = argparse.ArgumentParser(description="Award achievements to every stored user. "
+                                                 "Stop any server using the data file first.")
+    parser.add_argument("data_file", nargs="?", default="data/savings_data.json")
+    parser.add_argument("--catalogue", help="JSON achievement catalogue (defaults to built-ins)")
+    parser.add_argument("--workers", type=int, default=0, help="process pool size (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default="data/achievement_backfill.checkpoint")
+    args = parser.parse_args()
+    configure_from_env()
+
+    db = Database(args.data_file, journaled=True)
+    try:
+        stats = AchievementBackfill(db, args.catalogue, args.chunk_size,
+                                    args.workers, args.checkpoint).run()
+    finally:
+        db.close()
+    print(f"Processed {stats['users']} users ({stats['awarded_users']} awarded) "
+          f"in {stats['seconds']:.2f}s: {stats['users_per_second']:.0f} users/sec")
@@ -0,0 +1,213 @@
+# models/achievement_rules.py
+import operator
+import time
+from typing import Callable, Dict, FrozenSet, List, Tuple
+from models.money import to_dollars
+
+# Fields an achievement condition can depend on
+BALANCE = "balance"
+LEVEL = "level"
+TOTAL_POINTS = "total_points"
+ACHIEVEMENT_COUNT = "achievement_count"
+DEPOSIT_STREAK_DAYS = "deposit_streak_days"
+WEEKLY_DEPOSIT_STREAK = "weekly_deposit_streak"
+COMPLETED_GOALS = "completed_goals"
+ACTIVE_GOALS = "active_goals"
+GOAL_COUNT = "goal_count"
+TOTAL_SAVED = "total_saved"
+TOTAL_TARGET = "total_target"
+GOALS = "goals"  # Any per-goal condition (any_goal / all_goals)
+
+USER_FIELDS = {
+    BALANCE: lambda user: user.balance,
+    LEVEL: lambda user: user.level,
+    TOTAL_POINTS: lambda user: user.total_points,
+    ACHIEVEMENT_COUNT: lambda user: len(user.achievements),
+    DEPOSIT_STREAK_DAYS: lambda user: user.deposit_streak_days,
+    WEEKLY_DEPOSIT_STREAK: lambda user: user.weekly_deposit_streak,
+}
+
+GOAL_AGGREGATES = {
+    COMPLETED_GOALS: lambda goals: sum(1 for g in goals if g.is_completed),
+    ACTIVE_GOALS: lambda goals: sum(1 for g in goals if not g.is_completed),
+    GOAL_COUNT: len,
+    # Money fields are summed in cents and compared in dollars, like the catalogue
+    TOTAL_SAVED: lambda goals: to_dollars(sum(g.current_cents for g in goals)),
+    TOTAL_TARGET: lambda goals: to_dollars(sum(g.target_cents for g in goals)),
+}
+
+GOAL_FIELDS = {
+    "target_amount": lambda goal: goal.target_amount,
+    "current_amount": lambda goal: goal.current_amount,
+    "progress_percentage": lambda goal: goal.get_progress_percentage(),
+    "days_remaining": lambda goal: goal.days_remaining(),
+    "is_completed": lambda goal: goal.is_completed,
+    "completed_on_time": lambda goal: goal.completed_on_time(),
+}
+
+ALL_FIELDS = tuple(USER_FIELDS) + tuple(GOAL_AGGREGATES) + (GOALS,)
+GOAL_DEPENDENCIES = frozenset(GOAL_AGGREGATES) | {GOALS}
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+Predicate = Callable[["RuleContext"], bool]
+
+# Longest all/any list compiled into nested calls rather than a generator
+MAX_CHAINED_PREDICATES = 16
+
+
+class RuleContext:
+    """Field values for one user, each computed at most once per check"""
+
+    def __init__(self, user, goals: List):
+        self.user = user
+        self.goals = [g for g in goals if g.user_id == user.user_id]
+        self._values = {}
+
+    def get(self, field: str):
+        value = self._values.get(field)
+        if value is None:
+            getter = USER_FIELDS.get(field)
+            value = getter(self.user) if getter else GOAL_AGGREGATES[field](self.goals)
+            self._values[field] = value
+        return value
+
+
+def needs_goals(fields) -> bool:
+    """Check whether evaluating fields requires the user's goals"""
+    return fields is None or any(field in GOAL_DEPENDENCIES for field in fields)
+
+
+def threshold_of(condition: Dict):
+    """Get (field, threshold, strict) if condition is a single numeric lower bound"""
+    if not isinstance(condition, dict) or set(condition) != {"field", "op", "value"}:
+        return None
+    if condition["field"] not in USER_FIELDS and condition["field"] not in GOAL_AGGREGATES:
+        return None
+    value = condition["value"]
+    if condition["op"] not in (">=", ">") or isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return condition["field"], value, condition["op"] == ">"
+
+
+def compile_condition(condition: Dict) -> Tuple[Predicate, FrozenSet[str]]:
+    """Compile a declarative condition into a predicate and the fields it reads
+
+    A condition is a leaf {"field", "op", "value"}, a combinator
+    {"all": [...]}, {"any": [...]}, {"not": {...}}, or a goal quantifier
+    {"any_goal": {...}} / {"all_goals": {...}} whose leaves use goal fields.
+    """
+    if not isinstance(condition, dict):
+        raise ValueError(f"Condition must be an object, got {condition!r}")
+
+    if "all" in condition or "any" in condition:
+        compiled = [compile_condition(c) for c in condition["all" if "all" in condition else "any"]]
+        fields = frozenset().union(*(f for _, f in compiled))
+        return _chain([p for p, _ in compiled], "all" in condition), fields
+
+    if "not" in condition:
+        inner, fields = compile_condition(condition["not"])
+        return (lambda ctx: not inner(ctx)), fields
+
+    if "any_goal" in condition or "all_goals" in condition:
+        quantifier = any if "any_goal" in condition else all
+        goal_predicate = _compile_goal_condition(condition["any_goal" if "any_goal" in condition else "all_goals"])
+        return (lambda ctx: quantifier(map(goal_predicate, ctx.goals))), frozenset([GOALS])
+
+    field, compare, value = _compile_leaf(condition, ALL_FIELDS[:-1])
+    return (lambda ctx: compare(ctx.get(field), value)), frozenset([field])
+
+
+def _compile_goal_condition(condition: Dict) -> Callable:
+    if not isinstance(condition, dict):
+        raise ValueError(f"Goal condition must be an object, got {condition!r}")
+
+    if "all" in condition or "any" in condition:
+        predicates = [_compile_goal_condition(c) for c in condition["all" if "all" in condition else "any"]]
+        return _chain(predicates, "all" in condition)
+
+    if "not" in condition:
+        inner = _compile_goal_condition(condition["not"])
+        return lambda goal: not inner(goal)
+
+    field, compare, value = _compile_leaf(condition, tuple(GOAL_FIELDS))
+    getter = GOAL_FIELDS[field]
+    return lambda goal: compare(getter(goal), value)
+
+
+def _chain(predicates: List[Callable], conjunction: bool) -> Callable:
+    """Join predicates with and/or into one closure
+
+    Short lists become nested short-circuiting calls, avoiding the
+    generator all()/any() needs on every evaluation; long ones keep the
+    generator so evaluation never nests deeply.
+    """
+    if not predicates or len(predicates) > MAX_CHAINED_PREDICATES:
+        combine = all if conjunction else any
+        return lambda x: combine(p(x) for p in predicates)
+    chained = predicates[-1]
+    for predicate in reversed(predicates[:-1]):
+        if conjunction:
+            chained = (lambda first, rest: lambda x: first(x) and rest(x))(predicate, chained)
+        else:
+            chained = (lambda first, rest: lambda x: first(x) or rest(x))(predicate, chained)
+    return chained
+
+
+def _compile_leaf(condition: Dict, allowed_fields) -> Tuple[str, Callable, object]:
+    missing = {"field", "op", "value"} - set(condition)
+    if missing:
+        raise ValueError(f"Condition {condition!r} is missing {', '.join(sorted(missing))}")
+    if condition["field"] not in allowed_fields:
+        raise ValueError(f"Unknown field '{condition['field']}'")
+    if condition["op"] not in OPERATORS:
+        raise ValueError(f"Unknown operator '{condition['op']}'")
+    return condition["field"], OPERATORS[condition["op"]], condition["value"]
+
+
+def main(argv: List[str]) -> int:
+    """Validate a catalogue file and report evaluation time per rule"""
+    from models.achievement import AchievementManager
+    from models.user import User
+
+    if not argv:
+        print("Usage: achievement_rules.py CATALOGUE.json [SAMPLE_USERS]")
+        return 2
+    try:
+        manager = AchievementManager(argv[0])
+    except (OSError, ValueError) as e:
+        print(f"Invalid catalogue: {e}")
+        return 1
+
+    users = []
+    for i in range(int(argv[1]) if len(argv) > 1 else 1000):
+        user = User(f"user{i}", f"user{i}@example.com")
+        user.balance_cents = i * 7 % 5000 * 100
+        user.total_points = i * 13 % 20000
+        user.level = user.calculate_level()
+        users.append(user)
+
+    timings = manager.profile_rules(users, [])
+    for achievement_id, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"{achievement_id:<40} {seconds * 1e6:8.3f} us")
+
+    start = time.perf_counter()
+    for user in users:
+        manager.check_achievements(user, [])
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(manager.achievements)} rules OK "
+          f"({len(manager._rules)} compiled, {len(manager.achievements) - len(manager._rules)} indexed)")
+    print(f"Full check: {elapsed / len(users) * 1e6:.1f} us per user")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
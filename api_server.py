@@ -0,0 +1,481 @@
+"""Asynchronous HTTP/JSON API over the savings and game controllers
+
+Run with `python api_server.py [--host HOST] [--port PORT] [--workers N]`.
+
+Routes:
+    POST /users                                   {"name", "email", optional "user_id"}
+    GET  /users?limit=&cursor=                    page of users, oldest first
+    GET  /users?email=                            user registered with the email
+    GET  /users/<user_id>
+    POST /users/<user_id>/deposit                 {"amount"}
+    POST /users/<user_id>/withdraw                {"amount"}
+    GET  /users/<user_id>/goals
+    POST /users/<user_id>/goals                   {"title", "target_amount", "deadline_days"}
+    POST /users/<user_id>/goals/<goal_id>/progress {"amount"}
+    GET  /users/<user_id>/achievements
+    GET  /users/<user_id>/stats
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from controllers.savings_controller import SavingsController
+from controllers.deadline_scheduler import DeadlineEvent, DeadlineScheduler
+from controllers.game_controller import (
+    GameController, DEPOSIT_POINTS_PER_DOLLAR, GOAL_CREATION_POINTS,
+    PROGRESS_POINTS_PER_DOLLAR, GOAL_COMPLETION_BONUS
+)
+from utils.codec import get_codec
+from utils.database import DURABILITY_MODES, ConcurrentUpdateError, Database, DuplicateEmailError
+from utils.ledger import Ledger
+from utils.lock_manager import StripedLockManager
+from utils.metrics import METRICS, configure_from_env
+from models.money import InvalidAmountError, points_for, to_cents, to_dollars
+from models.timestamps import now_micros
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+MAX_DEADLINE_DAYS = 36500
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _number(body: Dict, field: str) -> float:
+    value = body.get(field)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a number")
+    return value
+
+
+def _content_length(headers: Dict) -> int:
+    value = headers.get("content-length", "0")
+    if not (value.isascii() and value.isdigit()):  # int() would also take "-1", "+1" and "1_0"
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length must be a non-negative integer")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    return length
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    """Read one line of a request head, rejecting a line longer than the stream's limit"""
+    try:
+        return await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):  # readline reports an overrun as ValueError
+        raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request line or header too long")
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+    """Read header lines up to the blank line ending them, keyed by lower-case name"""
+    headers = {}
+    for _ in range(MAX_HEADER_LINES + 1):
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, f"More than {MAX_HEADER_LINES} header lines")
+
+
+class SavingsApi:
+    """Controller operations exposed as JSON request handlers
+
+    Each operation runs on a bounded thread pool inside one storage
+    transaction, and its ledger entries are appended once that commits, so
+    a transaction that fails or conflicts leaves no history behind.
+    Requests for the same user are serialized on the user's lock stripe so
+    multi-step flows never interleave on a balance, while requests for
+    other users run in parallel. Pass the same locks to any other threads
+    that write through the same storage.
+    """
+
+    def __init__(self, db, ledger: Ledger = None, max_workers: int = 8,
+                 locks: StripedLockManager = None, deadlines_file: str = None):
+        self.db = db
+        self.ledger = ledger
+        self.savings_controller = SavingsController(db, ledger)
+        self.game_controller = GameController(db, ledger=ledger)
+        self.deadlines = (DeadlineScheduler.attach(self.game_controller, state_file=deadlines_file)
+                          if deadlines_file else None)
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.locks = locks or StripedLockManager()
+        self.routes: List[Tuple[str, re.Pattern, Callable]] = [
+            ("POST", re.compile(r"/users"), self.create_user),
+            ("GET", re.compile(r"/users"), self.list_users),
+            ("GET", re.compile(r"/users/([^/]+)"), self.get_user),
+            ("POST", re.compile(r"/users/([^/]+)/deposit"), self.deposit),
+            ("POST", re.compile(r"/users/([^/]+)/withdraw"), self.withdraw),
+            ("GET", re.compile(r"/users/([^/]+)/goals"), self.get_goals),
+            ("POST", re.compile(r"/users/([^/]+)/goals"), self.create_goal),
+            ("POST", re.compile(r"/users/([^/]+)/goals/([^/]+)/progress"), self.add_progress),
+            ("GET", re.compile(r"/users/([^/]+)/achievements"), self.get_achievements),
+            ("GET", re.compile(r"/users/([^/]+)/stats"), self.get_stats),
+        ]
+
+    async def handle(self, method: str, path: str, body: Dict) -> Tuple[HTTPStatus, Dict]:
+        """Dispatch a request, turning errors into (status, {"error": message})"""
+        try:
+            return await self.dispatch(method, path, body)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except (ConcurrentUpdateError, DuplicateEmailError) as e:  # Also raised when a transaction commits
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        except InvalidAmountError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    async def dispatch(self, method: str, path: str, body: Dict) -> Tuple[HTTPStatus, Dict]:
+        """Route a request to its handler and get (status, payload)"""
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                return await handler(body, *match.groups())
+        if path_matched:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+
+    async def _run(self, user_id: Optional[str], func: Callable, *args):
+        """Run a storage-bound call on the executor, one at a time per user"""
+        loop = asyncio.get_running_loop()
+        if user_id is None:
+            return await loop.run_in_executor(self.executor, func, *args)
+        async with self.locks.async_lock(user_id):
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def run_deadlines(self, interval: float = 60.0):
+        """Fire due goal reminders and expiries every interval seconds
+
+        A round that fails is reported and its unfired events are retried in
+        the next one; the task only ends when cancelled.
+        """
+        while True:
+            try:
+                await self.fire_due_deadlines()
+            except Exception as e:
+                METRICS.increment("deadlines.failed_rounds")
+                print(f"Deadline round failed: {type(e).__name__}: {e}", file=sys.stderr)
+            await asyncio.sleep(interval)
+
+    async def fire_due_deadlines(self):
+        """Fire every due event under its owner's lock, persisting progress once all have fired"""
+        now_us = now_micros()
+        events = await self._run(None, self.deadlines.pop_due, now_us)
+        for index, event in enumerate(events):
+            try:
+                await self._run(event.user_id, self._fire_deadline, event)
+            except BaseException:
+                self.deadlines.requeue(events[index:])
+                raise
+        await self._run(None, self.deadlines.mark_fired, now_us)  # Writes the state file
+
+    def _require_user(self, user_id: str):
+        user = self.savings_controller.get_user(user_id)
+        if not user:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"User {user_id} not found")
+        return user
+
+    # Handlers
+
+    async def create_user(self, body: Dict):
+        name, email, user_id = body.get("name"), body.get("email"), body.get("user_id")
+        if not isinstance(name, str) or not isinstance(email, str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'name' and 'email' are required")
+        if user_id is not None and (not isinstance(user_id, str) or not user_id or "/" in user_id):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'user_id' must be a non-empty string without '/'")
+        if user_id is not None:
+            return HTTPStatus.CREATED, await self._run(user_id, self._create_user, name, email, user_id)
+        return HTTPStatus.CREATED, await self._run(None, self._create_user, name, email)
+
+    async def list_users(self, body: Dict):
+        if "email" in body:
+            if not isinstance(body["email"], str):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "'email' must be a string")
+            user = await self._run(None, self.savings_controller.login, body["email"])
+            if not user:
+                raise ApiError(HTTPStatus.NOT_FOUND, "No user with that email")
+            return HTTPStatus.OK, {"users": [user.to_dict()], "next_cursor": None}
+        try:
+            limit = int(body.get("limit", 20))
+        except (TypeError, ValueError, OverflowError):  # A list, "abc", Infinity
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'limit' must be an integer")
+        if not 1 <= limit <= 100:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'limit' must be between 1 and 100")
+        if not isinstance(body.get("cursor", ""), str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'cursor' must be a string")
+        try:
+            users, next_cursor = await self._run(None, self.savings_controller.list_users,
+                                                 limit, body.get("cursor"))
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        return HTTPStatus.OK, {"users": [u.to_dict() for u in users], "next_cursor": next_cursor}
+
+    async def get_user(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, lambda: self._require_user(user_id).to_dict())
+
+    async def deposit(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, self._deposit, user_id, _number(body, "amount"))
+
+    async def withdraw(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, self._withdraw, user_id, _number(body, "amount"))
+
+    async def get_goals(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, self._get_goals, user_id)
+
+    async def create_goal(self, body: Dict, user_id: str):
+        title = body.get("title")
+        if not isinstance(title, str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'title' is required")
+        target_amount = _number(body, "target_amount")
+        deadline_days = _number(body, "deadline_days")
+        if not 1 <= deadline_days <= MAX_DEADLINE_DAYS:  # False for NaN too
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"'deadline_days' must be between 1 and {MAX_DEADLINE_DAYS}")
+        deadline_days = int(deadline_days)
+        return HTTPStatus.CREATED, await self._run(
+            user_id, self._create_goal, user_id, title, target_amount, deadline_days)
+
+    async def add_progress(self, body: Dict, user_id: str, goal_id: str):
+        return HTTPStatus.OK, await self._run(
+            user_id, self._add_progress, user_id, goal_id, _number(body, "amount"))
+
+    async def get_achievements(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, self._get_achievements, user_id)
+
+    async def get_stats(self, body: Dict, user_id: str):
+        return HTTPStatus.OK, await self._run(user_id, self._get_stats, user_id)
+
+    # Blocking operations, run on the executor
+
+    @contextmanager
+    def _transaction(self):
+        """A storage transaction whose ledger entries are appended only after it commits"""
+        with self.ledger.deferred() if self.ledger is not None else nullcontext(), self.db.transaction():
+            yield
+
+    def _create_user(self, name: str, email: str, user_id: str = None) -> Dict:
+        with self._transaction():
+            if user_id is not None and self.savings_controller.get_user(user_id):
+                raise ApiError(HTTPStatus.CONFLICT, f"User {user_id} already exists")
+            try:
+                user = self.savings_controller.create_user(name, email, user_id)
+            except DuplicateEmailError as e:
+                raise ApiError(HTTPStatus.CONFLICT, str(e))
+            except ValueError as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+            achievements = self.game_controller.check_and_award_achievements(user.user_id)
+            return {"user": user.to_dict(), "achievements": [a.to_dict() for a in achievements]}
+
+    def _fire_deadline(self, event: DeadlineEvent) -> Optional[str]:
+        with self._transaction():
+            return self.deadlines.fire(event)
+
+    def _deposit(self, user_id: str, amount: float) -> Dict:
+        with self._transaction():
+            self._require_user(user_id)
+            if not self.savings_controller.deposit_money(user_id, amount):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Deposit failed")
+            points = points_for(to_cents(amount), DEPOSIT_POINTS_PER_DOLLAR)
+            _, level_up = self.game_controller.award_points(user_id, points, "Deposit")
+            achievements = self.game_controller.check_and_award_achievements(user_id)
+            return {
+                "user": self.savings_controller.get_user(user_id).to_dict(),
+                "points": points,
+                "level_up": level_up,
+                "achievements": [a.to_dict() for a in achievements]
+            }
+
+    def _withdraw(self, user_id: str, amount: float) -> Dict:
+        with self._transaction():
+            self._require_user(user_id)
+            if not self.savings_controller.withdraw_money(user_id, amount):
+                raise ApiError(HTTPStatus.CONFLICT, "Insufficient funds or withdrawal failed")
+            return {"user": self.savings_controller.get_user(user_id).to_dict()}
+
+    def _get_goals(self, user_id: str) -> Dict:
+        self._require_user(user_id)
+        return {"goals": [g.to_dict() for g in self.savings_controller.get_user_goals(user_id)]}
+
+    def _create_goal(self, user_id: str, title: str, target_amount: float, deadline_days: int) -> Dict:
+        with self._transaction():
+            self._require_user(user_id)
+            goal = self.savings_controller.create_savings_goal(user_id, title, target_amount, deadline_days)
+            if not goal:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid goal")
+            self.game_controller.award_points(user_id, GOAL_CREATION_POINTS, "Goal Creation")
+            return {"goal": goal.to_dict(), "points": GOAL_CREATION_POINTS}
+
+    def _add_progress(self, user_id: str, goal_id: str, amount: float) -> Dict:
+        with self._transaction():
+            user = self._require_user(user_id)
+            goal = self.savings_controller.db.get_goal(goal_id)
+            if not goal or goal.user_id != user_id:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Goal {goal_id} not found")
+            if goal.is_completed:
+                raise ApiError(HTTPStatus.CONFLICT, "Goal is already completed")
+            cents = to_cents(amount)
+            if cents <= 0:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "'amount' must be positive")
+            if cents > user.balance_cents:
+                raise ApiError(HTTPStatus.CONFLICT, "Insufficient balance")
+            if not self.savings_controller.withdraw_money(user_id, amount):
+                raise ApiError(HTTPStatus.CONFLICT, "Withdrawal failed")
+            completed = self.savings_controller.add_progress_to_goal(goal_id, amount)
+            points = points_for(cents, PROGRESS_POINTS_PER_DOLLAR)
+            if completed:
+                points += GOAL_COMPLETION_BONUS
+            self.game_controller.award_points(user_id, points, "Goal Progress")
+            achievements = self.game_controller.check_and_award_achievements(user_id)
+            return {
+                "goal": self.savings_controller.db.get_goal(goal_id).to_dict(),
+                "completed": completed,
+                "points": points,
+                "achievements": [a.to_dict() for a in achievements]
+            }
+
+    def _get_achievements(self, user_id: str) -> Dict:
+        self._require_user(user_id)
+        return {
+            "earned": [a.to_dict() for a in self.game_controller.get_user_achievements(user_id)],
+            "available": [a.to_dict() for a in self.game_controller.get_available_achievements(user_id)]
+        }
+
+    def _get_stats(self, user_id: str) -> Dict:
+        user = self._require_user(user_id)
+        goals = self.savings_controller.get_user_goals(user_id)
+        completed_goals = [g for g in goals if g.is_completed]
+        return {
+            "level": user.level,
+            "points": user.total_points,
+            "balance": user.balance,
+            "points_to_next_level": user.points_to_next_level(),
+            "total_goals": len(goals),
+            "completed_goals": len(completed_goals),
+            "total_saved": to_dollars(sum(goal.current_cents for goal in goals)),
+            "total_targets": to_dollars(sum(goal.target_cents for goal in goals)),
+            "achievements_earned": len(user.achievements)
+        }
+
+
+class ApiServer:
+    """Minimal HTTP/1.1 server with keep-alive, built on asyncio streams
+
+    Requests go to api.handle(method, path, body): a SavingsApi, or a
+    cluster coordinator (see cluster.py) with the same method.
+    """
+
+    def __init__(self, api: SavingsApi, codec: str = None):
+        self.api = api
+        self.codec = get_codec(codec)
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await _read_line(reader)
+                    if not request_line:
+                        break
+                    try:
+                        method, target, version = request_line.decode("latin-1").split()
+                    except ValueError:
+                        raise ApiError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+                    headers = await _read_headers(reader)
+                    length = _content_length(headers)
+                except ApiError as e:
+                    # The next request cannot be found after a bad head, so the connection ends here
+                    await self._respond(writer, e.status, {"error": e.message}, False)
+                    break
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                status, payload = await self._process(method, target, length, reader)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _process(self, method: str, target: str, length: int,
+                       reader: asyncio.StreamReader) -> Tuple[HTTPStatus, Dict]:
+        try:
+            body = {}
+            if length:
+                try:
+                    body = self.codec.decode(await reader.readexactly(length))
+                except ValueError:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be valid JSON")
+                if not isinstance(body, dict):
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        path, _, query = target.partition("?")
+        if query:  # Query parameters join the body, which wins on a clash
+            body = {**dict(parse_qsl(query)), **body}
+        return await self.api.handle(method, path.rstrip("/"), body)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: HTTPStatus,
+                       payload: Dict, keep_alive: bool):
+        body = self.codec.encode(payload)
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, data_file: str, workers: int, durability: str = "group"):
+    db = Database(data_file, journaled=True, durability=durability)
+    ledger = Ledger()
+    api = SavingsApi(db, ledger, workers, deadlines_file=os.path.join(os.path.dirname(data_file), "deadlines.json"))
+    server = ApiServer(api)
+    await server.start(host, port)
+    print(f"Serving on http://{host}:{server.port}")
+    deadlines = asyncio.ensure_future(api.run_deadlines())
+    try:
+        async with server.server:
+            await server.server.serve_forever()
+    finally:
+        deadlines.cancel()
+        db.close()
+        ledger.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gamified Savings HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-file", default="data/savings_data.json")
+    parser.add_argument("--workers", type=int, default=8, help="storage executor threads")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="group",
+                        help="when writes reach disk (group: one fsync per batch of concurrent requests)")
+    args = parser.parse_args()
+    configure_from_env()
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_file, args.workers, args.durability))
+    except KeyboardInterrupt:
+        pass
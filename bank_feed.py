@@ -0,0 +1,337 @@
+# controllers/bank_feed.py
+import csv
+import hashlib
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from controllers.game_controller import GameController, DEPOSIT_POINTS_PER_DOLLAR
+from models.achievement_rules import (
+    BALANCE, DEPOSIT_STREAK_DAYS, LEVEL, TOTAL_POINTS, WEEKLY_DEPOSIT_STREAK
+)
+from models.money import points_for, to_cents
+from models.savings_goal import SavingsGoal
+from models.user import User
+from utils.codec import get_codec
+from utils.database import ConcurrentUpdateError
+from utils.ledger import DEPOSIT, GOAL_TRANSFER, POINTS_AWARD, WITHDRAWAL, Ledger, key_to_id
+from utils.metrics import METRICS
+
+# Transaction attempts before a batch that keeps losing to other writers gives up
+MAX_BATCH_ATTEMPTS = 5
+
+# Achievement fields a deposit can change
+DEPOSIT_FIELDS = (BALANCE, DEPOSIT_STREAK_DAYS, WEEKLY_DEPOSIT_STREAK, TOTAL_POINTS, LEVEL)
+
+LEDGER_KINDS = {DEPOSIT: "deposit", WITHDRAWAL: "withdrawal",
+                GOAL_TRANSFER: "goal_transfer", POINTS_AWARD: "points"}
+
+Deposit = namedtuple("Deposit", "key user cents at")
+
+TRANSACTION_FIELDS = ('user_id', 'goal_id', 'kind', 'amount', 'timestamp_us')
+
+
+def read_rows(path: str) -> Iterator[Dict]:
+    """Yield a feed's rows: CSV with a header line, or NDJSON (one object per line)
+
+    NDJSON lines that do not decode, or hold something other than an
+    object, are still yielded so the importer counts them as rejected.
+    """
+    if path.endswith(".csv"):
+        with open(path, 'r', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    codec = get_codec()
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield codec.decode(line)
+                except ValueError:
+                    yield {}  # Rejected as a row without the required fields
+
+
+def _parse_date(text: str) -> datetime:
+    """Parse an ISO date, converting one with an offset to naive local time like the models' timestamps"""
+    at = datetime.fromisoformat(text.strip())
+    if at.tzinfo is not None:
+        at = at.astimezone().replace(tzinfo=None)
+    return at
+
+
+class DepositImporter:
+    """Apply deposits from bank statement feeds in batches
+
+    Each row needs a user_id (or the email the user registered with) and an
+    amount in dollars, and may carry a date (ISO format) and an id. Rows are
+    streamed, cut into batches of batch_size and grouped by user: each user
+    in a batch is loaded once, in storage order so each shard is read once,
+    credited with every deposit in date order,
+    awarded the summed deposit points and checked for achievements once,
+    then the whole batch commits in one transaction. Saves go through
+    compare-and-swap, so a batch that races another writer is retried.
+
+    Every row has an idempotency key, its id or else a hash of user, amount,
+    date and how many identical rows came before it in the file. Keys of
+    committed batches are appended to keys_file, and rows whose key was
+    seen before are skipped, so re-importing an overlapping export is safe.
+    A crash between a commit and the key append can let that batch's rows
+    apply twice on a rerun.
+    """
+
+    def __init__(self, db, ledger: Ledger = None, catalogue_file: str = None,
+                 batch_size: int = 1000, keys_file: str = "data/imported_deposits.keys"):
+        self.db = db
+        self.ledger = ledger
+        # No ledger here: a retried batch would record its points twice, so
+        # ledger entries are written once the batch commits
+        self.game_controller = GameController(db, catalogue_file)
+        self.batch_size = batch_size
+        self.keys_file = keys_file
+        self._seen = set()
+        if os.path.exists(keys_file):
+            with open(keys_file, 'r') as f:
+                self._seen.update(line.rstrip("\n") for line in f if line.endswith("\n"))
+
+    def _deposits(self, rows: Iterator[Dict], stats: Dict) -> Iterator[Deposit]:
+        """Parse rows into deposits, counting rejected rows and duplicates"""
+        occurrences = {}
+        for row in rows:
+            stats["rows"] += 1
+            if not isinstance(row, dict):  # An NDJSON line holding an array, string or number
+                stats["rejected"] += 1
+                continue
+            user = str(row.get("user_id") or row.get("email") or "").strip()
+            try:
+                cents = to_cents(row.get("amount", ""))  # InvalidAmountError for "inf", 1e400, "abc", true
+                at = _parse_date(row["date"]) if row.get("date") else None
+            except (ValueError, TypeError, AttributeError):
+                cents = 0
+            if not user or cents <= 0:
+                stats["rejected"] += 1
+                continue
+            key = str(row.get("id") or "").strip()
+            if not key:
+                content = f"{user}|{cents}|{at.isoformat() if at else ''}"
+                occurrences[content] = occurrences.get(content, 0) + 1
+                key = hashlib.sha1(f"{content}|{occurrences[content]}".encode("utf-8")).hexdigest()
+            if key in self._seen:
+                stats["duplicates"] += 1
+                continue
+            self._seen.add(key)
+            yield Deposit(key, user, cents, at)
+
+    def _resolve(self, user: str) -> Optional[str]:
+        """Get the user_id a row refers to by id or email; ids are checked when applied"""
+        if "@" in user:
+            found = self.db.get_user_by_email(user)
+            return found.user_id if found else None
+        return user
+
+    def _apply(self, by_user: Dict[str, List[Deposit]]) -> Dict[str, int]:
+        """Credit each user's deposits in one transaction, getting points awarded per existing user"""
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            awarded = {}
+            try:
+                with self.db.transaction():
+                    for user_id in self.db.storage_order(by_user):
+                        user = self.db.get_user_for_update(user_id)
+                        if user is None:
+                            continue
+                        deposits = by_user[user_id]
+                        for deposit in deposits:
+                            user.add_cents(deposit.cents, deposit.at)
+                        points_before = user.total_points
+                        user.add_points(sum(points_for(d.cents, DEPOSIT_POINTS_PER_DOLLAR) for d in deposits))
+                        self.db.compare_and_swap_user(user)
+                        self.game_controller.check_and_award_achievements(user_id, DEPOSIT_FIELDS)
+                        # Deposit points, achievement rewards and the rewards of any levels reached
+                        awarded[user_id] = self.db.get_user(user_id).total_points - points_before
+                return awarded
+            except ConcurrentUpdateError:
+                if attempt == MAX_BATCH_ATTEMPTS - 1:
+                    raise
+                METRICS.increment("import.batch_conflicts")
+
+    def _record(self, by_user: Dict[str, List[Deposit]], awarded: Dict[str, int]):
+        """Append a committed batch's idempotency keys and ledger entries"""
+        os.makedirs(os.path.dirname(self.keys_file) or ".", exist_ok=True)
+        with open(self.keys_file, 'a') as f:
+            f.writelines(d.key + "\n" for deposits in by_user.values() for d in deposits)
+            f.flush()
+            os.fsync(f.fileno())
+        if self.ledger is not None:
+            for user_id, deposits in by_user.items():
+                for deposit in deposits:
+                    self.ledger.record_deposit(user_id, deposit.cents)
+                if awarded[user_id]:
+                    self.ledger.record_points(user_id, awarded[user_id])
+
+    def run(self, rows: Iterator[Dict]) -> Dict:
+        """Import rows (see read_rows) and get throughput statistics"""
+        stats = {"rows": 0, "imported": 0, "duplicates": 0, "rejected": 0,
+                 "users": 0, "batches": 0, "cents": 0}
+        users = set()
+        resolved = {}  # row user reference -> user_id, None for unknown emails
+        start = time.perf_counter()
+        parsed = self._deposits(rows, stats)
+        while True:
+            batch = list(islice(parsed, self.batch_size))
+            if not batch:
+                break
+            by_user = {}
+            for deposit in batch:
+                if deposit.user not in resolved:
+                    resolved[deposit.user] = self._resolve(deposit.user)
+                user_id = resolved[deposit.user]
+                if user_id is None:
+                    stats["rejected"] += 1
+                    self._seen.discard(deposit.key)  # Importable once the user exists
+                    continue
+                by_user.setdefault(user_id, []).append(deposit)
+            for deposits in by_user.values():
+                deposits.sort(key=lambda d: d.at or datetime.max)  # Streaks count days in order
+            with METRICS.timer("import.batch"):
+                awarded = self._apply(by_user)
+            for user_id in [user_id for user_id in by_user if user_id not in awarded]:
+                stats["rejected"] += len(by_user[user_id])
+                self._seen.difference_update(d.key for d in by_user.pop(user_id))
+            self._record(by_user, awarded)
+            count = sum(len(deposits) for deposits in by_user.values())
+            METRICS.increment("import.deposits", count)
+            stats["imported"] += count
+            users.update(by_user)
+            stats["batches"] += 1
+            stats["cents"] += sum(d.cents for deposits in by_user.values() for d in deposits)
+
+        elapsed = time.perf_counter() - start
+        stats["users"] = len(users)
+        stats["seconds"] = elapsed
+        stats["rows_per_second"] = stats["rows"] / elapsed if elapsed else 0.0
+        return stats
+
+    def import_file(self, path: str) -> Dict:
+        return self.run(read_rows(path))
+
+
+def export_ndjson(db, out: BinaryIO, ledger: Ledger = None) -> Dict[str, int]:
+    """Write every user, goal and ledger entry to out as one JSON object per line
+
+    Lines carry a "type" of "user", "goal" or "transaction". Records are
+    streamed a shard at a time, so memory stays flat however large the data.
+    """
+    codec = get_codec()
+    counts = {"users": 0, "goals": 0, "transactions": 0}
+    for user, goals in db.iter_user_records():
+        out.write(codec.encode(dict(user, type="user")) + b"\n")
+        for goal in goals:
+            out.write(codec.encode(dict(goal, type="goal")) + b"\n")
+        counts["users"] += 1
+        counts["goals"] += len(goals)
+    for transaction in _transactions(ledger):
+        out.write(codec.encode(dict(transaction, type="transaction")) + b"\n")
+        counts["transactions"] += 1
+    return counts
+
+
+def export_csv(db, directory: str, ledger: Ledger = None) -> Dict[str, int]:
+    """Write users.csv, goals.csv and transactions.csv into directory, streaming like export_ndjson
+
+    Columns are the fields of each model's to_dict, whatever the first
+    record of a file happens to hold.
+    """
+    os.makedirs(directory, exist_ok=True)
+    counts = {"users": 0, "goals": 0, "transactions": 0}
+    fields = {"users": list(User("", "").to_dict()),
+              "goals": list(SavingsGoal("", "", 0, 0).to_dict()),
+              "transactions": TRANSACTION_FIELDS}
+    writers = {}
+    files = []
+
+    def write(name: str, record: Dict):
+        writer = writers.get(name)
+        if writer is None:
+            f = open(os.path.join(directory, name + ".csv"), 'w', newline='')
+            files.append(f)
+            writer = writers[name] = csv.DictWriter(f, fields[name], extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(record)
+        counts[name] += 1
+
+    try:
+        for user, goals in db.iter_user_records():
+            write("users", dict(user, achievements=" ".join(user['achievements'])))
+            for goal in goals:
+                write("goals", goal)
+        for transaction in _transactions(ledger):
+            write("transactions", transaction)
+    finally:
+        for f in files:
+            f.close()
+    return counts
+
+
+def _transactions(ledger: Optional[Ledger]) -> Iterator[Dict]:
+    if ledger is None:
+        return
+    for entry in ledger.scan():
+        yield {
+            'user_id': key_to_id(entry.user_key),
+            'goal_id': key_to_id(entry.goal_key) if any(entry.goal_key) else None,
+            'kind': LEDGER_KINDS.get(entry.kind, str(entry.kind)),
+            'amount': entry.amount,
+            'timestamp_us': entry.timestamp_us
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from utils.database import Database
+    from utils.metrics import configure_from_env
+
+    parser = argparse.ArgumentParser(description="Import deposits from bank feeds, or export all data")
+    parser.add_argument("--data-file", default="data/savings_data.json")
+    parser.add_argument("--ledger", default="data/savings_ledger.bin")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="apply deposits from CSV or NDJSON feeds")
+    import_parser.add_argument("feeds", nargs="+")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.add_argument("--keys", default="data/imported_deposits.keys",
+                               help="idempotency keys of rows already imported")
+    import_parser.add_argument("--catalogue", help="JSON achievement catalogue (defaults to built-ins)")
+    export_parser = commands.add_parser("export", help="dump users, goals and transactions")
+    export_parser.add_argument("out", help="NDJSON file ('-' for stdout), or a directory with --csv")
+    export_parser.add_argument("--csv", action="store_true", help="write one CSV file per record type")
+    args = parser.parse_args()
+    configure_from_env()
+
+    db = Database(args.data_file, journaled=True, durability="group")
+    ledger = Ledger(args.ledger)
+    try:
+        if args.command == "import":
+            importer = DepositImporter(db, ledger, args.catalogue, args.batch_size, args.keys)
+            for feed in args.feeds:
+                stats = importer.import_file(feed)
+                print(f"{feed}: imported {stats['imported']} of {stats['rows']} rows for {stats['users']} users "
+                      f"({stats['duplicates']} duplicate, {stats['rejected']} rejected) "
+                      f"in {stats['seconds']:.2f}s: {stats['rows_per_second']:.0f} rows/sec")
+        elif args.csv:
+            counts = export_csv(db, args.out, ledger)
+            print(f"Exported {counts['users']} users, {counts['goals']} goals, {counts['transactions']} transactions")
+        else:
+            out = sys.stdout.buffer if args.out == "-" else open(args.out, 'wb')
+            try:
+                counts = export_ndjson(db, out, ledger)
+            finally:
+                if out is sys.stdout.buffer:
+                    out.flush()
+                else:
+                    out.close()
+            print(f"Exported {counts['users']} users, {counts['goals']} goals, "
+                  f"{counts['transactions']} transactions", file=sys.stderr)
+    finally:
+        db.close()
+        ledger.close()
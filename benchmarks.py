@@ -0,0 +1,965 @@
+"""Benchmarks for the storage and game-logic hot paths
+
+Run everything with `python benchmarks.py`, or name the ones to run:
+`python benchmarks.py achievements`
+"""
+import sys
+import time
+from typing import Callable, Dict
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark function under name"""
+    def register(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def timed(func: Callable, *args, repeat: int = 1) -> float:
+    """Get the best wall-clock seconds of func(*args) over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@benchmark("achievements")
+def bench_achievements(rule_count: int = 1000, user_count: int = 2000):
+    """Compiled catalogue vs hand-written if/elif branches at rule_count rules"""
+    from models.achievement import Achievement, AchievementManager, AchievementType
+    from models.user import User
+
+    manager = AchievementManager()
+    kinds = [AchievementType.SAVINGS_MILESTONE, AchievementType.LEVEL_UP]
+    for i in range(rule_count):
+        kind = kinds[i % 2]
+        key = "amount" if kind == AchievementType.SAVINGS_MILESTONE else "level"
+        manager.add_achievement(Achievement(f"rule_{i}", f"Rule {i}", "", 10, kind, {key: i * 5}))
+
+    users = []
+    for i in range(user_count):
+        user = User(f"user{i}", f"user{i}@example.com")
+        user.balance_cents = i % 3000 * 100
+        user.level = i % 50 + 1
+        users.append(user)
+
+    def hand_written():
+        for user in users:
+            earned = []
+            for achievement in manager.achievements:
+                if achievement.achievement_id in user.achievements:
+                    continue
+                kind = achievement.achievement_type
+                if kind == AchievementType.FIRST_DEPOSIT:
+                    met = user.balance > 0
+                elif kind == AchievementType.SAVINGS_MILESTONE:
+                    met = user.balance >= achievement.requirements.get("amount", 0)
+                elif kind == AchievementType.LEVEL_UP:
+                    met = user.level >= achievement.requirements.get("level", 0)
+                else:
+                    met = False
+                if met:
+                    earned.append(achievement.achievement_id)
+
+    def compiled():
+        for user in users:
+            manager.check_achievements(user, [], ["balance", "level"])
+
+    baseline = timed(hand_written, repeat=3)
+    indexed = timed(compiled, repeat=3)
+    print(f"{len(manager.achievements)} rules x {user_count} users")
+    print(f"  hand-written branches: {baseline / user_count * 1e6:8.1f} us/user")
+    print(f"  compiled catalogue:    {indexed / user_count * 1e6:8.1f} us/user")
+
+
+@benchmark("rules")
+def bench_rules(rule_count: int = 500, user_count: int = 2000):
+    """Composite catalogue conditions: compiled closures vs interpreting the condition dicts"""
+    import json
+    import os
+    import random
+    import tempfile
+    from models.achievement import Achievement, AchievementManager, AchievementType
+    from models.achievement_rules import GOAL_FIELDS, OPERATORS, RuleContext
+    from models.savings_goal import SavingsGoal
+    from models.user import User
+
+    # Shapes a real catalogue uses; none is a single lower bound, so none is threshold-indexed
+    templates = [
+        lambda i: {"all": [{"field": "balance", "op": ">=", "value": i * 10},
+                           {"field": "deposit_streak_days", "op": ">=", "value": i % 30}]},
+        lambda i: {"any": [{"field": "completed_goals", "op": ">=", "value": i % 5 + 1},
+                           {"field": "total_points", "op": ">", "value": i * 40}]},
+        lambda i: {"any_goal": {"all": [{"field": "progress_percentage", "op": ">=", "value": i % 100},
+                                        {"field": "is_completed", "op": "==", "value": False}]}},
+        lambda i: {"all": [{"field": "total_saved", "op": ">=", "value": i * 5},
+                           {"not": {"field": "active_goals", "op": ">", "value": 2}}]},
+        lambda i: {"all_goals": {"field": "target_amount", "op": "<=", "value": i * 20}},
+    ]
+    conditions = [(f"rule_{i}", templates[i % len(templates)](i)) for i in range(rule_count)]
+    catalogue = {"achievements": [Achievement(achievement_id, achievement_id, "", 10, AchievementType.SAVINGS_MILESTONE,
+                                              condition=condition).to_dict()
+                                  for achievement_id, condition in conditions]}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalogue.json")
+        with open(path, 'w') as f:
+            json.dump(catalogue, f)
+        manager = AchievementManager(path)
+
+    rng = random.Random(6)
+    users, goals = [], {}
+    for i in range(user_count):
+        user = User(f"user{i}", f"user{i}@example.com")
+        user.balance_cents = int(rng.lognormvariate(9, 1.5))
+        user.total_points = rng.randrange(20000)
+        user.level = user.calculate_level()
+        user.deposit_streak_days = rng.randrange(40)
+        users.append(user)
+        goals[user.user_id] = []
+        for g in range(rng.randrange(6)):
+            goal = SavingsGoal(user.user_id, f"goal{g}", rng.randrange(50, 5000), rng.randrange(1, 365))
+            goal.add_progress_cents(rng.randrange(goal.target_cents + 1))
+            goals[user.user_id].append(goal)
+
+    def evaluate(condition, context):
+        if "all" in condition or "any" in condition:
+            combine = all if "all" in condition else any
+            return combine(evaluate(c, context) for c in condition["all" if "all" in condition else "any"])
+        if "not" in condition:
+            return not evaluate(condition["not"], context)
+        if "any_goal" in condition or "all_goals" in condition:
+            quantifier = any if "any_goal" in condition else all
+            inner = condition["any_goal" if "any_goal" in condition else "all_goals"]
+            return quantifier(evaluate_goal(inner, goal) for goal in context.goals)
+        return OPERATORS[condition["op"]](context.get(condition["field"]), condition["value"])
+
+    def evaluate_goal(condition, goal):
+        if "all" in condition or "any" in condition:
+            combine = all if "all" in condition else any
+            return combine(evaluate_goal(c, goal) for c in condition["all" if "all" in condition else "any"])
+        if "not" in condition:
+            return not evaluate_goal(condition["not"], goal)
+        return OPERATORS[condition["op"]](GOAL_FIELDS[condition["field"]](goal), condition["value"])
+
+    def interpreted():
+        earned = 0
+        for user in users:
+            context = RuleContext(user, goals[user.user_id])
+            earned += sum(1 for _, condition in conditions if evaluate(condition, context))
+        return earned
+
+    def compiled():
+        return sum(len(manager.check_achievements(user, goals[user.user_id])) for user in users)
+
+    assert interpreted() == compiled()
+    baseline = timed(interpreted, repeat=3)
+    fast = timed(compiled, repeat=3)
+    print(f"{len(manager._rules)} compiled rules x {user_count} users "
+          f"({sum(map(len, goals.values()))} goals, {compiled()} achievements earned)")
+    print(f"  interpreted conditions: {baseline / user_count * 1e6:8.1f} us/user")
+    print(f"  compiled predicates:    {fast / user_count * 1e6:8.1f} us/user")
+
+
+@benchmark("backfill")
+def bench_backfill(user_count: int = 20000, goals_per_user: int = 3):
+    """Achievement backfill throughput in-process vs across a process pool"""
+    import json
+    import os
+    import tempfile
+    from controllers.achievement_backfill import AchievementBackfill
+    from models.savings_goal import SavingsGoal
+    from models.user import User
+    from utils.database import Database
+
+    data = {"users": {}, "goals": {}}
+    for i in range(user_count):
+        user = User(f"user{i}", f"user{i}@example.com")
+        user.balance_cents = i % 2000 * 100
+        data["users"][user.user_id] = user.to_dict()
+        for j in range(goals_per_user):
+            goal = SavingsGoal(user.user_id, f"goal{j}", 100.0, 30)
+            goal.add_progress(float((i + j) % 150))
+            data["goals"][goal.goal_id] = goal.to_dict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (0, os.cpu_count() or 1):
+            # A single-file data set, split into shards when the database opens
+            data_file = os.path.join(tmp, f"backfill_{workers}.json")
+            with open(data_file, 'w') as f:
+                json.dump(data, f)
+            db = Database(data_file, journaled=True, compact_threshold=10 ** 9)
+            stats = AchievementBackfill(db, workers=workers, chunk_size=1000).run()
+            db.close()
+            print(f"  workers={workers:<3} {stats['users_per_second']:10.0f} users/sec "
+                  f"({stats['awarded_users']} users awarded)")
+
+
+@benchmark("analytics")
+def bench_analytics(goal_count: int = 500000, user_count: int = 100000):
+    """Platform-wide goal totals: object hydration vs the column store"""
+    from models.savings_goal import SavingsGoal
+    from utils.goal_analytics import GoalAnalytics, np
+
+    records = []
+    for i in range(goal_count):
+        goal = SavingsGoal(f"user{i % user_count}", "goal", 100.0 + i % 900, 30)
+        goal.add_progress(float(i % 1200))
+        records.append(goal.to_dict())
+
+    def hydrated():
+        goals = [SavingsGoal.from_dict(r) for r in records]
+        total_saved = sum(goal.current_amount for goal in goals)
+        total_targets = sum(goal.target_amount for goal in goals)
+        completed_goals = [g for g in goals if g.is_completed]
+        return total_saved, total_targets, len(completed_goals)
+
+    analytics = GoalAnalytics()
+    build = timed(lambda: [analytics.upsert(r) for r in records])
+    print(f"{goal_count} goals, numpy={'yes' if np is not None else 'no'}")
+    print(f"  hydrate + sum:        {timed(hydrated) * 1000:9.1f} ms")
+    print(f"  column store build:   {build * 1000:9.1f} ms (once, then incremental)")
+    print(f"  column store totals:  {timed(analytics.totals, repeat=5) * 1000:9.1f} ms")
+    print(f"  progress histogram:   {timed(analytics.progress_distribution, repeat=5) * 1000:9.1f} ms")
+
+
+@benchmark("leaderboard")
+def bench_leaderboard(user_count: int = 1000000, query_count: int = 100000):
+    """Leaderboard build, point updates and rank queries at user_count users"""
+    import random
+    from controllers.leaderboard import Leaderboard
+
+    board = Leaderboard()
+    user_ids = [f"user{i}" for i in range(user_count)]
+    build = timed(lambda: [board.set_points(user_id, random.randrange(1000000)) for user_id in user_ids])
+    sample = random.sample(user_ids, min(query_count, user_count))
+
+    updates = timed(lambda: [board.add_points(user_id, random.randrange(1, 500)) for user_id in sample])
+    ranks = timed(lambda: [board.rank(user_id) for user_id in sample])
+    around = timed(lambda: [board.around(user_id, 2) for user_id in sample])
+    top = timed(lambda: board.top(10), repeat=5)
+    print(f"{user_count} users, {len(sample)} operations each")
+    print(f"  build:        {build:8.2f} s")
+    print(f"  add points:   {updates / len(sample) * 1e6:8.1f} us/op")
+    print(f"  my rank:      {ranks / len(sample) * 1e6:8.1f} us/op")
+    print(f"  neighbours:   {around / len(sample) * 1e6:8.1f} us/op")
+    print(f"  top 10:       {top * 1e6:8.1f} us")
+
+
+async def http_request(reader, writer, method: str, path: str, body: Dict = None) -> Dict:
+    """Send one keep-alive request to the API server and get the decoded response body"""
+    import json
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+@benchmark("api")
+def bench_api(client_count: int = 32, requests_per_client: int = 200, workers: int = 8):
+    """HTTP API deposit latency and throughput under concurrent keep-alive clients"""
+    import asyncio
+    import os
+    import tempfile
+    from api_server import ApiServer, SavingsApi
+    from utils.database import Database
+    from utils.ledger import Ledger
+
+    async def client(port, latencies, index):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        created = await http_request(reader, writer, "POST", "/users",
+                                {"name": "client", "email": f"client{index}@example.com"})
+        path = f"/users/{created['user']['user_id']}/deposit"
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await http_request(reader, writer, "POST", path, {"amount": 5})
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    async def run(tmp):
+        db = Database(os.path.join(tmp, "api.json"), journaled=True, compact_threshold=10 ** 9)
+        ledger = Ledger(os.path.join(tmp, "api_ledger.bin"))
+        server = ApiServer(SavingsApi(db, ledger, workers))
+        await server.start("127.0.0.1", 0)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(client(server.port, latencies, i) for i in range(client_count)))
+        elapsed = time.perf_counter() - start
+        server.server.close()
+        await server.server.wait_closed()
+        server.api.executor.shutdown()
+        db.close()
+        ledger.close()
+        return latencies, elapsed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        latencies, elapsed = asyncio.run(run(tmp))
+    latencies.sort()
+    print(f"{client_count} clients x {requests_per_client} deposits, {workers} storage threads")
+    print(f"  throughput:  {len(latencies) / elapsed:8.0f} req/s")
+    print(f"  p50 latency: {latencies[len(latencies) // 2] * 1000:8.2f} ms")
+    print(f"  p99 latency: {latencies[int(len(latencies) * 0.99)] * 1000:8.2f} ms")
+
+
+@benchmark("contention")
+def bench_contention(thread_count: int = 16, operations_per_thread: int = 500):
+    """Hammer one user from many workers and check no balance update is lost"""
+    import asyncio
+    import os
+    import tempfile
+    import threading
+    from contextlib import nullcontext
+    from controllers.savings_controller import SavingsController
+    from utils.database import Database
+    from utils.lock_manager import StripedLockManager
+
+    def hammer(controller, user_id, results, locks=None):
+        net = 0
+        for i in range(operations_per_thread):
+            with locks.lock(user_id) if locks else nullcontext():
+                if i % 4:
+                    net += 3 if controller.deposit_money(user_id, 3) else 0
+                else:
+                    net -= 2 if controller.withdraw_money(user_id, 2) else 0
+        results.append(net)
+
+    async def hammer_async(controller, user_id, locks, results):
+        loop = asyncio.get_running_loop()
+        net = 0
+        for _ in range(operations_per_thread):
+            async with locks.async_lock(user_id):
+                if await loop.run_in_executor(None, controller.deposit_money, user_id, 3):
+                    net += 3
+        results.append(net)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often to provoke interleaving
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ("compare-and-swap", "striped locks"):
+                db = Database(os.path.join(tmp, f"{mode[0]}.json"), journaled=True,
+                              compact_threshold=10 ** 9)
+                controller = SavingsController(db)
+                user_id = controller.create_user("hammered", "hammered@example.com").user_id
+                locks = StripedLockManager() if mode == "striped locks" else None
+                results = []
+                threads = [threading.Thread(target=hammer, args=(controller, user_id, results, locks))
+                           for _ in range(thread_count)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                if locks:
+                    # Coroutines take the same stripes as the threads
+                    async def coroutines():
+                        await asyncio.gather(*(hammer_async(controller, user_id, locks, results)
+                                               for _ in range(4)))
+                    asyncio.run(coroutines())
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+                expected = sum(results)
+                balance = db.get_user(user_id).balance
+                operations = len(results) * operations_per_thread
+                print(f"  {mode:<17} {operations / elapsed:8.0f} ops/s, "
+                      f"{controller.version_conflicts} version conflicts, balance {balance:.0f}")
+                db.close()
+                if balance != expected:
+                    raise RuntimeError(f"{mode}: balance {balance} != {expected}, updates were lost")
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+
+@benchmark("durability")
+def bench_durability(thread_count: int = 8, deposits_per_thread: int = 200):
+    """Deposit throughput per durability mode, journaled and snapshot-only"""
+    import os
+    import tempfile
+    import threading
+    from controllers.savings_controller import SavingsController
+    from utils.database import DURABILITY_MODES, Database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for journaled in (True, False):
+            for durability in DURABILITY_MODES:
+                data_file = os.path.join(tmp, f"{durability}_{journaled}.json")
+                db = Database(data_file, journaled=journaled, durability=durability)
+                controller = SavingsController(db)
+                user_ids = [controller.create_user(f"user{i}", f"user{i}@example.com").user_id
+                            for i in range(thread_count)]
+
+                def deposit(user_id):
+                    for _ in range(deposits_per_thread):
+                        controller.deposit_money(user_id, 1)
+
+                threads = [threading.Thread(target=deposit, args=(user_id,)) for user_id in user_ids]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                db.close()
+
+                reopened = Database(data_file, journaled=journaled)
+                if any(reopened.get_user(user_id).balance_cents != deposits_per_thread * 100
+                       for user_id in user_ids):
+                    raise RuntimeError(f"{durability}: deposits were lost across close()")
+                label = f"{durability} ({'journal' if journaled else 'snapshots'})"
+                print(f"  {label:<22} {thread_count * deposits_per_thread / elapsed:8.0f} deposits/s")
+
+
+@benchmark("incremental")
+def bench_incremental(user_count: int = 50000, goals_per_user: int = 3, changed: int = 100):
+    """Rewriting a shard after a few changes: full re-encode vs cached record bytes"""
+    import os
+    import tempfile
+    from models.savings_goal import SavingsGoal
+    from models.user import User
+    from utils.codec import get_codec
+    from utils.shard_store import ShardStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # One shard, so every change rewrites all of the data
+        store = ShardStore(os.path.join(tmp, "shards"), get_codec(), shard_count=1)
+        for i in range(user_count):
+            user = User(f"user{i}", f"user{i}@example.com", f"user{i}")
+            store.put("users", user.user_id, user.to_dict())
+            for j in range(goals_per_user):
+                goal = SavingsGoal(user.user_id, f"goal{j}", 100.0 + j, 30)
+                store.put("goals", goal.goal_id, goal.to_dict())
+        store.flush()
+
+        def touch():
+            for i in range(changed):
+                user = User.from_dict(store.get("users", f"user{i}"))
+                user.total_points += 1
+                store.put("users", user.user_id, user.to_dict())
+
+        def full():
+            touch()
+            shard = store._shards[0]
+            shard.stale = {collection: set(records) for collection, records in shard.data.items()}
+            store.flush()
+
+        def incremental():
+            touch()
+            store.flush()
+
+        records = user_count * (1 + goals_per_user)
+        print(f"{records} records in the shard, {changed} changed per flush")
+        print(f"  full re-encode:      {timed(full, repeat=3) * 1000:8.1f} ms")
+        print(f"  cached record bytes: {timed(incremental, repeat=3) * 1000:8.1f} ms  {store.last_flush}")
+
+
+@benchmark("instrumentation")
+def bench_instrumentation(calls: int = 200000):
+    """Cost of the metrics wrapper on a cheap controller call, disabled vs enabled"""
+    import os
+    import tempfile
+    from controllers.savings_controller import SavingsController
+    from utils.database import Database
+    from utils.metrics import METRICS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        controller = SavingsController(Database(os.path.join(tmp, "metrics.json")))
+        user_id = controller.create_user("metered", "metered@example.com").user_id
+        bare = SavingsController.get_user.__wrapped__
+
+        def run(get_user):
+            for _ in range(calls):
+                get_user(controller, user_id)
+
+        enabled = METRICS.enabled
+        try:
+            METRICS.enabled = False
+            baseline = timed(run, bare, repeat=3)
+            disabled = timed(run, SavingsController.get_user, repeat=3)
+            METRICS.enabled = True
+            recording = timed(run, SavingsController.get_user, repeat=3)
+        finally:
+            METRICS.enabled = enabled
+        for label, elapsed in (("uninstrumented", baseline), ("metrics disabled", disabled),
+                               ("metrics enabled", recording)):
+            print(f"  {label:<17} {elapsed / calls * 1e9:7.0f} ns/call "
+                  f"(+{(elapsed - baseline) / calls * 1e9:.0f} ns)")
+
+
+@benchmark("money")
+def bench_money(goal_count: int = 200000):
+    """Integer cents vs float dollars: aggregate sums and JSON encode/decode"""
+    import json
+    import random
+    from models.money import to_dollars
+    from models.savings_goal import SavingsGoal
+
+    rng = random.Random(7)
+    cents_records = []
+    for i in range(goal_count):
+        goal = SavingsGoal(f"user{i}", "goal", rng.randrange(100, 10 ** 6) / 100, 30)
+        goal.add_progress_cents(rng.randrange(1, 10 ** 6))
+        cents_records.append(goal.to_dict())
+    # The same goals in the layout written before amounts moved to cents
+    float_records = []
+    for record in cents_records:
+        record = dict(record)
+        record["target_amount"] = to_dollars(record.pop("target_cents"))
+        record["current_amount"] = to_dollars(record.pop("current_cents"))
+        float_records.append(record)
+
+    float_amounts = [r["current_amount"] for r in float_records]
+    cents_amounts = [r["current_cents"] for r in cents_records]
+    float_text, cents_text = json.dumps(float_records), json.dumps(cents_records)
+    float_total, cents_total = sum(float_amounts), sum(cents_amounts)
+
+    print(f"{goal_count} goals            float dollars    int cents")
+    print(f"  sum saved:        {timed(sum, float_amounts, repeat=5) * 1000:10.1f} ms "
+          f"{timed(sum, cents_amounts, repeat=5) * 1000:10.1f} ms")
+    print(f"  json encode:      {timed(json.dumps, float_records, repeat=3) * 1000:10.1f} ms "
+          f"{timed(json.dumps, cents_records, repeat=3) * 1000:10.1f} ms")
+    print(f"  json decode:      {timed(json.loads, float_text, repeat=3) * 1000:10.1f} ms "
+          f"{timed(json.loads, cents_text, repeat=3) * 1000:10.1f} ms")
+    print(f"  encoded size:     {len(float_text) / 1e6:10.1f} MB {len(cents_text) / 1e6:10.1f} MB")
+    print(f"  float drift:      {abs(float_total * 100 - cents_total):.6f} cents over the total")
+
+
+@benchmark("memory")
+def bench_memory(goal_count: int = 1000000):
+    """Bytes per hydrated goal: __dict__ objects with datetimes vs slotted models"""
+    import gc
+    import tracemalloc
+    from datetime import datetime
+    from models.savings_goal import SavingsGoal
+
+    class DictGoal:
+        """SavingsGoal's layout before slots: instance __dict__, floats, three datetimes"""
+
+        def __init__(self, data):
+            self.goal_id = data['goal_id']
+            self.user_id = data['user_id']
+            self.title = data['title']
+            self.target_amount = data['target_cents'] / 100
+            self.current_amount = data['current_cents'] / 100
+            self.created_at = datetime.fromisoformat(data['created_at'])
+            self.deadline = datetime.fromisoformat(data['deadline'])
+            self.is_completed = data['is_completed']
+            self.completion_date = (datetime.fromisoformat(data['completion_date'])
+                                    if data['completion_date'] else None)
+
+    records = []
+    for i in range(goal_count):
+        goal = SavingsGoal(f"user{i % 1000}", "goal", 100.0 + i % 900, 30)
+        goal.add_progress_cents(i % 150000)
+        records.append(goal.to_dict())
+
+    def measure(hydrate):
+        elapsed = timed(lambda: [hydrate(record) for record in records])
+        gc.collect()
+        tracemalloc.start()
+        objects = [hydrate(record) for record in records]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del objects
+        # The list itself is the same size either way, so leave it out
+        return (size - 8 * goal_count) / goal_count, elapsed
+
+    print(f"{goal_count} goals             bytes/goal   hydrate")
+    for label, hydrate in (("__dict__ + datetime", DictGoal), ("__slots__ + epoch", SavingsGoal.from_dict)):
+        per_goal, elapsed = measure(hydrate)
+        print(f"  {label:<20} {per_goal:10.0f} {elapsed:8.2f} s")
+
+
+@benchmark("codec")
+def bench_codec(user_count: int = 100000, goals_per_user: int = 10):
+    """Whole-data decode time, encode time and peak RSS for each installed codec"""
+    import json
+    import os
+    import subprocess
+    import tempfile
+    from models.savings_goal import SavingsGoal
+    from models.user import User
+    from utils.codec import CODECS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data", "savings_data.json")
+        os.makedirs(os.path.dirname(data_file))
+        data = {"users": {}, "goals": {}}
+        for i in range(user_count):
+            user = User(f"user{i}", f"user{i}@example.com")
+            user.balance_cents = i * 37 % 500000
+            data["users"][user.user_id] = user.to_dict()
+            for j in range(goals_per_user):
+                goal = SavingsGoal(user.user_id, f"goal{j}", 100.0 + j, 30)
+                goal.add_progress_cents((i + j) % 15000)
+                data["goals"][goal.goal_id] = goal.to_dict()
+        with open(data_file, 'w') as f:
+            json.dump(data, f)
+        del data
+
+        # Each codec runs in a fresh interpreter so peak RSS is its own
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        print(f"{user_count} users, {user_count * goals_per_user} goals")
+        print(f"  {'codec':<18} {'load':>8} {'save':>8} {'file':>9} {'peak RSS':>10}")
+        runs = [("json", True)] + [(name, False) for name in CODECS]
+        for codec, pretty in runs:
+            probe = f"import benchmarks; benchmarks.probe_codec({data_file!r}, {codec!r}, {pretty})"
+            result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True)
+            if result.returncode:
+                print(f"  {codec}: failed\n{result.stderr}")
+                continue
+            load, save, size, rss = json.loads(result.stdout)
+            label = codec + (" (indent=2)" if pretty else "")
+            print(f"  {label:<18} {load:7.2f}s {save:7.2f}s {size / 1e6:7.1f}MB {rss / 1e6:8.0f}MB")
+
+
+def probe_codec(data_file: str, codec: str, pretty: bool):
+    """Decode and re-encode data_file with one codec and print timings (run by bench_codec)"""
+    import json
+    import os
+    import resource
+    from models.records import DataFile
+    from utils.codec import get_codec
+
+    # The whole file at once, as a full scan of every shard would decode it
+    codec = get_codec(codec)
+    start = time.perf_counter()
+    with open(data_file, 'rb') as f:
+        data = codec.decode(f.read(), DataFile)
+    load = time.perf_counter() - start
+    out_file = data_file + ".out"
+    start = time.perf_counter()
+    with open(out_file, 'wb') as f:
+        f.write(codec.encode(data, pretty))
+    save = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    print(json.dumps([load, save, os.path.getsize(out_file), rss]))
+
+
+@benchmark("startup")
+def bench_startup(sizes=(10000, 100000), goals_per_user: int = 5):
+    """Cold start: decoding a whole single data file vs opening the shard store"""
+    import os
+    import tempfile
+    from models.records import DataFile
+    from models.savings_goal import SavingsGoal
+    from models.user import User
+    from utils.database import Database
+
+    print(f"  {'users':>8} {'single file':>12} {'open shards':>12} {'first read':>11}")
+    for user_count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, "savings_data.json")
+            data = {"users": {}, "goals": {}}
+            for i in range(user_count):
+                user = User(f"user{i}", f"user{i}@example.com", f"user{i}")
+                data["users"][user.user_id] = user.to_dict()
+                for j in range(goals_per_user):
+                    goal = SavingsGoal(user.user_id, f"goal{j}", 100.0 + j, 30)
+                    data["goals"][goal.goal_id] = goal.to_dict()
+            db = Database(data_file)
+            with open(data_file, 'wb') as f:
+                f.write(db.codec.encode(data))
+            del data
+
+            with open(data_file, 'rb') as f:
+                decode = timed(lambda: db.codec.decode(f.read(), DataFile))
+            Database(data_file)  # Migrates to shards
+            opened = timed(lambda: Database(data_file), repeat=3)
+            db = Database(data_file)
+            user_id = f"user{user_count // 2}"
+            first = timed(lambda: (db.get_user(user_id), db.get_user_goals(user_id)))
+            print(f"  {user_count:8d} {decode * 1000:10.1f}ms {opened * 1000:10.2f}ms {first * 1000:9.2f}ms")
+
+
+@benchmark("login")
+def bench_login(user_count: int = 100000, page_size: int = 20):
+    """Finding a user by email and listing a page: scanning every user vs the user index"""
+    import os
+    import tempfile
+    from models.user import User
+    from utils.database import Database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "savings_data.json")
+        data = {"users": {}, "goals": {}}
+        for i in range(user_count):
+            user = User(f"user{i}", f"User{i}@Example.com", f"user{i}")
+            data["users"][user.user_id] = user.to_dict()
+        db = Database(data_file)
+        with open(data_file, 'wb') as f:
+            f.write(db.codec.encode(data))
+        del data
+        Database(data_file).close()  # Migrates to shards and writes the user index
+
+        email = f"user{user_count // 2}@example.com"
+        db = Database(data_file)
+        scan = timed(lambda: next(u for u in db.get_all_users() if u.email.lower() == email))
+        db = Database(data_file)
+        first = timed(lambda: db.get_user_by_email(email))
+        lookup = timed(lambda: db.get_user_by_email(email), repeat=5)
+        _, cursor = db.list_users(page_size)
+        page = timed(lambda: db.list_users(page_size, cursor), repeat=5)
+        print(f"  {user_count} users: scan {scan * 1000:.1f}ms, index load + lookup {first * 1000:.1f}ms, "
+              f"lookup {lookup * 1e6:.0f}us, page of {page_size} {page * 1000:.2f}ms")
+
+
+@benchmark("deadlines")
+def bench_deadlines(user_count: int = 50000, goals_per_user: int = 4, due_count: int = 100):
+    """Finding goals past their deadline: scanning every goal vs the deadline heap"""
+    import os
+    import tempfile
+    from controllers.deadline_scheduler import DeadlineScheduler
+    from controllers.game_controller import GameController
+    from models.savings_goal import SavingsGoal
+    from models.timestamps import DAY_MICROS, now_micros
+    from models.user import User
+    from utils.database import Database
+
+    now = now_micros()
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "savings_data.json")
+        data = {"users": {}, "goals": {}}
+        for i in range(user_count):
+            user = User(f"user{i}", f"user{i}@example.com", f"user{i}")
+            data["users"][user.user_id] = user.to_dict()
+            for j in range(goals_per_user):
+                goal = SavingsGoal(user.user_id, f"goal{j}", 100.0, 30 + (i * goals_per_user + j) % 365)
+                goal.is_completed = j % 2 == 0  # Half are done
+                data["goals"][goal.goal_id] = goal.to_dict()
+        db = Database(data_file)
+        with open(data_file, 'wb') as f:
+            f.write(db.codec.encode(data))
+        del data
+        Database(data_file).close()  # Migrates to shards
+
+        db = Database(data_file)
+        cutoff = now + 40 * DAY_MICROS
+        scan = timed(lambda: [g for _, goals in db.iter_user_records() for g in map(SavingsGoal.from_dict, goals)
+                              if not g.is_completed and g.deadline_us <= cutoff])
+        db = Database(data_file)
+        state_file = os.path.join(tmp, "deadlines.json")
+        scheduler = None
+
+        def attach():
+            nonlocal scheduler
+            scheduler = DeadlineScheduler.attach(GameController(db), state_file=state_file)
+        load = timed(attach)
+        shards_read = db.store.loads
+        # Pop a window holding about due_count entries
+        open_goals = scheduler.stats()['open_goals']
+        window = 365 * DAY_MICROS * due_count // max(open_goals * 2, 1)
+        pop = timed(lambda: scheduler.pop_due(now + 30 * DAY_MICROS + window))
+        print(f"  {user_count * goals_per_user} goals ({open_goals} open): scan {scan * 1000:.1f}ms, "
+              f"heap load {load * 1000:.1f}ms ({shards_read} shards read), pop ~{due_count} due {pop * 1000:.2f}ms")
+
+
+@benchmark("import")
+def bench_import(user_count: int = 2000, row_count: int = 50000, naive_rows: int = 2000):
+    """Deposit feed rows per second: one controller call chain per row vs the batched importer"""
+    import os
+    import random
+    import tempfile
+    from controllers.bank_feed import DepositImporter, export_ndjson
+    from controllers.game_controller import GameController, DEPOSIT_POINTS_PER_DOLLAR
+    from controllers.savings_controller import SavingsController
+    from models.money import points_for, to_cents
+    from models.user import User
+    from utils.database import Database
+
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "savings_data.json")
+        data = {"users": {f"user{i}": User(f"user{i}", f"user{i}@example.com", f"user{i}").to_dict()
+                          for i in range(user_count)}, "goals": {}}
+        db = Database(data_file)
+        with open(data_file, 'wb') as f:
+            f.write(db.codec.encode(data))
+        del data
+        feed = os.path.join(tmp, "feed.csv")
+        with open(feed, 'w') as f:
+            f.write("id,user_id,amount,date\n")
+            for i in range(row_count):
+                f.write(f"t{i},user{random.randrange(user_count)},{random.randint(1, 500)}.25,"
+                        f"2026-{1 + i * 12 // row_count:02d}-{1 + i % 28:02d}\n")
+
+        db = Database(data_file, journaled=True, durability="group")
+        savings, game = SavingsController(db), GameController(db)
+
+        def naive():
+            with open(feed) as f:
+                next(f)
+                for line in f.readlines()[:naive_rows]:
+                    _, user_id, amount, _ = line.rstrip().split(",")
+                    savings.deposit_money(user_id, float(amount))
+                    game.award_points(user_id, points_for(to_cents(amount), DEPOSIT_POINTS_PER_DOLLAR))
+                    game.check_and_award_achievements(user_id)
+        per_row = timed(naive) / naive_rows
+        importer = DepositImporter(db, keys_file=os.path.join(tmp, "keys"))
+        stats = importer.import_file(feed)
+        with open(os.path.join(tmp, "export.ndjson"), 'wb') as out:
+            exported = timed(lambda: export_ndjson(db, out))
+        db.close()
+        print(f"  per row: {1 / per_row:8.0f} rows/sec ({naive_rows} rows)")
+        print(f"  batched: {stats['rows_per_second']:8.0f} rows/sec ({stats['imported']} rows, "
+              f"{stats['batches']} batches)")
+        print(f"  export:  {exported * 1000:8.1f}ms for {user_count} users")
+
+
+@benchmark("scaling")
+def bench_scaling(client_count: int = 64, requests_per_client: int = 100, threads: int = 4):
+    """HTTP API deposit throughput as worker processes are added (see cluster.py)"""
+    import asyncio
+    import multiprocessing
+    import os
+    import tempfile
+    from api_server import ApiServer, SavingsApi
+    from cluster import Cluster
+    from utils.database import Database
+    from utils.ledger import Ledger
+
+    # The clients get their own process so generating load does not share the coordinator's core
+    context = multiprocessing.get_context("spawn")
+
+    async def measure(server):
+        await server.start("127.0.0.1", 0)
+        receiver, sender = context.Pipe(duplex=False)
+        load = context.Process(target=drive_load, args=(server.port, client_count, requests_per_client, sender))
+        load.start()
+        sender.close()
+        completed, elapsed = await asyncio.get_running_loop().run_in_executor(None, receiver.recv)
+        load.join()
+        server.server.close()
+        await server.server.wait_closed()
+        return completed / elapsed
+
+    async def single(tmp):
+        db = Database(os.path.join(tmp, "savings_data.json"), journaled=True)
+        ledger = Ledger(os.path.join(tmp, "savings_ledger.bin"))
+        api = SavingsApi(db, ledger, threads)
+        try:
+            return await measure(ApiServer(api))
+        finally:
+            api.executor.shutdown()
+            db.close()
+            ledger.close()
+
+    async def clustered(tmp, processes):
+        cluster = Cluster(tmp, processes, threads=threads)
+        try:
+            return await measure(ApiServer(await cluster.start()))
+        finally:
+            cluster.stop()
+
+    cores = os.cpu_count() or 1
+    print(f"{client_count} clients x {requests_per_client} deposits, {cores} cores")
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"  single process:    {asyncio.run(single(tmp)):8.0f} req/s")
+    for processes in sorted({1, 2, 4, cores}):
+        with tempfile.TemporaryDirectory() as tmp:
+            rate = asyncio.run(clustered(tmp, processes))
+        print(f"  {processes:>3} worker(s):      {rate:8.0f} req/s")
+
+
+def drive_load(port: int, client_count: int, requests_per_client: int, result_pipe):
+    """Register one user per client and deposit over keep-alive connections (run by bench_scaling)
+
+    Sends (successful deposits, seconds taken) through result_pipe.
+    """
+    import asyncio
+
+    async def client(index):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        created = await http_request(reader, writer, "POST", "/users",
+                                     {"name": "client", "email": f"client{index}@example.com"})
+        path = f"/users/{created['user']['user_id']}/deposit"
+        completed = 0
+        for _ in range(requests_per_client):
+            response = await http_request(reader, writer, "POST", path, {"amount": 5})
+            completed += "error" not in response
+        writer.close()
+        return completed
+
+    async def run():
+        start = time.perf_counter()
+        completed = await asyncio.gather(*(client(i) for i in range(client_count)))
+        return sum(completed), time.perf_counter() - start
+
+    result_pipe.send(asyncio.run(run()))
+    result_pipe.close()
+
+
+@benchmark("levels")
+def bench_levels(point_count: int = 1000000, awards: int = 200000, user_count: int = 20000):
+    """Level lookups per award, and recomputing every level after a curve change"""
+    import os
+    import random
+    import tempfile
+    from controllers.game_controller import GameController
+    from models.level_curve import LevelCurve, np, set_curve
+    from models.user import User
+    from utils.database import Database
+
+    random.seed(11)
+    points = [random.randrange(0, 200000) for _ in range(point_count)]
+    curves = {"linear": LevelCurve.linear(),
+              "exponential": LevelCurve.exponential(growth=1.1, rewards={5: 50, 10: 100, 20: 250})}
+    print(f"{point_count} point totals, numpy={'yes' if np is not None else 'no'}")
+    try:
+        for name, curve in curves.items():
+            set_curve(curve)
+            user = User("bench", "bench@example.com")
+            award = timed(lambda: [user.add_points(5) for _ in range(awards)])
+            print(f"  {name}:")
+            print(f"    add_points:     {award / awards * 1e9:8.0f} ns/award")
+            print(f"    per-user loop:  {timed(lambda: [curve.level_for(p) for p in points]) * 1000:8.1f} ms")
+            print(f"    levels_for:     {timed(curve.levels_for, points, repeat=3) * 1000:8.1f} ms")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, "savings_data.json")
+            users = {}
+            for i in range(user_count):
+                user = User(f"user{i}", f"user{i}@example.com", f"user{i}")
+                user.total_points = points[i]
+                user.level = curves["linear"].level_for(user.total_points)
+                users[user.user_id] = user.to_dict()
+            db = Database(data_file)
+            with open(data_file, 'wb') as f:
+                f.write(db.codec.encode({"users": users, "goals": {}}))
+            db = Database(data_file, journaled=True)
+            stats = GameController(db).recompute_levels(curves["exponential"])
+            db.close()
+        print(f"  recompute_levels: {stats['seconds'] * 1000:8.1f} ms for {stats['users']} stored users "
+              f"({stats['changed']} changed)")
+    finally:
+        set_curve(None)
+
+
+def main(argv) -> int:
+    names = argv or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        return 2
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
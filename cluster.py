@@ -0,0 +1,310 @@
+"""Multi-process deployment: a coordinator routing API requests to worker processes
+
+Run with `python cluster.py [--processes N] [--host HOST] [--port PORT]`.
+
+Each worker process hosts its own SavingsController/GameController over its
+own partition of the data (<data dir>/partition-<i>/) and owns the users a
+consistent hash of user_id maps to it, so every user has a single writer
+and no locks are shared between processes. The coordinator serves HTTP
+through ApiServer, forwards each per-user request to the owning worker over
+one multiplexed local connection per worker, and fans out requests that
+span users: listing users (pages merged in created_at order), finding a
+user by email, and creating a user, whose email must be free in every
+partition. Only the coordinator parses HTTP; controller logic and JSON
+encoding of results run in parallel in the workers.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import signal
+import struct
+import uuid
+from http import HTTPStatus
+from typing import Any, Dict, List, Tuple
+from api_server import ApiServer, SavingsApi
+from models.timestamps import parse_micros
+from utils.codec import get_codec
+from utils.database import DURABILITY_MODES, Database
+from utils.hash_ring import HashRing
+from utils.ledger import Ledger
+from utils.lock_manager import StripedLockManager
+from utils.metrics import configure_from_env
+from utils.user_index import format_cursor, normalize_email
+
+CLUSTER_FILE = "cluster.json"
+FRAME = struct.Struct("<I")  # Length of the encoded message that follows
+
+USER_PATH = re.compile(r"/users/([^/]+)(?:/.*)?")
+
+
+def _frame(codec, message: Any) -> bytes:
+    data = codec.encode(message)
+    return FRAME.pack(len(data)) + data
+
+
+async def _read_frame(reader: asyncio.StreamReader, codec) -> Any:
+    size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return codec.decode(await reader.readexactly(size))
+
+
+def partition_file(data_dir: str, index: int) -> str:
+    return os.path.join(data_dir, f"partition-{index}", "savings_data.json")
+
+
+def _check_layout(data_dir: str, processes: int, replicas: int):
+    """Record the partition count on first start and refuse to open the data with another"""
+    path = os.path.join(data_dir, CLUSTER_FILE)
+    layout = {"processes": processes, "replicas": replicas}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            stored = json.load(f)
+        if stored != layout:
+            raise ValueError(f"{data_dir} is partitioned for {stored['processes']} processes "
+                             f"(replicas {stored['replicas']}); moving users between partitions is not supported")
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    temp_file = path + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(layout, f)
+    os.replace(temp_file, path)
+
+
+# Worker side
+
+async def _serve_worker(data_file: str, durability: str, threads: int, port_pipe):
+    data_dir = os.path.dirname(data_file)
+    db = Database(data_file, journaled=True, durability=durability)
+    ledger = Ledger(os.path.join(data_dir, "savings_ledger.bin"))
+    api = SavingsApi(db, ledger, threads, deadlines_file=os.path.join(data_dir, "deadlines.json"))
+    codec = get_codec()
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests are answered as they finish, not in arrival order
+        async def answer(request_id: int, method: str, path: str, body: Dict):
+            status, payload = await api.handle(method, path, body)
+            writer.write(_frame(codec, [request_id, int(status), payload]))
+
+        in_flight = set()
+        try:
+            while True:
+                request_id, method, path, body = await _read_frame(reader, codec)
+                task = asyncio.ensure_future(answer(request_id, method, path, body))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Coordinator gone, or the worker is shutting down
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, server.close)
+    port_pipe.send(server.sockets[0].getsockname()[1])
+    port_pipe.close()
+    deadlines = asyncio.ensure_future(api.run_deadlines())
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass  # Closed by a signal
+    finally:
+        deadlines.cancel()
+        api.executor.shutdown()
+        db.close()
+        ledger.close()
+
+
+def _worker_main(data_file: str, durability: str, threads: int, port_pipe):
+    asyncio.run(_serve_worker(data_file, durability, threads, port_pipe))
+
+
+# Coordinator side
+
+class WorkerConnection:
+    """One multiplexed connection to a worker: many requests in flight, matched by id"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.codec = get_codec()
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    async def request(self, method: str, path: str, body: Dict) -> Tuple[int, Dict]:
+        if self._receiver.done():
+            raise ConnectionError("Worker connection is closed")
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        self._writer.write(_frame(self.codec, [request_id, method, path, body]))
+        await self._writer.drain()
+        return await future
+
+    async def _receive(self):
+        try:
+            while True:
+                request_id, status, payload = await _read_frame(self._reader, self.codec)
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Worker connection lost"))
+            self._pending.clear()
+
+    def close(self):
+        self._receiver.cancel()
+        self._writer.close()
+
+
+class ClusterApi:
+    """Coordinator: routes requests to the worker owning the user, merging cross-user reads"""
+
+    def __init__(self, workers: List[WorkerConnection], ring: HashRing):
+        self.workers = workers
+        self.ring = ring
+        self.email_locks = StripedLockManager()  # Serializes registrations of the same email
+
+    def owner(self, user_id: str) -> WorkerConnection:
+        return self.workers[self.ring.node_for(user_id)]
+
+    async def handle(self, method: str, path: str, body: Dict) -> Tuple[HTTPStatus, Dict]:
+        try:
+            match = USER_PATH.fullmatch(path)
+            if match:
+                status, payload = await self.owner(match.group(1)).request(method, path, body)
+            elif path == "/users" and method == "POST":
+                status, payload = await self._create_user(body)
+            elif path == "/users" and method == "GET" and "email" in body:
+                status, payload = await self._find_email(body)
+            elif path == "/users" and method == "GET":
+                status, payload = await self._list_users(body)
+            else:  # Unknown routes get the workers' own 404/405
+                status, payload = await self.workers[0].request(method, path, body)
+        except ConnectionError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        return HTTPStatus(status), payload
+
+    async def _fan_out(self, method: str, path: str, body: Dict) -> List[Tuple[int, Dict]]:
+        return await asyncio.gather(*(worker.request(method, path, body) for worker in self.workers))
+
+    async def _create_user(self, body: Dict) -> Tuple[int, Dict]:
+        email = body.get("email")
+        if not isinstance(email, str):  # The worker reports what is missing
+            return await self.workers[0].request("POST", "/users", body)
+        async with self.email_locks.async_lock(normalize_email(email)):
+            status, _ = await self._find_email({"email": email})
+            if status == HTTPStatus.OK:
+                return HTTPStatus.CONFLICT, {"error": f"Email {email} is already registered"}
+            user_id = str(uuid.uuid4())
+            return await self.owner(user_id).request("POST", "/users", dict(body, user_id=user_id))
+
+    async def _find_email(self, body: Dict) -> Tuple[int, Dict]:
+        responses = await self._fan_out("GET", "/users", {"email": body["email"]})
+        for status, payload in responses:
+            if status != HTTPStatus.NOT_FOUND:
+                return status, payload
+        return responses[0]
+
+    async def _list_users(self, body: Dict) -> Tuple[int, Dict]:
+        """Merge every partition's page after the cursor into one page of the global order
+
+        Cursors are (created_at, user_id) positions, so the same cursor means
+        the same place in every partition.
+        """
+        responses = await self._fan_out("GET", "/users", body)
+        for status, payload in responses:
+            if status != HTTPStatus.OK:
+                return status, payload
+        limit = int(body.get("limit", 20))  # Validated by the workers
+
+        def key(user: Dict) -> Tuple[int, str]:
+            return parse_micros(user['created_at']), user['user_id']
+        users = sorted((user for _, payload in responses for user in payload["users"]), key=key)
+        more = len(users) > limit or any(payload["next_cursor"] for _, payload in responses)
+        page = users[:limit]
+        return HTTPStatus.OK, {"users": page, "next_cursor": format_cursor(*key(page[-1])) if more else None}
+
+
+class Cluster:
+    """Worker processes over a partitioned data directory, and the coordinator's connections to them"""
+
+    def __init__(self, data_dir: str, processes: int, durability: str = "group",
+                 threads: int = 4, replicas: int = 128):
+        _check_layout(data_dir, processes, replicas)
+        self.data_dir = data_dir
+        self.processes = processes
+        self.durability = durability
+        self.threads = threads
+        self.ring = HashRing(processes, replicas)
+        self._workers = []
+        self._connections = []
+
+    async def start(self) -> ClusterApi:
+        """Spawn the workers, wait for each to listen and connect to it"""
+        context = multiprocessing.get_context("spawn")  # No forked copies of the coordinator's threads
+        pipes = []
+        for index in range(self.processes):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_worker_main, name=f"savings-worker-{index}", daemon=True,
+                                      args=(partition_file(self.data_dir, index), self.durability,
+                                            self.threads, sender))
+            process.start()
+            sender.close()
+            self._workers.append(process)
+            pipes.append(receiver)
+        loop = asyncio.get_running_loop()
+        for receiver in pipes:
+            port = await loop.run_in_executor(None, receiver.recv)
+            receiver.close()
+            self._connections.append(WorkerConnection(*await asyncio.open_connection("127.0.0.1", port)))
+        return ClusterApi(self._connections, self.ring)
+
+    def stop(self):
+        """Disconnect and let every worker flush and close its storage"""
+        for connection in self._connections:
+            connection.close()
+        for process in self._workers:
+            process.terminate()  # SIGTERM: the worker closes its database before exiting
+        for process in self._workers:
+            process.join()
+        self._connections = []
+        self._workers = []
+
+
+async def serve_cluster(host: str, port: int, data_dir: str, processes: int,
+                        durability: str = "group", threads: int = 4):
+    cluster = Cluster(data_dir, processes, durability, threads)
+    server = ApiServer(await cluster.start())
+    await server.start(host, port)
+    print(f"Serving on http://{host}:{server.port} with {processes} worker processes")
+    try:
+        async with server.server:
+            await server.server.serve_forever()
+    finally:
+        cluster.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gamified Savings HTTP API across worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", default="data/cluster")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; fixed once the data directory is created")
+    parser.add_argument("--threads", type=int, default=4, help="storage executor threads per worker")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="group")
+    args = parser.parse_args()
+    configure_from_env()
+    try:
+        asyncio.run(serve_cluster(args.host, args.port, args.data_dir, args.processes,
+                                  args.durability, args.threads))
+    except KeyboardInterrupt:
+        pass
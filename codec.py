@@ -0,0 +1,84 @@
+# utils/codec.py
+import json
+from typing import Any, Dict, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec:
+    """Standard library json, always available"""
+
+    name = "json"
+
+    def encode(self, obj: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, indent=2).encode("utf-8")
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes, schema: Any = None) -> Any:
+        """Parse data; the schema is only enforced by codecs with typed decoding"""
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """orjson: native encoder and decoder, no typed decoding"""
+
+    name = "orjson"
+
+    def encode(self, obj: Any, pretty: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+    def decode(self, data: bytes, schema: Any = None) -> Any:
+        return orjson.loads(data)
+
+
+class MsgspecCodec:
+    """msgspec: native encoder and decoder that validates against typed schemas"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoders = {None: msgspec.json.Decoder()}  # schema -> reusable Decoder
+
+    def encode(self, obj: Any, pretty: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def decode(self, data: bytes, schema: Any = None) -> Any:
+        """Parse data, raising ValueError if it does not match schema"""
+        decoder = self._decoders.get(schema)
+        if decoder is None:
+            decoder = self._decoders[schema] = msgspec.json.Decoder(schema)
+        return decoder.decode(data)
+
+
+CODECS = {"json": JsonCodec}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+if msgspec is not None:
+    CODECS["msgspec"] = MsgspecCodec
+
+# Fastest first
+PREFERENCE = ("msgspec", "orjson", "json")
+
+_instances: Dict[str, Any] = {}
+
+
+def get_codec(name: Optional[str] = None):
+    """Get the named codec, or the fastest one installed"""
+    if name is None:
+        name = next(n for n in PREFERENCE if n in CODECS)
+    if name not in CODECS:
+        raise ValueError(f"Codec '{name}' is not available (installed: {', '.join(CODECS)})")
+    if name not in _instances:
+        _instances[name] = CODECS[name]()
+    return _instances[name]
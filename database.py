@@ -1,28 +1,520 @@
 # utils/database.py
-import json
 import os
-from typing import Dict, List, Optional
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.user import User
+from models.savings_goal import SavingsGoal
+from models.money import upgrade_record
+from utils.codec import get_codec
+from utils.journal import Journal
+from utils.shard_store import CorruptDataError, ShardStore, read_data_file, shard_of
+from utils.user_index import format_cursor, normalize_email, parse_cursor
+from utils.identity_map import IdentityMap
+from utils.metrics import METRICS
+
+# Collections whose records carry a version bumped on every stored write
+VERSIONED_COLLECTIONS = ("users",)
+
+# When a write reaches disk:
+#   sync     - before the call returns, with an fsync per write
+#   group    - before the call returns, sharing one fsync with concurrent writers
+#   interval - within flush_interval seconds (or flush_threshold writes); calls never wait
+DURABILITY_MODES = ("sync", "group", "interval")
+
+# After a failed flush (disk full, EIO) the flusher waits this long before retrying,
+# doubling up to the maximum while it keeps failing
+FLUSH_RETRY_DELAY = 0.05
+FLUSH_RETRY_MAX_DELAY = 5.0
+
+
+class ConcurrentUpdateError(Exception):
+    """A transaction's compare-and-swap saves lost to another writer"""
+
+
+class DuplicateEmailError(ValueError):
+    """Another user is already registered with the email"""
+
+
+class _UnitOfWork:
+    """Identity map and pending writes for one Database.transaction()"""
+
+    def __init__(self):
+        self.objects = {"users": {}, "goals": {}}
+        self.dirty = {}  # (collection, id) -> None, in write order
+        self.expected_versions = {}  # (collection, id) -> version required at commit
+        self.new_users = []  # ids passed to add_user, whose emails are checked again at commit
+
+    def mark_dirty(self, collection: str, record_id: str):
+        self.dirty[(collection, record_id)] = None
 
 class Database:
-    def __init__(self, data_file: str = "data/savings_data.json"):
+    def __init__(self, data_file: str = "data/savings_data.json",
+                 journaled: bool = False, compact_threshold: int = 1000,
+                 cache_size: int = 1024, codec: str = None, pretty: bool = False,
+                 shard_count: int = 64, max_loaded_shards: int = 32,
+                 durability: str = "sync", flush_interval: float = 1.0, flush_threshold: int = 1000):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode {durability!r}, expected one of {DURABILITY_MODES}")
         self.data_file = data_file
-        self.data = self._load_data()
-    
+        self.compact_threshold = compact_threshold
+        self.cache = IdentityMap(cache_size)
+        # Fastest installed codec unless one is named; pretty indents the shard files
+        self.codec = get_codec(codec)
+        self.pretty = pretty
+        self.journal = Journal(data_file + ".log", self.codec) if journaled else None
+        # Transactions are per thread; the lock guards shared data, cache and files
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._listeners = []
+        # Writes not made durable yet are flushed in batches by a background thread
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._flushed = threading.Condition(self._lock)
+        self._stored_count = self._durable_count = 0  # Record writes stored / made durable
+        self._flush_failures = 0
+        self._flush_error = None
+        self._closing = False
+        self._flusher = None
+        # Records live in data/savings_data.shards/ next to the old single file;
+        # opening reads only the shard manifest, shards load as they are touched
+        self.shard_dir = os.path.splitext(data_file)[0] + ".shards"
+        with METRICS.timer("database.open"):
+            self.store = ShardStore(self.shard_dir, self.codec, shard_count, max_loaded_shards, pretty)
+            if not self.store.committed and os.path.exists(data_file):
+                self._migrate_single_file()
+            if self.journal:
+                self.journal.replay(self._replay_entry)
+        METRICS.register_collector("database", self.gauges)
+        if durability != "sync":
+            self._flusher = threading.Thread(target=self._flush_loop, name="database-flusher", daemon=True)
+            self._flusher.start()
+
+    @property
+    def _transaction(self) -> Optional[_UnitOfWork]:
+        return getattr(self._local, "unit", None)
+
+    @_transaction.setter
+    def _transaction(self, unit: Optional[_UnitOfWork]):
+        self._local.unit = unit
+
     def _load_data(self) -> Dict:
-        """Load data from JSON file"""
+        """Load data from the single JSON file used before sharding
+        
+        Raises CorruptDataError rather than starting empty over a damaged file.
+        """
         if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                pass
+            return read_data_file(self.data_file, self.codec)
         
         return {"users": {}, "goals": {}}
     
-    def _save_data(self):
-        """Save data to JSON file"""
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def _migrate_single_file(self):
+        """Split the single data file into shards, keeping it as <data_file>.migrated
+        
+        The shard manifest is written last, so an interrupted migration is
+        simply redone on the next start.
+        """
+        data = self._load_data()
+        for collection, model, owner in (("users", User, lambda item: item[0]),
+                                         ("goals", SavingsGoal, lambda item: item[1]["user_id"])):
+            # In shard order, so each shard is loaded and written once
+            items = sorted(data[collection].items(),
+                           key=lambda item: shard_of(owner(item), self.store.shard_count))
+            for record_id, record in items:
+                self.store.put(collection, record_id, upgrade_record(record, model.AMOUNT_FIELDS))
+        self.store.flush()
+        os.replace(self.data_file, self.data_file + ".migrated")
+    
+    def _replay_entry(self, collection: str, record_id: str, record: Dict):
+        model = User if collection == "users" else SavingsGoal
+        self.store.put(collection, record_id, upgrade_record(record, model.AMOUNT_FIELDS))
     
-    # Add your database methods here...
+    def _persist(self, collection: str, record_id: str):
+        """Make a single record mutation durable"""
+        self._persist_many([(collection, record_id)])
+
+    def _persist_many(self, keys: List[Tuple[str, str]]):
+        """Make a group of record mutations durable with one write (lock held)
+        
+        Outside sync mode the write is handed to the flusher thread: group
+        mode waits for the flush that covers it, interval mode does not.
+        """
+        sync = self.durability == "sync"
+        METRICS.increment("database.records_written", len(keys))
+        if self.journal:
+            if len(keys) == 1:
+                collection, record_id = keys[0]
+                self.journal.append(collection, record_id, self.store.get(collection, record_id), sync)
+            else:
+                self.journal.append_batch([(c, i, self.store.get(c, i)) for c, i in keys], sync)
+            if sync and self.journal.record_count >= self.compact_threshold:
+                self.compact()
+        elif sync:
+            self.store.flush()  # Only the shards these records live in
+        if not sync:
+            self._stored_count += len(keys)
+            if self.durability == "group":
+                self._wait_for_flush(self._stored_count)
+            elif self._stored_count - self._durable_count >= self.flush_threshold:
+                self._flushed.notify_all()
+        for listener in self._listeners:
+            for collection, record_id in keys:
+                try:
+                    listener(collection, self.store.get(collection, record_id))
+                except Exception as e:  # The write is committed, so the writer must not see it fail
+                    METRICS.increment("database.listener_errors")
+                    print(f"Listener failed on {collection} record {record_id}: {type(e).__name__}: {e}",
+                          file=sys.stderr)
+
+    def subscribe(self, listener: Callable[[str, Dict], None]):
+        """Call listener(collection, record) after every user/goal write
+        
+        In sync and group mode the write is durable by then; in interval mode
+        it is stored but may not have been flushed yet. An exception from a
+        listener is reported on stderr and counted, never raised to the writer.
+        """
+        self._listeners.append(listener)
+
+    def _wait_for_flush(self, count: int):
+        """Block until the first count stored writes are durable (lock held)"""
+        failures = self._flush_failures
+        self._flushed.notify_all()
+        while self._durable_count < count:
+            if self._flush_failures != failures:
+                raise self._flush_error
+            self._flushed.wait()
+
+    def _flush_loop(self):
+        """Flusher thread: make stored writes durable in batches until close()"""
+        retry_delay = FLUSH_RETRY_DELAY
+        with self._lock:
+            while not self._closing:
+                pending = self._stored_count - self._durable_count
+                if self.durability == "group" and not pending:
+                    self._flushed.wait()
+                elif self.durability == "interval" and pending < self.flush_threshold:
+                    self._flushed.wait(self.flush_interval)
+                if self._closing:
+                    break
+                try:
+                    self._flush_pending()
+                    retry_delay = FLUSH_RETRY_DELAY
+                except Exception as exc:  # Reported to waiting writers, then retried after a back-off
+                    self._flush_error = exc
+                    self._flush_failures += 1
+                    self._flushed.notify_all()
+                    self._back_off(retry_delay)
+                    retry_delay = min(retry_delay * 2, FLUSH_RETRY_MAX_DELAY)
+
+    def _back_off(self, seconds: float):
+        """Wait seconds with the lock released, or until close() (lock held)"""
+        deadline = time.monotonic() + seconds
+        while not self._closing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._flushed.wait(remaining)
+
+    def _flush_pending(self):
+        """Make every stored write durable with one fsync or shard flush (lock held)"""
+        if self._durable_count == self._stored_count:
+            return
+        with METRICS.timer("database.flush"):
+            if self.journal:
+                self.journal.sync()
+                if self.journal.record_count >= self.compact_threshold:
+                    self.compact()
+            else:
+                self.store.flush()
+        self._durable_count = self._stored_count
+        self._flushed.notify_all()
+
+    def flush(self):
+        """Make every write stored so far durable now, whatever the durability mode"""
+        with self._lock:
+            self._flush_pending()
+
+    @contextmanager
+    def transaction(self):
+        """Group reads and writes so they are flushed once, atomically, on exit
+
+        Inside the block get_user/get_goal return the same object for an id,
+        private to this transaction, and save_user/save_goal only mark records
+        dirty. Nested blocks join the outermost one. If the block raises, or a
+        compare_and_swap_user made inside it finds the record changed by
+        another writer (ConcurrentUpdateError), nothing is written.
+        """
+        if self._transaction is not None:
+            yield self
+            return
+
+        unit = self._transaction = _UnitOfWork()
+        try:
+            yield self
+            with self._lock:
+                for (collection, record_id), version in unit.expected_versions.items():
+                    if self._stored_version(collection, record_id) != version:
+                        raise ConcurrentUpdateError(f"{collection} record {record_id} was modified")
+                for user_id in unit.new_users:
+                    self._check_email_free(unit.objects["users"][user_id])
+                for collection, record_id in unit.dirty:
+                    self._store(collection, record_id, unit.objects[collection][record_id])
+                if unit.dirty:
+                    self._persist_many(list(unit.dirty))
+        except BaseException:
+            # Objects saved during the block may be shared cache entries
+            with self._lock:
+                for key in unit.dirty:
+                    self.cache.invalidate(key)
+            raise
+        finally:
+            self._transaction = None
+
+    def compact(self):
+        """Write the shards changed since the last snapshot and truncate the journal"""
+        with self._lock, METRICS.timer("database.compact"):
+            self.store.flush()
+            if self.journal:
+                self.journal.truncate()
+            self._durable_count = self._stored_count
+            self._flushed.notify_all()
+
+    def close(self):
+        """Stop the flusher, write outstanding changes and release the log"""
+        if self._flusher is not None:
+            with self._lock:
+                self._closing = True
+                self._flushed.notify_all()
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            if self.journal and self.journal.record_count:
+                self.compact()
+            else:
+                self._flush_pending()
+            if self.journal:
+                self.journal.close()
+
+    def _get(self, collection: str, record_id: str, model, owner: str = None):
+        unit = self._transaction
+        if unit is not None:
+            if record_id in unit.objects[collection]:
+                return unit.objects[collection][record_id]
+            # Hydrate a private copy so other threads never see uncommitted changes
+            with self._lock:
+                record = self.store.get(collection, record_id, owner)
+            if not record:
+                return None
+            obj = unit.objects[collection][record_id] = model.from_dict(record)
+            return obj
+        with self._lock:
+            obj = self.cache.get((collection, record_id))
+            if obj is None:
+                record = self.store.get(collection, record_id, owner)
+                if not record:
+                    return None
+                obj = model.from_dict(record)
+                self.cache.put((collection, record_id), obj)
+        # Callers own what they get and may change it, so the cached object is never
+        # handed out: reads outside a transaction get a copy, not the same live object
+        return obj.copy()
+
+    def _put(self, collection: str, record_id: str, obj):
+        unit = self._transaction
+        if unit is not None:
+            unit.objects[collection][record_id] = obj
+            unit.mark_dirty(collection, record_id)
+            return
+        with self._lock:
+            self._store(collection, record_id, obj)
+            self._persist(collection, record_id)
+
+    def _store(self, collection: str, record_id: str, obj):
+        """Write obj into the committed data, bumping its version (lock held)"""
+        if collection in VERSIONED_COLLECTIONS:
+            obj.version += 1
+        self.store.put(collection, record_id, obj.to_dict())
+        self.cache.invalidate((collection, record_id))
+
+    def _stored_version(self, collection: str, record_id: str) -> Optional[int]:
+        record = self.store.get(collection, record_id)
+        return record.get('version', 0) if record else None
+
+    def cache_stats(self) -> Dict:
+        """Get identity map hit/miss counters"""
+        return self.cache.stats()
+
+    def gauges(self) -> Dict:
+        """Get cache hit rates and storage counters as flat numbers, for metrics"""
+        cache = self.cache_stats()
+        shards = self.shard_stats()
+        return {
+            'cache_hit_rate': cache['hit_rate'],
+            'cache_hits': cache['hits'],
+            'cache_misses': cache['misses'],
+            'cache_size': cache['size'],
+            'shards_loaded': shards['loaded'],
+            'shards_dirty': shards['dirty'],
+            'shard_loads': shards['loads'],
+            'shard_evictions': shards['evictions'],
+            'shard_writes': shards['writes'],
+            'records_reencoded': shards['reencoded'],
+            'records_reused': shards['reused'],
+            'journal_records': self.journal.record_count if self.journal else 0,
+            'writes_pending_flush': self._stored_count - self._durable_count
+        }
+
+    def shard_stats(self) -> Dict:
+        """Get shard load/eviction/write counters and records re-encoded vs reused by flushes"""
+        with self._lock:
+            return self.store.stats()
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        """Get user by ID"""
+        return self._get("users", user_id, User)
+
+    def save_user(self, user: User):
+        """Save user to database"""
+        self._put("users", user.user_id, user)
+
+    def add_user(self, user: User):
+        """Save a new user, raising DuplicateEmailError if the email is taken in any case"""
+        unit = self._transaction
+        with self._lock:
+            self._check_email_free(user)
+            if unit is None:
+                self._store("users", user.user_id, user)
+                self._persist("users", user.user_id)
+                return
+        if any(u is not user and normalize_email(u.email) == normalize_email(user.email)
+               for u in unit.objects["users"].values()):
+            raise DuplicateEmailError(f"Email {user.email} is already registered")
+        unit.new_users.append(user.user_id)
+        self._put("users", user.user_id, user)
+
+    def _check_email_free(self, user: User):
+        """Raise DuplicateEmailError if a stored user other than user has its email (lock held)"""
+        owner = self.store.user_index().find_email(user.email)
+        if owner is not None and owner != user.user_id and self.store.get("users", owner) is not None:
+            raise DuplicateEmailError(f"Email {user.email} is already registered")
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Get the user registered with email, in any case, from the email index"""
+        unit = self._transaction
+        if unit is not None:
+            for user in unit.objects["users"].values():
+                if normalize_email(user.email) == normalize_email(email):
+                    return user
+        with self._lock:
+            user_id = self.store.user_index().find_email(email)
+        return self.get_user(user_id) if user_id is not None else None
+
+    def list_users(self, limit: int = 20, cursor: str = None) -> Tuple[List[User], Optional[str]]:
+        """Get a page of users in created_at order and the cursor of the next page (None after the last)
+
+        Pages come from the created_at index, so only the listed users are
+        read. Users added inside an uncommitted transaction are not listed.
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        after = parse_cursor(cursor) if cursor else None
+        with self._lock:
+            keys = self.store.user_index().page(limit + 1, after)
+        users = [user for user in (self.get_user(user_id) for _, user_id in keys[:limit]) if user is not None]
+        next_cursor = format_cursor(*keys[limit - 1]) if len(keys) > limit else None
+        return users, next_cursor
+
+    def get_user_for_update(self, user_id: str) -> Optional[User]:
+        """Get a private copy of a user to modify and save with compare_and_swap_user"""
+        if self._transaction is not None:
+            return self._get("users", user_id, User)
+        with self._lock:
+            record = self.store.get("users", user_id)
+        return User.from_dict(record) if record else None
+
+    def compare_and_swap_user(self, user: User) -> bool:
+        """Save user only if the stored record is still at user.version
+
+        Returns False when another writer got there first; reload and retry.
+        Inside a transaction the whole transaction has to be retried instead, so
+        a conflict raises ConcurrentUpdateError, here or when it commits.
+        """
+        key = ("users", user.user_id)
+        unit = self._transaction
+        with self._lock:
+            if self._stored_version(*key) != user.version:
+                if unit is not None:
+                    raise ConcurrentUpdateError(f"users record {user.user_id} was modified")
+                return False
+            if unit is None:
+                self._store("users", user.user_id, user)
+                self._persist("users", user.user_id)
+                return True
+        unit.expected_versions.setdefault(key, user.version)
+        self._put("users", user.user_id, user)
+        return True
+
+    def get_all_users(self) -> List[User]:
+        """Get all users, loading every shard in turn"""
+        users = []
+        with self._lock:
+            for number in range(self.store.shard_count):
+                users.extend(self._get("users", user_id, User) for user_id in self.store.user_ids(number))
+            if self._transaction is not None:
+                users.extend(u for user_id, u in self._transaction.objects["users"].items()
+                             if self.store.get("users", user_id) is None)
+        return users
+
+    def get_goal(self, goal_id: str) -> Optional[SavingsGoal]:
+        """Get goal by ID"""
+        return self._get("goals", goal_id, SavingsGoal)
+
+    def save_goal(self, goal: SavingsGoal):
+        """Save goal to database"""
+        self._put("goals", goal.goal_id, goal)
+
+    def get_user_goals(self, user_id: str) -> List[SavingsGoal]:
+        """Get all goals for a user, from the user's shard"""
+        with self._lock:
+            goals = [self._get("goals", g["goal_id"], SavingsGoal, owner=user_id)
+                     for g in self.store.user_goals(user_id)]
+            if self._transaction is not None:
+                # Goals created inside the transaction are not stored yet
+                goals.extend(g for goal_id, g in self._transaction.objects["goals"].items()
+                             if g.user_id == user_id
+                             and self.store.get("goals", goal_id, owner=user_id) is None)
+        return goals
+
+    def storage_order(self, user_ids: Iterable[str]) -> List[str]:
+        """Sort user ids so users sharing a shard are visited together, each shard loaded once"""
+        count = self.store.shard_count
+        return sorted(user_ids, key=lambda user_id: (shard_of(user_id, count), user_id))
+
+    def open_goal_deadlines(self) -> Dict[str, Tuple[str, int]]:
+        """Get goal_id -> (user_id, deadline_us) for every goal not completed, from the deadline index
+
+        No shard is read once the index exists. Entries can name goals lost
+        in a crash; check the goal exists before acting on it.
+        """
+        with self._lock:
+            return dict(self.store.open_goals())
+
+    def iter_user_records(self, after_user_id: str = None) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """Yield (user dict, goal dicts) for every user, one shard at a time
+
+        Users come in shard order and user_id order within a shard, so only
+        one shard needs to be resident at a time. Start after after_user_id to
+        resume an earlier walk: its shard is known from the id. The yielded
+        dicts are the stored records and must not be mutated.
+        """
+        first = shard_of(after_user_id, self.store.shard_count) if after_user_id is not None else 0
+        for number in range(first, self.store.shard_count):
+            with self._lock:
+                records = self.store.shard_records(number)
+            for user, goals in records:
+                if number == first and after_user_id is not None and user["user_id"] <= after_user_id:
+                    continue
+                yield user, goals
@@ -0,0 +1,204 @@
+# controllers/deadline_scheduler.py
+import heapq
+import json
+import os
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+from models.savings_goal import SavingsGoal
+from models.timestamps import DAY_MICROS, now_micros, parse_micros
+from utils.metrics import METRICS
+
+REMINDER = "reminder"
+EXPIRY = "expiry"
+
+# One scheduled hook: kind fires at due_us for a goal whose deadline is deadline_us
+DeadlineEvent = namedtuple("DeadlineEvent", "due_us kind goal_id user_id deadline_us")
+
+
+class DeadlineScheduler:
+    """Open goals in a min-heap by due time, firing reminder and expiry hooks
+
+    Each open goal has an expiry entry at its deadline and a reminder entry
+    reminder_days before it. pop_due() takes the entries that have come due
+    in O(log n) each; fire() hands them to the GameController hooks. Goals
+    that complete or change deadline leave their old entries behind, which
+    are skipped when popped and dropped when the heap is rebuilt.
+
+    The only persisted state is fired_until, the time up to which entries
+    have been handled. Callers pop due entries, fire them and only then call
+    mark_fired(); entries that could not be fired go back with requeue(). On
+    restart the heap is rebuilt from the store's index of open goal
+    deadlines without reading any shard, leaving out entries due before
+    fired_until. A crash between firing and mark_fired() fires that batch
+    again, so hooks run at least once. Deadlines that passed before the
+    first run are not fired.
+    """
+
+    def __init__(self, game_controller, state_file: str = "data/deadlines.json",
+                 reminder_days: int = 3):
+        self.game_controller = game_controller
+        self.db = game_controller.db
+        self.state_file = state_file
+        self.reminder_us = reminder_days * DAY_MICROS
+        # Listeners run on writer threads, possibly under the database lock, so
+        # this lock is never held while calling into the database
+        self._lock = threading.Lock()
+        self._heap: List[DeadlineEvent] = []
+        self._open: Dict[str, Tuple[str, int]] = {}  # goal_id -> (user_id, deadline_us)
+        self.fired = {REMINDER: 0, EXPIRY: 0}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                self.fired_until = json.load(f)["fired_until"]
+        else:
+            self.fired_until = now_micros()
+            self._save_state()
+
+    @classmethod
+    def attach(cls, game_controller, **kwargs) -> "DeadlineScheduler":
+        """Build the heap from the stored open goal deadlines and follow db writes"""
+        scheduler = cls(game_controller, **kwargs)
+        with METRICS.timer("deadlines.load"):
+            scheduler._open = scheduler.db.open_goal_deadlines()
+            scheduler._rebuild()
+        scheduler.db.subscribe(scheduler.on_record_saved)
+        METRICS.register_collector("deadlines", scheduler.stats)
+        return scheduler
+
+    def _save_state(self):
+        if os.path.dirname(self.state_file):
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        temp_file = self.state_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({"fired_until": self.fired_until}, f)
+        os.replace(temp_file, self.state_file)
+
+    def _entries(self, goal_id: str, user_id: str, deadline_us: int) -> List[DeadlineEvent]:
+        """Get the goal's entries still ahead of fired_until (lock held)"""
+        entries = [DeadlineEvent(deadline_us - self.reminder_us, REMINDER, goal_id, user_id, deadline_us),
+                   DeadlineEvent(deadline_us, EXPIRY, goal_id, user_id, deadline_us)]
+        return [e for e in entries if e.due_us > self.fired_until]
+
+    def _rebuild(self):
+        """Heapify the entries of the open goals, dropping stale ones and goals with none left (lock held)"""
+        reminder_us, fired_until = self.reminder_us, self.fired_until
+        heap = []
+        for goal_id, (user_id, deadline_us) in self._open.items():  # _entries inlined; runs on every start
+            if deadline_us - reminder_us > fired_until:
+                heap.append(DeadlineEvent(deadline_us - reminder_us, REMINDER, goal_id, user_id, deadline_us))
+            if deadline_us > fired_until:
+                heap.append(DeadlineEvent(deadline_us, EXPIRY, goal_id, user_id, deadline_us))
+        heapq.heapify(heap)
+        self._heap = heap
+        scheduled = {e.goal_id for e in self._heap}
+        self._open = {goal_id: goal for goal_id, goal in self._open.items() if goal_id in scheduled}
+
+    def on_record_saved(self, collection: str, record: Dict):
+        if collection == "goals":
+            self.track(record['goal_id'], record['user_id'], parse_micros(record['deadline']),
+                       record['is_completed'])
+
+    def track(self, goal_id: str, user_id: str, deadline_us: int, completed: bool = False):
+        """Schedule a goal's hooks, or stop tracking it once completed"""
+        with self._lock:
+            if completed:
+                self._open.pop(goal_id, None)
+                return
+            if self._open.get(goal_id) == (user_id, deadline_us):
+                return
+            entries = self._entries(goal_id, user_id, deadline_us)
+            if not entries:  # Expired already
+                self._open.pop(goal_id, None)
+                return
+            self._open[goal_id] = (user_id, deadline_us)
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            if len(self._heap) > 4 * len(self._open) + 64:  # Mostly stale entries
+                self._rebuild()
+
+    def pop_due(self, now_us: int) -> List[DeadlineEvent]:
+        """Take every entry due by now_us, in due order
+
+        Call mark_fired(now_us) once they are handled, or requeue() the ones
+        that were not.
+        """
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0].due_us <= now_us:
+                entry = heapq.heappop(self._heap)
+                if not self._live(entry):
+                    continue  # Completed or rescheduled since it was pushed
+                if entry.kind == EXPIRY:
+                    del self._open[entry.goal_id]
+                due.append(entry)
+        return due
+
+    def requeue(self, events: List[DeadlineEvent]):
+        """Put popped entries that were not handled back, unless their goal was rescheduled since"""
+        with self._lock:
+            for event in events:
+                if event.kind == EXPIRY:
+                    self._open.setdefault(event.goal_id, (event.user_id, event.deadline_us))
+                if self._live(event):
+                    heapq.heappush(self._heap, event)
+
+    def mark_fired(self, until_us: int):
+        """Persist that every entry due by until_us has been handled"""
+        with self._lock:
+            if until_us > self.fired_until:
+                self.fired_until = until_us
+                self._save_state()
+
+    def _live(self, entry: DeadlineEvent) -> bool:
+        return self._open.get(entry.goal_id) == (entry.user_id, entry.deadline_us)
+
+    def fire(self, event: DeadlineEvent) -> Optional[str]:
+        """Run the GameController hook for an event, getting its message
+
+        Returns None when the goal was completed or removed since it was popped.
+        """
+        goal: Optional[SavingsGoal] = self.db.get_goal(event.goal_id)
+        if goal is None or goal.is_completed or goal.deadline_us != event.deadline_us:
+            return None
+        if event.kind == REMINDER:
+            message = self.game_controller.goal_deadline_near(goal)
+        else:
+            message = self.game_controller.goal_deadline_missed(goal)
+        self.fired[event.kind] += 1
+        return message
+
+    def run_due(self, now_us: int = None) -> List[Tuple[DeadlineEvent, str]]:
+        """Pop and fire every due entry, getting (event, message) for those that fired
+
+        If a hook raises, it and the entries after it are requeued and
+        fired_until is left alone.
+        """
+        now_us = now_micros() if now_us is None else now_us
+        events = self.pop_due(now_us)
+        fired = []
+        for index, event in enumerate(events):
+            try:
+                message = self.fire(event)
+            except BaseException:
+                self.requeue(events[index:])
+                raise
+            if message is not None:
+                fired.append((event, message))
+        self.mark_fired(now_us)
+        return fired
+
+    def next_due(self) -> Optional[int]:
+        """Get when the earliest live entry comes due, or None if nothing is scheduled"""
+        with self._lock:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0].due_us if self._heap else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'open_goals': len(self._open),
+                'heap_entries': len(self._heap),
+                'reminders_fired': self.fired[REMINDER],
+                'expiries_fired': self.fired[EXPIRY]
+            }
@@ -1,43 +1,157 @@
-from typing import List, Tuple
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from controllers.savings_controller import MAX_UPDATE_ATTEMPTS
+from models.level_curve import LevelCurve, get_curve
 from models.user import User
+from models.savings_goal import SavingsGoal
+from models.money import format_money
 from models.achievement import AchievementManager, Achievement
-from utils.database import Database
+from models.achievement_rules import needs_goals
+from utils.database import ConcurrentUpdateError, Database
+from utils.ledger import Ledger
+from utils.metrics import METRICS, instrument_class
 
+# Points awarded for savings actions
+DEPOSIT_POINTS_PER_DOLLAR = 2
+GOAL_CREATION_POINTS = 25
+PROGRESS_POINTS_PER_DOLLAR = 3
+GOAL_COMPLETION_BONUS = 100
+# Taken back from a goal's owner when its deadline passes before it is completed
+MISSED_DEADLINE_FORFEIT = GOAL_CREATION_POINTS
+
+# Transaction attempts before a chunk of level updates that keeps losing to other writers gives up
+MAX_LEVEL_ATTEMPTS = 5
+
+@instrument_class("game")
 class GameController:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, catalogue_file: str = None, ledger: Ledger = None):
         self.db = db
-        self.achievement_manager = AchievementManager()
+        self.ledger = ledger
+        self.achievement_manager = AchievementManager(catalogue_file)
+    
+    def _update_user(self, user_id: str, change: Callable[[User], object]) -> Optional[Tuple[User, object]]:
+        """Apply change to a fresh copy of the user and save it with compare-and-swap
+
+        The user is re-read and change applied again whenever another writer
+        saved first. Nothing is saved when change returns a falsy result.
+        Gets (user, result), or None if the user is missing or every attempt
+        conflicted.
+        """
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            user = self.db.get_user_for_update(user_id)
+            if not user:
+                return None
+            result = change(user)
+            if not result or self.db.compare_and_swap_user(user):
+                return user, result
+            METRICS.increment("game.version_conflicts")
+        return None
     
     def award_points(self, user_id: str, points: int, reason: str = "") -> Tuple[bool, bool]:
         """Award points to user and check for level up"""
-        user = self.db.get_user(user_id)
-        if user:
-            level_up = user.add_points(points)
-            self.db.save_user(user)
-            return True, level_up
-        return False, False
-    
-    def check_and_award_achievements(self, user_id: str) -> List[Achievement]:
-        """Check for new achievements and award them"""
-        user = self.db.get_user(user_id)
-        if not user:
-            return []
-        
-        goals = self.db.get_user_goals(user_id)
-        earned_achievement_ids = self.achievement_manager.check_achievements(user, goals)
+        def award(user: User) -> Tuple[int, int]:
+            points_before = user.total_points
+            levels = user.add_points(points)
+            return user.total_points - points_before, levels
         
-        awarded_achievements = []
-        for achievement_id in earned_achievement_ids:
-            achievement = self.achievement_manager.get_achievement(achievement_id)
-            if achievement and user.add_achievement(achievement_id):
-                user.add_points(achievement.points_reward)
-                awarded_achievements.append(achievement)
+        updated = self._update_user(user_id, award)
+        if updated is None:
+            return False, False
+        _, (gained, levels) = updated
+        if self.ledger is not None:  # Including the rewards of any levels reached
+            self.ledger.record_points(user_id, gained)
+        return True, bool(levels)
+    
+    def goal_deadline_near(self, goal: SavingsGoal) -> str:
+        """Reminder hook for an open goal nearing its deadline"""
+        remaining = max(goal.target_cents - goal.current_cents, 0)
+        return (f"Goal '{goal.title}' is due in {goal.days_remaining()} day(s) "
+                f"with {format_money(remaining)} still to save")
+    
+    def goal_deadline_missed(self, goal: SavingsGoal) -> str:
+        """Expiry hook for a goal whose deadline passed before it was completed
+
+        Forfeits the goal's creation points, never taking the total below zero.
+        Completing it late still earns the regular progress and completion points.
+        """
+        def forfeit_points(user: User) -> int:
+            points = min(MISSED_DEADLINE_FORFEIT, user.total_points)
+            user.add_points(-points)
+            return points
         
-        if awarded_achievements:
-            self.db.save_user(user)
+        updated = self._update_user(goal.user_id, forfeit_points)
+        forfeit = updated[1] if updated else 0
+        if forfeit and self.ledger is not None:
+            self.ledger.record_points(goal.user_id, -forfeit)
+        return f"Goal '{goal.title}' missed its deadline: {forfeit} points forfeited"
+    
+    def check_and_award_achievements(self, user_id: str,
+                                     changed_fields: Optional[Iterable[str]] = None) -> List[Achievement]:
+        """Check for new achievements and award them"""
+        def award(user: User) -> Optional[Tuple[List[Achievement], int]]:
+            goals = self.db.get_user_goals(user_id) if needs_goals(changed_fields) else []
+            points_before = user.total_points
+            awarded = self.achievement_manager.award_achievements(user, goals, changed_fields)
+            return (awarded, user.total_points - points_before) if awarded else None
         
+        updated = self._update_user(user_id, award)
+        if updated is None or updated[1] is None:
+            return []
+        _, (awarded_achievements, gained) = updated
+        if self.ledger is not None:
+            for achievement in awarded_achievements:
+                self.ledger.record_points(user_id, achievement.points_reward)
+            level_rewards = gained - sum(a.points_reward for a in awarded_achievements)
+            if level_rewards:
+                self.ledger.record_points(user_id, level_rewards)
         return awarded_achievements
     
+    def recompute_levels(self, curve: LevelCurve = None, chunk_size: int = 10000) -> Dict:
+        """Set every stored user's level from their points after the level curve changes
+        
+        Levels are computed a chunk of users at a time in one vectorized
+        lookup, and only users whose level changed are written, re-read and
+        saved with compare-and-swap so concurrent awards are never
+        overwritten. Levels can go down, and no level rewards are granted.
+        """
+        curve = curve or get_curve()
+        stats = {"users": 0, "changed": 0}
+        start = time.perf_counter()
+        records = self.db.iter_user_records()
+        while True:
+            chunk = [user_data for user_data, _ in islice(records, chunk_size)]
+            if not chunk:
+                break
+            levels = curve.levels_for([user_data['total_points'] for user_data in chunk])
+            stale = [user_data['user_id'] for user_data, level in zip(chunk, levels) if level != user_data['level']]
+            stats["users"] += len(chunk)
+            if stale:
+                stats["changed"] += self._set_levels(curve, stale)
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+    
+    def _set_levels(self, curve: LevelCurve, user_ids: List[str]) -> int:
+        """Save each user's level on the curve in one transaction, retried if it loses to another writer"""
+        for attempt in range(MAX_LEVEL_ATTEMPTS):
+            changed = 0
+            try:
+                with self.db.transaction():
+                    for user_id in user_ids:
+                        user = self.db.get_user_for_update(user_id)
+                        if user is None:
+                            continue
+                        level = curve.level_for(user.total_points)  # Points may have moved since the scan
+                        if level != user.level:
+                            user.level = level
+                            self.db.compare_and_swap_user(user)
+                            changed += 1
+                return changed
+            except ConcurrentUpdateError:
+                if attempt == MAX_LEVEL_ATTEMPTS - 1:
+                    raise
+                METRICS.increment("game.level_conflicts")
+    
     def get_user_achievements(self, user_id: str) -> List[Achievement]:
         """Get all achievements earned by user"""
         user = self.db.get_user(user_id)
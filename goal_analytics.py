@@ -0,0 +1,193 @@
+# utils/goal_analytics.py
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from models.money import to_dollars
+
+try:
+    import numpy as np
+except ImportError:  # Aggregates fall back to loops over the array buffers
+    np = None
+
+
+def _epoch(timestamp: Optional[str]) -> float:
+    return datetime.fromisoformat(timestamp).timestamp() if timestamp else float("nan")
+
+
+class GoalAnalytics:
+    """Column store of goal fields for platform-wide statistics
+
+    Each goal is one row across parallel typed arrays, so aggregates read
+    flat numeric buffers instead of hydrating SavingsGoal objects. Rows are
+    upserted from goal records; attach() loads every goal once and then
+    follows the database's writes. Aggregates work on copies of the
+    columns taken under the lock, so upserts from writer threads are never
+    blocked by a NumPy view held over an array they need to grow.
+    """
+
+    def __init__(self):
+        self.user_index = array('q')
+        self.target_cents = array('q')
+        self.current_cents = array('q')
+        self.deadline = array('d')
+        self.completed = array('b')
+        self.on_time = array('b')
+        self._rows = {}          # goal_id -> row
+        self._user_ids = []      # user index -> user_id
+        self._user_indexes = {}  # user_id -> user index
+        self._user_rows = {}     # user index -> [row, ...]
+        self._lock = threading.Lock()  # Upserts vs. column copies
+
+    @classmethod
+    def attach(cls, db) -> "GoalAnalytics":
+        """Build from every stored goal and keep up to date with db writes"""
+        analytics = cls()
+        for _, goals in db.iter_user_records():
+            for goal in goals:
+                analytics.upsert(goal)
+        db.subscribe(analytics.on_record_saved)
+        return analytics
+
+    def on_record_saved(self, collection: str, record: Dict):
+        if collection == "goals":
+            self.upsert(record)
+
+    def upsert(self, goal: Dict):
+        """Insert or update the row for a goal record (SavingsGoal.to_dict layout)"""
+        completion = _epoch(goal['completion_date'])
+        deadline = _epoch(goal['deadline'])
+        completed = 1 if goal['is_completed'] else 0
+        on_time = 1 if completed and completion <= deadline else 0
+
+        with self._lock:
+            row = self._rows.get(goal['goal_id'])
+            if row is not None:
+                self.current_cents[row] = goal['current_cents']
+                self.target_cents[row] = goal['target_cents']
+                self.deadline[row] = deadline
+                self.completed[row] = completed
+                self.on_time[row] = on_time
+                return
+
+            user_index = self._user_indexes.get(goal['user_id'])
+            if user_index is None:
+                user_index = self._user_indexes[goal['user_id']] = len(self._user_ids)
+                self._user_ids.append(goal['user_id'])
+
+            row = self._rows[goal['goal_id']] = len(self.target_cents)
+            self.user_index.append(user_index)
+            self.target_cents.append(goal['target_cents'])
+            self.current_cents.append(goal['current_cents'])
+            self.deadline.append(deadline)
+            self.completed.append(completed)
+            self.on_time.append(on_time)
+            self._user_rows.setdefault(user_index, []).append(row)
+
+    def __len__(self) -> int:
+        return len(self.target_cents)
+
+    def _rows_for(self, user_ids: Optional[Iterable[str]]) -> Optional[List[int]]:
+        """Get row numbers for a set of users, or None meaning every row"""
+        if user_ids is None:
+            return None
+        rows = []
+        for user_id in user_ids:
+            user_index = self._user_indexes.get(user_id)
+            if user_index is not None:
+                rows.extend(self._user_rows[user_index])
+        return rows
+
+    def totals(self, user_ids: Optional[Iterable[str]] = None) -> Dict:
+        """Get goal totals globally, or for one cohort of users"""
+        rows = self._rows_for(user_ids)
+        now = time.time()
+
+        if np is not None and len(self):
+            target, current, deadline, completed, on_time = self._columns(rows)
+            goal_count = len(target)
+            completed_count = int(completed.sum())
+            on_time_count = int(on_time.sum())
+            overdue_count = int(((completed == 0) & (deadline < now)).sum())
+            total_saved = int(current.sum())
+            total_target = int(target.sum())
+        else:
+            rows = range(len(self)) if rows is None else rows
+            goal_count = completed_count = on_time_count = overdue_count = 0
+            total_saved = total_target = 0
+            target, current, deadline = self.target_cents, self.current_cents, self.deadline
+            completed, on_time = self.completed, self.on_time
+            for row in rows:
+                goal_count += 1
+                total_saved += current[row]
+                total_target += target[row]
+                if completed[row]:
+                    completed_count += 1
+                    on_time_count += on_time[row]
+                elif deadline[row] < now:
+                    overdue_count += 1
+
+        return {
+            'goal_count': goal_count,
+            'completed': completed_count,
+            'active': goal_count - completed_count,
+            'overdue': overdue_count,
+            'total_saved': to_dollars(total_saved),
+            'total_target': to_dollars(total_target),
+            'overall_progress': (total_saved / total_target) * 100 if total_target else 0.0,
+            'completion_rate': completed_count / goal_count if goal_count else 0.0,
+            'on_time_completion_rate': on_time_count / completed_count if completed_count else 0.0
+        }
+
+    def user_totals(self, user_id: str) -> Dict:
+        """Get goal totals for a single user"""
+        return self.totals([user_id])
+
+    def per_user_saved(self) -> Dict[str, float]:
+        """Get total saved across goals, in dollars, for every user"""
+        if np is not None and len(self):
+            with self._lock:
+                user_ids = list(self._user_ids)
+                user_index = np.array(self.user_index, dtype=np.int64)
+                current = np.array(self.current_cents, dtype=np.int64)
+            # Float weights hold whole cents exactly up to 2**53
+            sums = np.bincount(user_index, weights=current, minlength=len(user_ids))
+            return dict(zip(user_ids, (sums / 100).tolist()))
+        with self._lock:
+            sums = [0] * len(self._user_ids)
+            for user_index, cents in zip(self.user_index, self.current_cents):
+                sums[user_index] += cents
+            return {user_id: to_dollars(cents) for user_id, cents in zip(self._user_ids, sums)}
+
+    def progress_distribution(self, bins: int = 10,
+                              user_ids: Optional[Iterable[str]] = None) -> List[int]:
+        """Get goal counts per progress bucket of width 100 / bins percent"""
+        rows = self._rows_for(user_ids)
+        if np is not None and len(self):
+            target, current, _, _, _ = self._columns(rows)
+            progress = np.minimum(current / np.where(target > 0, target, 1) * 100, 100.0)
+            buckets = np.minimum((progress * bins // 100).astype(np.int64), bins - 1)
+            return np.bincount(buckets, minlength=bins).tolist()
+
+        counts = [0] * bins
+        target, current = self.target_cents, self.current_cents
+        for row in (range(len(self)) if rows is None else rows):
+            progress = min(current[row] / target[row] * 100, 100.0) if target[row] > 0 else 0.0
+            counts[min(int(progress * bins // 100), bins - 1)] += 1
+        return counts
+
+    def _columns(self, rows: Optional[List[int]]):
+        """Get NumPy copies (or row selections) of the numeric columns, all taken at one moment
+
+        Never views: an array with a view exported over it cannot grow, so
+        the next upsert would raise BufferError while the view was alive.
+        """
+        columns = ((self.target_cents, np.int64), (self.current_cents, np.int64), (self.deadline, np.float64),
+                   (self.completed, np.int8), (self.on_time, np.int8))
+        selected = np.array(rows, dtype=np.int64) if rows is not None else None
+        with self._lock:
+            if selected is None:
+                return tuple(np.array(column, dtype=dtype) for column, dtype in columns)
+            # Fancy indexing copies, and each temporary view is released straight after
+            return tuple(np.frombuffer(column, dtype=dtype)[selected] for column, dtype in columns)
@@ -0,0 +1,27 @@
+# utils/hash_ring.py
+import bisect
+import zlib
+
+
+class HashRing:
+    """Consistent hashing of string keys onto nodes 0..nodes-1
+
+    Each node owns `replicas` points on a ring of crc32 values and a key
+    belongs to the first point at or after its own hash, so adding a node
+    only moves the keys that land on its new points (about 1/n of them)
+    instead of reshuffling everything the way hash % n would.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 128):
+        if nodes < 1:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes = nodes
+        self.replicas = replicas
+        points = sorted((zlib.crc32(f"{node}:{replica}".encode("ascii")), node)
+                        for node in range(nodes) for replica in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        index = bisect.bisect_left(self._hashes, zlib.crc32(key.encode("utf-8")))
+        return self._owners[index % len(self._owners)]
@@ -0,0 +1,60 @@
+# utils/identity_map.py
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class IdentityMap:
+    """Bounded LRU map from record key to its hydrated object
+
+    Database keeps the one hydrated model per record here and hands each
+    caller a copy of it, so a repeated read costs a dict lookup and a
+    field copy instead of a parse, and one caller's unsaved changes never
+    show up in another's reads. Within a transaction the same object is
+    returned for an id (see Database.transaction).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._objects = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """Return the cached object for key, counting the hit or miss"""
+        obj = self._objects.get(key)
+        if obj is None:
+            self.misses += 1
+            return None
+        self._objects.move_to_end(key)
+        self.hits += 1
+        return obj
+
+    def put(self, key: Hashable, obj: object):
+        """Cache obj under key, evicting the least recently used entry when full"""
+        if self.capacity <= 0:
+            return
+        self._objects[key] = obj
+        self._objects.move_to_end(key)
+        if len(self._objects) > self.capacity:
+            self._objects.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Drop key so the next read hydrates a fresh object"""
+        self._objects.pop(key, None)
+
+    def clear(self):
+        self._objects.clear()
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._objects),
+            'capacity': self.capacity
+        }
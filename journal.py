@@ -0,0 +1,93 @@
+# utils/journal.py
+import os
+from typing import Callable, Dict, Iterator, List, Tuple
+from utils.codec import get_codec
+from utils.metrics import METRICS
+
+
+class Journal:
+    """Append-only log of record upserts, one JSON line per mutation"""
+
+    def __init__(self, log_file: str, codec=None):
+        self.log_file = log_file
+        self.codec = codec or get_codec()
+        self.record_count = 0
+        self._handle = None
+
+    def append(self, collection: str, record_id: str, record: Dict, sync: bool = True):
+        """Append one record, fsyncing it before returning unless sync is False"""
+        self._write({"collection": collection, "id": record_id, "record": record}, 1, sync)
+
+    def append_batch(self, entries: List[Tuple[str, str, Dict]], sync: bool = True):
+        """Append several records as a single line so they replay all-or-nothing"""
+        batch = [{"collection": c, "id": i, "record": r} for c, i, r in entries]
+        self._write({"batch": batch}, len(batch), sync)
+
+    def _write(self, entry: Dict, record_count: int, sync: bool):
+        if self._handle is None:
+            os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+            self._handle = open(self.log_file, 'ab')
+        line = self.codec.encode(entry) + b"\n"
+        self._handle.write(line)
+        self._handle.flush()
+        METRICS.increment("journal.bytes_written", len(line))
+        if sync:
+            with METRICS.timer("journal.fsync"):
+                os.fsync(self._handle.fileno())
+        self.record_count += record_count
+
+    def sync(self):
+        """fsync everything appended with sync=False, covering many appends with one call"""
+        if self._handle is not None:
+            with METRICS.timer("journal.fsync"):
+                os.fsync(self._handle.fileno())
+
+    def entries(self) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (collection, id, record) for every complete entry in the log"""
+        for collection, record_id, record, _ in self._scan():
+            yield collection, record_id, record
+
+    def _scan(self) -> Iterator[Tuple[str, str, Dict, int]]:
+        """Yield entries along with the byte offset just past each one"""
+        if not os.path.exists(self.log_file):
+            return
+        offset = 0
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write from a crash; the mutation never completed
+                try:
+                    entry = self.codec.decode(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                for item in entry.get("batch", [entry]):
+                    yield item["collection"], item["id"], item["record"], offset
+
+    def replay(self, apply: Callable[[str, str, Dict], None]) -> int:
+        """Call apply(collection, id, record) for every logged upsert, in order"""
+        count = 0
+        valid_length = 0
+        for collection, record_id, record, valid_length in self._scan():
+            apply(collection, record_id, record)
+            count += 1
+        # Cut off any torn tail so new appends start on a clean line
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > valid_length:
+            with open(self.log_file, 'r+b') as f:
+                f.truncate(valid_length)
+        self.record_count = count
+        return count
+
+    def truncate(self):
+        """Discard the log once its entries are folded into a snapshot"""
+        self.close()
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'w', encoding='utf-8') as f:
+                f.flush()
+                os.fsync(f.fileno())
+        self.record_count = 0
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
@@ -0,0 +1,123 @@
+# controllers/leaderboard.py
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.skip_list import SkipList
+
+ALL_TIME = "all_time"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+
+PERIODS: Dict[str, Callable[[datetime], str]] = {
+    WEEKLY: lambda at: "{}-W{:02d}".format(*at.isocalendar()[:2]),
+    MONTHLY: lambda at: at.strftime("%Y-%m"),
+}
+
+Entry = Tuple[int, str, int]  # (rank, user_id, points)
+
+
+class Leaderboard:
+    """Users ordered by points, highest first, with O(log n) rank queries"""
+
+    def __init__(self):
+        self._ranking = SkipList()  # Keys are (-points, user_id)
+        self._points = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def set_points(self, user_id: str, points: int):
+        """Set a user's score, moving them to their new position"""
+        old = self._points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            self._ranking.remove((-old, user_id))
+        self._points[user_id] = points
+        self._ranking.insert((-points, user_id))
+
+    def add_points(self, user_id: str, points: int):
+        self.set_points(user_id, self._points.get(user_id, 0) + points)
+
+    def get_points(self, user_id: str) -> Optional[int]:
+        return self._points.get(user_id)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """Get a user's 1-based rank, or None if they are not on the board"""
+        points = self._points.get(user_id)
+        if points is None:
+            return None
+        return self._ranking.rank((-points, user_id))
+
+    def top(self, count: int = 10) -> List[Entry]:
+        """Get the highest scoring users"""
+        return self._entries(1, count)
+
+    def around(self, user_id: str, radius: int = 2) -> List[Entry]:
+        """Get a user's entry with up to radius neighbours on each side"""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - radius, 1)
+        return self._entries(start, rank + radius - start + 1)
+
+    def _entries(self, start: int, count: int) -> List[Entry]:
+        return [(start + offset, user_id, -negative_points)
+                for offset, (negative_points, user_id) in enumerate(self._ranking.range(start, count))]
+
+
+class LeaderboardService:
+    """All-time and time-windowed leaderboards fed by user saves
+
+    The all-time board tracks User.total_points. Weekly and monthly boards
+    accumulate the points gained during each period, taken as the change in
+    total_points between saves. Windowed boards live in memory only and keep
+    the last keep_periods periods of each window.
+    """
+
+    def __init__(self, keep_periods: int = 2, clock: Callable[[], datetime] = datetime.now):
+        if keep_periods < 1:  # The current period is always kept
+            raise ValueError("keep_periods must be at least 1")
+        self.keep_periods = keep_periods
+        self.clock = clock
+        self.all_time = Leaderboard()
+        self._windows = {window: {} for window in PERIODS}  # window -> {period: Leaderboard}
+
+    @classmethod
+    def attach(cls, db, **kwargs) -> "LeaderboardService":
+        """Build the all-time board from storage and follow db writes"""
+        service = cls(**kwargs)
+        for user, _ in db.iter_user_records():
+            service.all_time.set_points(user['user_id'], user['total_points'])
+        db.subscribe(service.on_record_saved)
+        return service
+
+    def on_record_saved(self, collection: str, record: Dict):
+        if collection == "users":
+            self.record_points(record['user_id'], record['total_points'])
+
+    def record_points(self, user_id: str, total_points: int):
+        """Update the boards from a user's new point total"""
+        previous = self.all_time.get_points(user_id)
+        self.all_time.set_points(user_id, total_points)
+        gained = total_points - previous if previous is not None else 0
+        if gained <= 0:
+            return
+
+        now = self.clock()
+        for window, period_of in PERIODS.items():
+            boards = self._windows[window]
+            period = period_of(now)
+            if period not in boards:
+                boards[period] = Leaderboard()
+                for stale in sorted(boards)[:-self.keep_periods]:
+                    del boards[stale]
+            boards[period].add_points(user_id, gained)
+
+    def board(self, window: str = ALL_TIME, period: str = None) -> Leaderboard:
+        """Get the all-time board or one period of a windowed board (current by default)"""
+        if window == ALL_TIME:
+            return self.all_time
+        if window not in PERIODS:
+            raise ValueError(f"Unknown leaderboard window '{window}'")
+        period = period or PERIODS[window](self.clock())
+        return self._windows[window].get(period) or Leaderboard()
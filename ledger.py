@@ -0,0 +1,179 @@
+# utils/ledger.py
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+DEPOSIT = 1
+WITHDRAWAL = 2
+GOAL_TRANSFER = 3
+POINTS_AWARD = 4
+
+MAGIC = b"SLEDGER1"
+HEADER = struct.Struct("<8sq")  # magic, record count
+# user key, goal key, kind, padding, amount (cents or points), timestamp (epoch us)
+RECORD = struct.Struct("<16s16sB7xqq")
+GROWTH_BYTES = 1 << 20
+SCAN_CHUNK_RECORDS = 16384  # Records copied out of the map per lock hold in scan()
+
+LedgerEntry = namedtuple("LedgerEntry", "user_key goal_key kind amount timestamp_us")
+
+NO_GOAL = bytes(16)
+
+
+def record_key(record_id: Optional[str]) -> bytes:
+    """Pack a UUID id into its 16 raw bytes, hashing any other string"""
+    if not record_id:
+        return NO_GOAL
+    try:
+        return uuid.UUID(record_id).bytes
+    except ValueError:
+        return hashlib.md5(record_id.encode("utf-8")).digest()
+
+
+def key_to_id(key: bytes) -> str:
+    return str(uuid.UUID(bytes=key))
+
+
+class Ledger:
+    """Append-only transaction history as fixed-width records in a mapped file
+
+    Each record is RECORD.size bytes, so the n-th record lives at a known
+    offset and appending is a single struct pack into the map. A per-user
+    index of record numbers is rebuilt on open, letting history() read a
+    user's records straight out of the map without scanning everyone else's.
+    Ids that are not UUIDs are stored hashed and report back as UUID strings.
+    """
+
+    def __init__(self, ledger_file: str = "data/savings_ledger.bin", sync: bool = False):
+        self.ledger_file = ledger_file
+        self.sync = sync
+        if os.path.dirname(ledger_file):
+            os.makedirs(os.path.dirname(ledger_file), exist_ok=True)
+        if not os.path.exists(ledger_file):
+            with open(ledger_file, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 0))
+                f.truncate(HEADER.size + GROWTH_BYTES)
+        self._file = open(ledger_file, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{ledger_file} is not a ledger file")
+        self._lock = threading.Lock()
+        self._deferred = threading.local()  # .entries: appends held back by deferred()
+        self._index = {}  # user key -> array of record numbers
+        for number, entry in enumerate(self.scan()):
+            self._index.setdefault(entry.user_key, array('q')).append(number)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _offset(self, number: int) -> int:
+        return HEADER.size + number * RECORD.size
+
+    def append(self, user_id: str, kind: int, amount: int, goal_id: str = None,
+               timestamp_us: int = None) -> Optional[int]:
+        """Append one record in O(1) and return its record number (None inside deferred())"""
+        if timestamp_us is None:
+            timestamp_us = time.time_ns() // 1000
+        held = getattr(self._deferred, "entries", None)
+        if held is not None:
+            held.append((user_id, kind, amount, goal_id, timestamp_us))
+            return None
+        user_key = record_key(user_id)
+        with self._lock:
+            offset = self._offset(self.count)
+            if offset + RECORD.size > len(self._map):
+                self._map.resize(len(self._map) + max(GROWTH_BYTES, len(self._map) // 2))
+            RECORD.pack_into(self._map, offset, user_key, record_key(goal_id), kind, amount, timestamp_us)
+            number = self.count
+            self.count += 1
+            HEADER.pack_into(self._map, 0, MAGIC, self.count)
+            self._index.setdefault(user_key, array('q')).append(number)
+            if self.sync:
+                self.flush()
+        return number
+
+    @contextmanager
+    def deferred(self):
+        """Hold this thread's appends until the block exits, writing them only if it did not raise
+
+        Wrap a storage transaction in it so entries are written once its
+        changes have committed, and never for a transaction that failed.
+        Nested blocks join the outermost one.
+        """
+        if getattr(self._deferred, "entries", None) is not None:
+            yield
+            return
+        held = self._deferred.entries = []
+        try:
+            yield
+        finally:
+            self._deferred.entries = None
+        for entry in held:
+            self.append(*entry)
+
+    def record_deposit(self, user_id: str, cents: int) -> Optional[int]:
+        return self.append(user_id, DEPOSIT, cents)
+
+    def record_withdrawal(self, user_id: str, cents: int) -> Optional[int]:
+        return self.append(user_id, WITHDRAWAL, cents)
+
+    def record_goal_transfer(self, user_id: str, goal_id: str, cents: int) -> Optional[int]:
+        return self.append(user_id, GOAL_TRANSFER, cents, goal_id)
+
+    def record_points(self, user_id: str, points: int) -> Optional[int]:
+        return self.append(user_id, POINTS_AWARD, points)
+
+    def scan(self) -> Iterator[LedgerEntry]:
+        """Yield every record in append order, copied out of the map a chunk at a time
+
+        Each chunk is copied under the lock rather than read through a view,
+        which would stop a concurrent append from resizing the map.
+        """
+        end = self.count
+        for start in range(0, end, SCAN_CHUNK_RECORDS):
+            with self._lock:
+                chunk = self._map[self._offset(start):self._offset(min(start + SCAN_CHUNK_RECORDS, end))]
+            for fields in RECORD.iter_unpack(chunk):
+                yield LedgerEntry(*fields)
+
+    def history(self, user_id: str) -> Iterator[LedgerEntry]:
+        """Yield one user's records in append order"""
+        for number in self._index.get(record_key(user_id), ()):
+            yield LedgerEntry(*RECORD.unpack_from(self._map, self._offset(number)))
+
+    def rebuild_balances(self) -> Dict[str, int]:
+        """Get each user's balance in cents as implied by deposits and withdrawals"""
+        balances = {}
+        for entry in self.scan():
+            if entry.kind == DEPOSIT:
+                balances[entry.user_key] = balances.get(entry.user_key, 0) + entry.amount
+            elif entry.kind == WITHDRAWAL:
+                balances[entry.user_key] = balances.get(entry.user_key, 0) - entry.amount
+        return {key_to_id(key): cents for key, cents in balances.items()}
+
+    def verify_balances(self, users: List) -> List[str]:
+        """Get ids of users whose stored balance disagrees with the ledger"""
+        balances = self.rebuild_balances()
+        return [user.user_id for user in users
+                if user.balance_cents != balances.get(key_to_id(record_key(user.user_id)), 0)]
+
+    def flush(self):
+        """Write mapped pages back to disk"""
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        self._file.close()
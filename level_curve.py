@@ -0,0 +1,129 @@
+# models/level_curve.py
+import bisect
+import json
+import os
+from itertools import accumulate
+from typing import Dict, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # levels_for falls back to one bisect per user
+    np = None
+
+# Path of a JSON curve spec (see LevelCurve.from_spec) used instead of the default
+LEVEL_CURVE_ENV = "SAVINGS_LEVEL_CURVE"
+DEFAULT_POINTS_PER_LEVEL = 100
+
+
+class LevelCurve:
+    """Points needed for each level, precomputed into a sorted threshold table
+
+    thresholds[i] is the total points at which level i + 1 is reached, so
+    thresholds[0] is 0 and a user's level is one bisect of the table. Past
+    the end of the table each further level costs the table's final step,
+    which keeps linear curves exact with a short table. rewards maps a
+    level to bonus points granted when a user first reaches it.
+    """
+
+    def __init__(self, thresholds: Sequence[int], rewards: Dict[int, int] = None):
+        thresholds = [int(t) for t in thresholds]
+        if len(thresholds) < 2 or thresholds[0] != 0:
+            raise ValueError("A level curve needs at least two thresholds, starting at 0")
+        if any(b <= a for a, b in zip(thresholds, thresholds[1:])):
+            raise ValueError("Level thresholds must be strictly increasing")
+        self.thresholds = thresholds
+        self.rewards = dict(rewards or {})
+        # Rewarded levels in order and the running total of their rewards, so the
+        # reward for any span of levels is two bisects however many levels it covers
+        self._reward_levels = sorted(self.rewards)
+        self._reward_totals = list(accumulate((self.rewards[level] for level in self._reward_levels), initial=0))
+        self._last = thresholds[-1]
+        self._step = thresholds[-1] - thresholds[-2]
+        self._array = np.array(thresholds, dtype=np.int64) if np is not None else None
+
+    @classmethod
+    def linear(cls, step: int = DEFAULT_POINTS_PER_LEVEL, levels: int = 100,
+               rewards: Dict[int, int] = None) -> "LevelCurve":
+        """Every level costs step points"""
+        return cls([level * step for level in range(levels)], rewards)
+
+    @classmethod
+    def exponential(cls, base: int = DEFAULT_POINTS_PER_LEVEL, growth: float = 1.5, levels: int = 50,
+                    rewards: Dict[int, int] = None) -> "LevelCurve":
+        """Level n costs base * growth ** (n - 2) points, growing until the last tabled level"""
+        thresholds = [0]
+        for level in range(1, levels):
+            thresholds.append(thresholds[-1] + max(round(base * growth ** (level - 1)), 1))
+        return cls(thresholds, rewards)
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "LevelCurve":
+        """Build a curve from its JSON form
+
+        {"type": "linear", "step": 100}, {"type": "exponential", "base": 100,
+        "growth": 1.5, "levels": 50} or {"type": "table", "thresholds": [0, 100, ...]},
+        each with optional "rewards": {"<level>": points}.
+        """
+        kind = spec.get("type", "table")
+        rewards = {int(level): int(points) for level, points in spec.get("rewards", {}).items()}
+        if kind == "linear":
+            return cls.linear(spec.get("step", DEFAULT_POINTS_PER_LEVEL), spec.get("levels", 100), rewards)
+        if kind == "exponential":
+            return cls.exponential(spec.get("base", DEFAULT_POINTS_PER_LEVEL), spec.get("growth", 1.5),
+                                   spec.get("levels", 50), rewards)
+        if kind == "table":
+            return cls(spec["thresholds"], rewards)
+        raise ValueError(f"Unknown level curve type '{kind}'")
+
+    def level_for(self, points: int) -> int:
+        """Get the level a points total reaches"""
+        if points >= self._last:
+            return len(self.thresholds) + (points - self._last) // self._step
+        return max(bisect.bisect_right(self.thresholds, points), 1)
+
+    def threshold(self, level: int) -> int:
+        """Get the total points at which level is reached"""
+        if level <= len(self.thresholds):
+            return self.thresholds[max(level, 1) - 1]
+        return self._last + (level - len(self.thresholds)) * self._step
+
+    def reward_between(self, level: int, new_level: int) -> int:
+        """Get the bonus points for reaching every level above level up to new_level"""
+        if new_level <= level:
+            return 0
+        first = bisect.bisect_right(self._reward_levels, level)
+        last = bisect.bisect_right(self._reward_levels, new_level)
+        return self._reward_totals[last] - self._reward_totals[first]
+
+    def levels_for(self, points: Sequence[int]):
+        """Get the level of each points total at once (a numpy array when numpy is installed)"""
+        if np is None:
+            return [self.level_for(p) for p in points]
+        points = np.asarray(points, dtype=np.int64)
+        levels = np.searchsorted(self._array, points, side='right')
+        beyond = points >= self._last
+        levels[beyond] = len(self.thresholds) + (points[beyond] - self._last) // self._step
+        return np.maximum(levels, 1)
+
+
+def load_curve(path: str) -> LevelCurve:
+    with open(path, 'r') as f:
+        return LevelCurve.from_spec(json.load(f))
+
+
+_active: Optional[LevelCurve] = None
+
+
+def get_curve() -> LevelCurve:
+    """Get the curve levels are computed with: set_curve's, else $SAVINGS_LEVEL_CURVE's, else linear"""
+    global _active
+    if _active is None:
+        path = os.environ.get(LEVEL_CURVE_ENV)
+        _active = load_curve(path) if path else LevelCurve.linear()
+    return _active
+
+
+def set_curve(curve: Optional[LevelCurve]):
+    """Use curve for every level computation in this process (None goes back to the configured one)"""
+    global _active
+    _active = curve
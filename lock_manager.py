@@ -0,0 +1,61 @@
+# utils/lock_manager.py
+import asyncio
+import threading
+import weakref
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+
+class StripedLockManager:
+    """Per-user mutual exclusion from a fixed pool of lock stripes
+
+    A user id hashes to one of `stripes` locks, so memory stays constant
+    however many users there are, at the cost of unrelated users who share a
+    stripe occasionally waiting on each other. Threads take a stripe with
+    lock(); coroutines take the same stripe with async_lock(), which queues
+    coroutines on an asyncio.Lock and only waits for the thread lock off the
+    event loop, so a coroutine never blocks the loop and threads and
+    coroutines exclude each other.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self.stripes = stripes
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._async_locks = weakref.WeakKeyDictionary()  # event loop -> [asyncio.Lock per stripe]
+
+    def stripe(self, user_id: str) -> int:
+        # crc32 rather than hash() so the stripe for an id is stable across runs
+        return zlib.crc32(user_id.encode("utf-8")) % self.stripes
+
+    @contextmanager
+    def lock(self, user_id: str) -> Iterator[None]:
+        """Hold the user's stripe in the calling thread"""
+        lock = self._locks[self.stripe(user_id)]
+        with lock:
+            yield
+
+    @asynccontextmanager
+    async def async_lock(self, user_id: str) -> AsyncIterator[None]:
+        """Hold the user's stripe in the calling coroutine"""
+        stripe = self.stripe(user_id)
+        loop = asyncio.get_running_loop()
+        async_locks = self._async_locks.get(loop)
+        if async_locks is None:
+            async_locks = self._async_locks[loop] = [asyncio.Lock() for _ in range(self.stripes)]
+
+        async with async_locks[stripe]:
+            lock = self._locks[stripe]
+            if not lock.acquire(blocking=False):
+                # Held by a thread; wait for it on the default executor
+                acquiring = loop.run_in_executor(None, lock.acquire)
+                try:
+                    await asyncio.shield(acquiring)
+                except asyncio.CancelledError:
+                    # The executor still acquires the lock, so hand it straight back
+                    acquiring.add_done_callback(lambda _: lock.release())
+                    raise
+            try:
+                yield
+            finally:
+                lock.release()
@@ -14,8 +14,15 @@ import os
 import sys
 from colorama import init, Fore, Style
 from controllers.savings_controller import SavingsController
-from controllers.game_controller import GameController
-from utils.database import Database
+from controllers.deadline_scheduler import DeadlineScheduler
+from controllers.game_controller import (
+    GameController, DEPOSIT_POINTS_PER_DOLLAR, GOAL_CREATION_POINTS,
+    PROGRESS_POINTS_PER_DOLLAR, GOAL_COMPLETION_BONUS
+)
+from utils.database import ConcurrentUpdateError, Database
+from utils.ledger import Ledger
+from utils.metrics import METRICS, configure_from_env
+from models.money import format_money, points_for, to_cents
 
 # Initialize colorama for colored console output
 init()
@@ -23,10 +30,17 @@ init()
 class SavingsGameApp:
     def __init__(self):
         self.db = Database()
-        self.savings_controller = SavingsController(self.db)
-        self.game_controller = GameController(self.db)
+        self.ledger = Ledger()
+        self.savings_controller = SavingsController(self.db, self.ledger)
+        self.game_controller = GameController(self.db, ledger=self.ledger)
+        self.deadlines = DeadlineScheduler.attach(self.game_controller)
         self.current_user = None
     
+    def close(self):
+        """Write outstanding changes and release the data and ledger files"""
+        self.db.close()
+        self.ledger.close()
+    
     def clear_screen(self):
         """Clear the console screen"""
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -49,6 +63,12 @@ class SavingsGameApp:
         """Print info message"""
         print(f"{Fore.YELLOW}ℹ {message}{Style.RESET_ALL}")
     
+    def show_deadline_notices(self):
+        """Fire due goal reminders and expiries, showing the current user's"""
+        for event, message in self.deadlines.run_due():
+            if self.current_user and event.user_id == self.current_user.user_id:
+                self.print_info(message)
+    
     def main_menu(self):
         """Display main menu"""
         while True:
@@ -90,7 +110,9 @@ class SavingsGameApp:
                 self.view_progress()
             elif choice == "9":
                 print(f"\n{Fore.CYAN}Thanks for using Gamified Savings App! 👋{Style.RESET_ALL}")
-                sys.exit()
+                return
+            elif choice.lower() == "stats":  # Hidden: instrumentation screen
+                self.view_instrumentation()
             else:
                 self.print_error("Invalid option. Please try again.")
                 input("Press Enter to continue...")
@@ -109,7 +131,12 @@ class SavingsGameApp:
             name = input("Enter your name: ")
             email = input("Enter your email: ")
             
-            self.current_user = self.savings_controller.create_user(name, email)
+            try:
+                self.current_user = self.savings_controller.create_user(name, email)
+            except ValueError as e:  # Includes DuplicateEmailError
+                self.print_error(str(e))
+                input("Press Enter to continue...")
+                return
             self.print_success(f"Welcome {name}! Your account has been created.")
             
             # Check for first achievements
@@ -118,27 +145,44 @@ class SavingsGameApp:
                 self.print_success(f"You earned {len(achievements)} achievement(s)!")
         
         elif choice == "2":
-            users = self.db.get_all_users()
+            email = input("Enter your email (or press Enter to browse users): ").strip()
+            if email:
+                user = self.savings_controller.login(email)
+            else:
+                user = self.browse_users()
+            if user:
+                self.current_user = user
+                self.print_success(f"Welcome back, {self.current_user.name}!")
+                self.show_deadline_notices()
+            else:
+                self.print_error("No user found. Please register first.")
+        
+        input("Press Enter to continue...")
+    
+    def browse_users(self, page_size: int = 10):
+        """Let the user pick an account from pages of users, oldest first"""
+        cursor = None
+        while True:
+            users, next_cursor = self.savings_controller.list_users(page_size, cursor)
             if not users:
-                self.print_error("No users found. Please register first.")
-                input("Press Enter to continue...")
-                return
-            
+                return None
             print("\nExisting users:")
             for i, user in enumerate(users, 1):
                 print(f"{i}. {user.name} ({user.email})")
-            
+            prompt = "Select user number" + (" (n for next page)" if next_cursor else "") + ": "
+            answer = input(prompt).strip().lower()
+            if answer == "n" and next_cursor:
+                cursor = next_cursor
+                continue
             try:
-                user_choice = int(input("Select user number: ")) - 1
-                if 0 <= user_choice < len(users):
-                    self.current_user = users[user_choice]
-                    self.print_success(f"Welcome back, {self.current_user.name}!")
-                else:
-                    self.print_error("Invalid user selection.")
+                user_choice = int(answer) - 1
             except ValueError:
                 self.print_error("Please enter a valid number.")
-        
-        input("Press Enter to continue...")
+                return None
+            if 0 <= user_choice < len(users):
+                return users[user_choice]
+            self.print_error("Invalid user selection.")
+            return None
     
     def make_deposit(self):
         """Handle money deposit"""
@@ -157,33 +201,37 @@ class SavingsGameApp:
                 input("Press Enter to continue...")
                 return
             
-            # Make deposit
-            if self.savings_controller.deposit_money(self.current_user.user_id, amount):
+            # Ledger entries are written, and results shown, only once the transaction commits
+            with self.ledger.deferred(), self.db.transaction():
+                # Make deposit
+                deposited = self.savings_controller.deposit_money(self.current_user.user_id, amount)
+                if deposited:
+                    # Award points for deposit
+                    points = points_for(to_cents(amount), DEPOSIT_POINTS_PER_DOLLAR)
+                    success, level_up = self.game_controller.award_points(self.current_user.user_id, points, "Deposit")
+                
+                    # Check for achievements
+                    achievements = self.game_controller.check_and_award_achievements(self.current_user.user_id)
+            
+            if deposited:
+                # Update current user data
                 self.current_user = self.savings_controller.get_user(self.current_user.user_id)
                 self.print_success(f"Deposited ${amount:.2f}! New balance: ${self.current_user.balance:.2f}")
-                
-                # Award points for deposit
-                points = int(amount * 2)  # 2 points per dollar
-                success, level_up = self.game_controller.award_points(self.current_user.user_id, points, "Deposit")
                 if success:
                     self.print_success(f"You earned {points} points!")
                     if level_up:
                         self.print_success("🎉 LEVEL UP! 🎉")
-                
-                # Check for achievements
-                achievements = self.game_controller.check_and_award_achievements(self.current_user.user_id)
                 if achievements:
                     self.print_success(f"🏆 You earned {len(achievements)} new achievement(s)!")
                     for achievement in achievements:
                         print(f"   • {achievement.title}: {achievement.description}")
-                
-                # Update current user data
-                self.current_user = self.savings_controller.get_user(self.current_user.user_id)
             else:
                 self.print_error("Deposit failed.")
         
         except ValueError:
             self.print_error("Please enter a valid amount.")
+        except ConcurrentUpdateError:
+            self.print_error("Your account changed while saving the deposit. Please try again.")
         
         input("Press Enter to continue...")
     
@@ -237,20 +285,23 @@ class SavingsGameApp:
                 input("Press Enter to continue...")
                 return
             
-            goal = self.savings_controller.create_savings_goal(
-                self.current_user.user_id, title, target_amount, deadline_days
-            )
+            with self.ledger.deferred(), self.db.transaction():
+                goal = self.savings_controller.create_savings_goal(
+                    self.current_user.user_id, title, target_amount, deadline_days
+                )
+            
+                # Award points for creating goal
+                points = GOAL_CREATION_POINTS
+                self.game_controller.award_points(self.current_user.user_id, points, "Goal Creation")
             
             self.print_success(f"Goal '{title}' created successfully!")
             self.print_info(f"Target: ${target_amount:.2f} | Deadline: {deadline_days} days")
-            
-            # Award points for creating goal
-            points = 25
-            self.game_controller.award_points(self.current_user.user_id, points, "Goal Creation")
             self.print_success(f"You earned {points} points for creating a goal!")
         
         except ValueError:
             self.print_error("Please enter valid numbers.")
+        except ConcurrentUpdateError:
+            self.print_error("Your account changed while saving the goal. Please try again.")
         
         input("Press Enter to continue...")
     
@@ -308,30 +359,34 @@ class SavingsGameApp:
                     return
                 
                 # Check if user has enough balance
-                if amount > self.current_user.balance:
+                if to_cents(amount) > self.current_user.balance_cents:
                     self.print_error("Insufficient balance!")
                     return
                 
-                # Transfer money from balance to goal
-                if self.savings_controller.withdraw_money(self.current_user.user_id, amount):
-                    completed = self.savings_controller.add_progress_to_goal(goal.goal_id, amount)
+                with self.ledger.deferred(), self.db.transaction():
+                    # Transfer money from balance to goal
+                    withdrawn = self.savings_controller.withdraw_money(self.current_user.user_id, amount)
+                    if withdrawn:
+                        completed = self.savings_controller.add_progress_to_goal(goal.goal_id, amount)
                     
-                    self.print_success(f"Added ${amount:.2f} to '{goal.title}'!")
+                        # Award points for progress
+                        points = points_for(to_cents(amount), PROGRESS_POINTS_PER_DOLLAR)
+                        self.game_controller.award_points(self.current_user.user_id, points, "Goal Progress")
                     
-                    # Award points for progress
-                    points = int(amount * 3)  # 3 points per dollar for goal progress
-                    self.game_controller.award_points(self.current_user.user_id, points, "Goal Progress")
-                    self.print_success(f"You earned {points} points!")
+                        if completed:
+                            # Award bonus points for completion
+                            bonus_points = GOAL_COMPLETION_BONUS
+                            self.game_controller.award_points(self.current_user.user_id, bonus_points, "Goal Completion")
                     
+                        # Check for achievements
+                        achievements = self.game_controller.check_and_award_achievements(self.current_user.user_id)
+                
+                if withdrawn:
+                    self.print_success(f"Added ${amount:.2f} to '{goal.title}'!")
+                    self.print_success(f"You earned {points} points!")
                     if completed:
                         self.print_success("🎉 GOAL COMPLETED! 🎉")
-                        # Award bonus points for completion
-                        bonus_points = 100
-                        self.game_controller.award_points(self.current_user.user_id, bonus_points, "Goal Completion")
                         self.print_success(f"Bonus: {bonus_points} points for completing the goal!")
-                    
-                    # Check for achievements
-                    achievements = self.game_controller.check_and_award_achievements(self.current_user.user_id)
                     if achievements:
                         self.print_success(f"🏆 You earned {len(achievements)} new achievement(s)!")
                         for achievement in achievements:
@@ -344,6 +399,8 @@ class SavingsGameApp:
         
         except ValueError:
             self.print_error("Please enter valid numbers.")
+        except ConcurrentUpdateError:
+            self.print_error("Your account changed while saving the progress. Please try again.")
     
     def view_game_stats(self):
         """View game statistics"""
@@ -361,7 +418,7 @@ class SavingsGameApp:
         print(f"{Fore.GREEN}💰 Balance: ${self.current_user.balance:.2f}{Style.RESET_ALL}")
         
         # Points to next level
-        points_to_next = (self.current_user.level * 100) - self.current_user.total_points
+        points_to_next = self.current_user.points_to_next_level()
         if points_to_next > 0:
             print(f"{Fore.MAGENTA}🚀 Points to next level: {points_to_next}{Style.RESET_ALL}")
         
@@ -427,12 +484,12 @@ class SavingsGameApp:
         goals = self.savings_controller.get_user_goals(self.current_user.user_id)
         
         # Overall savings rate
-        total_saved = sum(goal.current_amount for goal in goals)
-        total_targets = sum(goal.target_amount for goal in goals)
+        total_saved = sum(goal.current_cents for goal in goals)
+        total_targets = sum(goal.target_cents for goal in goals)
         
-        print(f"{Fore.GREEN}💰 Total Saved: ${total_saved:.2f}{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}🎯 Total Targets: ${total_targets:.2f}{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}💼 Available Balance: ${self.current_user.balance:.2f}{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}💰 Total Saved: {format_money(total_saved)}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}🎯 Total Targets: {format_money(total_targets)}{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}💼 Available Balance: {format_money(self.current_user.balance_cents)}{Style.RESET_ALL}")
         
         if total_targets > 0:
             overall_progress = (total_saved / total_targets) * 100
@@ -458,6 +515,44 @@ class SavingsGameApp:
         
         input("Press Enter to continue...")
 
+    def view_instrumentation(self):
+        """Hidden screen showing operation latencies, counters and cache gauges"""
+        self.clear_screen()
+        self.print_header("INSTRUMENTATION")
+        
+        if not METRICS.enabled:
+            self.print_info("Metrics are off. Set SAVINGS_METRICS=<file.prom|file.json> to record from startup.")
+            if input("Start recording now? (y/n): ").lower() == 'y':
+                METRICS.enabled = True
+                self.print_success("Recording. Come back here after a few actions.")
+            input("Press Enter to continue...")
+            return
+        
+        snapshot = METRICS.snapshot()
+        print(f"{Fore.CYAN}{'operation':<40} {'calls':>7} {'mean ms':>9} {'p99 ms':>9}{Style.RESET_ALL}")
+        for name, h in snapshot['operations'].items():
+            print(f"{name:<40} {h['count']:>7} {h['mean'] * 1000:>9.3f} {h['p99'] * 1000:>9.3f}")
+        
+        if snapshot['counters']:
+            print(f"\n{Fore.CYAN}Counters:{Style.RESET_ALL}")
+            for name, value in snapshot['counters'].items():
+                print(f"   • {name}: {value}")
+        
+        for source, values in snapshot['gauges'].items():
+            print(f"\n{Fore.CYAN}{source}:{Style.RESET_ALL}")
+            for name, value in values.items():
+                print(f"   • {name}: {value:.2%}" if name.endswith("_rate") else f"   • {name}: {value}")
+        
+        path = input("\nDump to file (.prom or .json, blank to skip): ").strip()
+        if path:
+            METRICS.dump(path)
+            self.print_success(f"Metrics written to {path}")
+        input("Press Enter to continue...")
+
 if __name__ == "__main__":
+    configure_from_env()
     app = SavingsGameApp()
-    app.main_menu()
+    try:
+        app.main_menu()
+    finally:
+        app.close()
@@ -0,0 +1,264 @@
+# utils/metrics.py
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import weakref
+from functools import wraps
+from typing import Callable, Dict, Tuple
+
+# Opt-in from the environment (see configure_from_env):
+#   SAVINGS_METRICS=metrics.prom   record metrics, dump them at exit (.prom = Prometheus text, else JSON)
+#   SAVINGS_PROFILE=cpu,memory     capture cProfile and/or tracemalloc for the whole run
+#   SAVINGS_PROFILE_DIR=profiles   where the captures are written (default: current directory)
+METRICS_ENV = "SAVINGS_METRICS"
+PROFILE_ENV = "SAVINGS_PROFILE"
+PROFILE_DIR_ENV = "SAVINGS_PROFILE_DIR"
+
+# Upper bounds in seconds of the latency buckets, 10us to 10s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Latency histogram over fixed buckets, with count and sum"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5) if self.count else 0.0,
+            'p99': self.quantile(0.99) if self.count else 0.0,
+            'buckets': dict(zip([str(b) for b in self.bounds] + ["+Inf"], self.counts))
+        }
+
+
+class _Timer:
+    """Context manager recording its block's duration in a histogram"""
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.increment(self.name + ".errors")
+
+
+class _NullTimer:
+    """What timer() hands out while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Process-wide operation latencies, counters and gauges
+
+    Disabled by default: instrumented calls then cost one attribute check.
+    Gauges come from collectors, callables registered by long-lived objects
+    (e.g. a Database reporting cache hit rates) that are polled on snapshot.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._collectors: Dict[str, Callable[[], Dict]] = {}
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def timer(self, name: str):
+        """Time a with-block into the name histogram, if enabled"""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def register_collector(self, name: str, collector: Callable[[], Dict]):
+        """Poll collector() for gauges on every snapshot, replacing any under name
+
+        Bound methods are held weakly so registering does not keep their
+        object alive; a collector whose object is gone is dropped.
+        """
+        if hasattr(collector, "__self__"):
+            method = weakref.WeakMethod(collector)
+            collector = lambda: method()() if method() is not None else None
+        with self._lock:
+            self._collectors[name] = collector
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict:
+        """Get every histogram, counter and collected gauge"""
+        with self._lock:
+            operations = {name: h.snapshot() for name, h in sorted(self._histograms.items())}
+            counters = dict(sorted(self._counters.items()))
+            collectors = list(self._collectors.items())
+        gauges = {}
+        for name, collector in collectors:
+            values = collector()
+            if values is None:
+                with self._lock:
+                    self._collectors.pop(name, None)
+            else:
+                gauges[name] = values
+        return {'enabled': self.enabled, 'operations': operations, 'counters': counters, 'gauges': gauges}
+
+    def to_prometheus(self) -> str:
+        """Render a snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ["# TYPE savings_operation_seconds histogram"]
+        for name, h in snapshot['operations'].items():
+            cumulative = 0
+            for bound, count in h['buckets'].items():
+                cumulative += count
+                lines.append(f'savings_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'savings_operation_seconds_sum{{operation="{name}"}} {h["sum"]}')
+            lines.append(f'savings_operation_seconds_count{{operation="{name}"}} {h["count"]}')
+        for name, value in snapshot['counters'].items():
+            metric = "savings_" + _metric_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for source, values in snapshot['gauges'].items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"savings_{_metric_name(source)}_{_metric_name(key)}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write a snapshot to path: Prometheus text for .prom files, JSON otherwise"""
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w') as f:
+            f.write(content)
+        os.replace(temp_file, path)
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+METRICS = Metrics()
+
+
+def instrumented(name: str):
+    """Decorator timing every call of a function into the name histogram"""
+    def decorate(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with _Timer(METRICS, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def instrument_class(prefix: str):
+    """Class decorator applying instrumented("<prefix>.<method>") to every public method"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith("_") and callable(value):
+                setattr(cls, attr, instrumented(f"{prefix}.{attr}")(value))
+        return cls
+    return decorate
+
+
+def start_profiling(modes, directory: str = "."):
+    """Capture cProfile ("cpu") and/or tracemalloc ("memory") until the process exits
+
+    Writes savings-<pid>.pstats (open with pstats or snakeviz) and
+    savings-<pid>-memory.txt with the top allocation sites.
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"savings-{os.getpid()}")
+    if "cpu" in modes:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def save_profile():
+            profiler.disable()
+            profiler.dump_stats(prefix + ".pstats")
+        atexit.register(save_profile)
+    if "memory" in modes:
+        import tracemalloc
+        tracemalloc.start(10)
+
+        def save_allocations():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            with open(prefix + "-memory.txt", 'w') as f:
+                f.write(f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+        atexit.register(save_allocations)
+
+
+def configure_from_env(environ=os.environ):
+    """Turn on metrics and profiling as requested by the SAVINGS_* variables (entry points call this)"""
+    metrics_file = environ.get(METRICS_ENV)
+    if metrics_file:
+        METRICS.enabled = True
+        atexit.register(METRICS.dump, metrics_file)
+    modes = {m.strip() for m in environ.get(PROFILE_ENV, "").split(",") if m.strip()}
+    if modes:
+        start_profiling(modes, environ.get(PROFILE_DIR_ENV, "."))
@@ -0,0 +1,83 @@
+# models/money.py
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict
+
+# Amounts of money are whole numbers of cents held in plain ints, so sums
+# are exact, comparisons never drift and records serialize as integers.
+# Dollars only appear at the edges: user input, display and the rule
+# catalogue, whose thresholds are written in dollars.
+Cents = int
+
+CENTS_PER_DOLLAR = 100
+
+# Largest amount accepted either way ($10 trillion), far inside the 64-bit
+# amounts of the ledger and SQLite
+MAX_CENTS = 10 ** 15
+MAX_DOLLARS = MAX_CENTS // CENTS_PER_DOLLAR
+
+
+class InvalidAmountError(ValueError):
+    """An amount that is not a finite number of dollars within MAX_DOLLARS"""
+
+
+def _out_of_range(amount) -> InvalidAmountError:
+    return InvalidAmountError(f"Amount {amount} is not a finite number of at most {MAX_DOLLARS} dollars")
+
+
+def to_cents(amount) -> Cents:
+    """Convert a dollar amount (int, float or numeric string) to cents, rounding half up
+
+    Raises InvalidAmountError for booleans, text that is not a number, nan,
+    infinities and amounts beyond MAX_DOLLARS.
+    """
+    if isinstance(amount, bool):
+        raise InvalidAmountError(f"Amount {amount!r} is not a number")
+    if isinstance(amount, int):
+        if abs(amount) > MAX_DOLLARS:
+            raise _out_of_range(amount)
+        return amount * CENTS_PER_DOLLAR
+    if not isinstance(amount, str):
+        if not math.isfinite(amount):
+            raise _out_of_range(amount)
+        # The shortest repr, so 1.005 rounds up as written rather than as the binary 1.00499...
+        amount = str(amount)
+    try:
+        dollars = Decimal(amount.strip())
+    except InvalidOperation:
+        raise InvalidAmountError(f"Amount {amount!r} is not a number") from None
+    # copy_abs and compare are exact; scaling first could overflow the decimal context
+    if not dollars.is_finite() or dollars.copy_abs() > MAX_DOLLARS:
+        raise _out_of_range(amount)
+    return int((dollars * CENTS_PER_DOLLAR).to_integral_value(ROUND_HALF_UP))
+
+
+def to_dollars(cents: Cents) -> float:
+    return cents / CENTS_PER_DOLLAR
+
+
+def format_money(cents: Cents) -> str:
+    """Format cents as $d.cc without going through a float"""
+    sign = "-" if cents < 0 else ""
+    dollars, remainder = divmod(abs(cents), CENTS_PER_DOLLAR)
+    return f"{sign}${dollars}.{remainder:02d}"
+
+
+def points_for(cents: Cents, points_per_dollar: int) -> int:
+    """Get whole points earned on an amount at a per-dollar rate"""
+    return cents * points_per_dollar // CENTS_PER_DOLLAR
+
+
+def record_cents(record: Dict, cents_key: str, dollars_key: str) -> Cents:
+    """Read an amount from a record, accepting the float dollars field of older files"""
+    cents = record.get(cents_key)
+    return cents if cents is not None else to_cents(record[dollars_key])
+
+
+def upgrade_record(record: Dict, amount_fields: Dict[str, str]) -> Dict:
+    """Replace the float dollars fields of an older record with cents fields, in place"""
+    for dollars_key, cents_key in amount_fields.items():
+        if dollars_key in record:
+            dollars = record.pop(dollars_key)
+            record.setdefault(cents_key, to_cents(dollars))
+    return record
@@ -0,0 +1,49 @@
+# models/records.py
+from typing import Dict, List, Optional, TypedDict
+
+# Typed schemas for stored records, in the layout written by the models'
+# to_dict(). Codecs that support typed decoding check a data file against
+# DataFile as they parse it; the result is still plain dicts. Keys that a
+# schema does not declare are dropped by such codecs, so new record fields
+# must be added here too.
+
+
+class _UserRequired(TypedDict):
+    user_id: str
+    name: str
+    email: str
+    total_points: int
+    level: int
+    achievements: List[str]
+    created_at: str
+
+
+class UserRecord(_UserRequired, total=False):
+    balance_cents: int
+    balance: float  # Dollars, in files written before balance_cents
+    last_deposit_day: int
+    deposit_streak_days: int
+    weekly_deposit_streak: int
+    version: int
+
+
+class _GoalRequired(TypedDict):
+    goal_id: str
+    user_id: str
+    title: str
+    created_at: str
+    deadline: str
+    is_completed: bool
+    completion_date: Optional[str]
+
+
+class GoalRecord(_GoalRequired, total=False):
+    target_cents: int
+    current_cents: int
+    target_amount: float   # Dollars, in files written before target_cents
+    current_amount: float  # Dollars, in files written before current_cents
+
+
+class DataFile(TypedDict):
+    users: Dict[str, UserRecord]
+    goals: Dict[str, GoalRecord]
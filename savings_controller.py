@@ -1,20 +1,31 @@
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 from models.user import User
 from models.savings_goal import SavingsGoal
+from models.money import to_cents
 from utils.database import Database
+from utils.ledger import Ledger
+from utils.lock_manager import StripedLockManager
+from utils.metrics import METRICS, instrument_class
 
+# Compare-and-swap attempts before a balance update gives up
+MAX_UPDATE_ATTEMPTS = 50
 
+
+@instrument_class("savings")
 class SavingsController:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, ledger: Ledger = None):
         self.db = db
+        self.ledger = ledger
+        self.version_conflicts = 0
+        self.goal_locks = StripedLockManager()  # Goals carry no version, so updates hold the goal's stripe
     
-    def create_user(self, name: str, email: str) -> User:
-        """Create a new user"""
+    def create_user(self, name: str, email: str, user_id: str = None) -> User:
+        """Create a new user, with a fresh id unless the caller picked one"""
         if not name or not email:
             raise ValueError("Name and email are required")
         
-        user = User(name, email)
-        self.db.save_user(user)
+        user = User(name, email, user_id)
+        self.db.add_user(user)  # DuplicateEmailError if the email is taken
         return user
     
     def get_user(self, user_id: str) -> Optional[User]:
@@ -23,32 +34,56 @@ class SavingsController:
             return None
         return self.db.get_user(user_id)
     
+    def login(self, email: str) -> Optional[User]:
+        """Get the user registered with email, in any case"""
+        if not email or not email.strip():
+            return None
+        return self.db.get_user_by_email(email)
+    
+    def list_users(self, limit: int = 20, cursor: str = None) -> Tuple[List[User], Optional[str]]:
+        """Get a page of users, oldest first, and the cursor of the next page"""
+        return self.db.list_users(limit, cursor)
+    
+    def _update_user(self, user_id: str, change: Callable[[User], bool]) -> bool:
+        """Apply change to a fresh copy of the user and save it if nobody else wrote first"""
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            user = self.db.get_user_for_update(user_id)
+            if not user or not change(user):
+                return False
+            if self.db.compare_and_swap_user(user):
+                return True
+            self.version_conflicts += 1
+            METRICS.increment("savings.version_conflicts")
+        return False
+    
     def deposit_money(self, user_id: str, amount: float) -> bool:
         """Make a deposit"""
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             return False
             
-        user = self.db.get_user(user_id)
-        if user and user.add_money(amount):
-            self.db.save_user(user)
+        if self._update_user(user_id, lambda user: user.add_cents(cents)):
+            if self.ledger is not None:
+                self.ledger.record_deposit(user_id, cents)
             return True
         return False
     
     def withdraw_money(self, user_id: str, amount: float) -> bool:
         """Make a withdrawal"""
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             return False
             
-        user = self.db.get_user(user_id)
-        if user and user.withdraw_money(amount):
-            self.db.save_user(user)
+        if self._update_user(user_id, lambda user: user.withdraw_cents(cents)):
+            if self.ledger is not None:
+                self.ledger.record_withdrawal(user_id, cents)
             return True
         return False
     
     def create_savings_goal(self, user_id: str, title: str, 
                           target_amount: float, deadline_days: int) -> Optional[SavingsGoal]:
         """Create a new savings goal"""
-        if not user_id or not title or target_amount <= 0 or deadline_days <= 0:
+        if not user_id or not title or to_cents(target_amount) <= 0 or deadline_days <= 0:
             return None
             
         # Verify user exists
@@ -61,16 +96,25 @@ class SavingsController:
         return goal
     
     def add_progress_to_goal(self, goal_id: str, amount: float) -> bool:
-        """Add progress to a savings goal"""
-        if not goal_id or amount <= 0:
+        """Add progress to a savings goal
+
+        The read and write hold the goal's stripe, so concurrent progress on
+        one goal is never lost. Inside a transaction the write lands at commit,
+        so callers serialize transactions on the goal's owner (as SavingsApi does).
+        """
+        cents = to_cents(amount)
+        if not goal_id or cents <= 0:
             return False
             
-        goal = self.db.get_goal(goal_id)
-        if goal:
-            completed = goal.add_progress(amount)
+        with self.goal_locks.lock(goal_id):
+            goal = self.db.get_goal(goal_id)
+            if not goal:
+                return False
+            completed = goal.add_progress_cents(cents)
             self.db.save_goal(goal)
-            return completed
-        return False
+        if self.ledger is not None:
+            self.ledger.record_goal_transfer(goal.user_id, goal_id, cents)
+        return completed
     
     def get_user_goals(self, user_id: str) -> List[SavingsGoal]:
         """Get all goals for a user"""
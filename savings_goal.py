@@ -1,44 +1,103 @@
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict
+from datetime import datetime
+from typing import Dict, Optional
+from models.money import Cents, record_cents, to_cents, to_dollars
+from models.timestamps import DAY_MICROS, format_micros, from_micros, now_micros, parse_micros, to_micros
 
 class SavingsGoal:
+    # Timestamps are epoch microseconds; the datetime attributes are computed on access
+    __slots__ = ('goal_id', 'user_id', 'title', 'target_cents', 'current_cents',
+                 'created_us', 'deadline_us', 'is_completed', 'completion_us')
+    
+    # Float dollars fields of older records -> the cents fields replacing them
+    AMOUNT_FIELDS = {'target_amount': 'target_cents', 'current_amount': 'current_cents'}
+
     def __init__(self, user_id: str, title: str, target_amount: float, 
                  deadline_days: int, goal_id: str = None):
         self.goal_id = goal_id or str(uuid.uuid4())
         self.user_id = user_id
         self.title = title
-        self.target_amount = target_amount
-        self.current_amount = 0.0
-        self.created_at = datetime.now()
-        self.deadline = self.created_at + timedelta(days=deadline_days)
+        self.target_cents = to_cents(target_amount)
+        self.current_cents = 0
+        self.created_us = now_micros()
+        self.deadline_us = self.created_us + deadline_days * DAY_MICROS
         self.is_completed = False
-        self.completion_date = None
+        self.completion_us = None
+    
+    @property
+    def target_amount(self) -> float:
+        """Target in dollars"""
+        return to_dollars(self.target_cents)
+    
+    @target_amount.setter
+    def target_amount(self, amount: float):
+        self.target_cents = to_cents(amount)
+    
+    @property
+    def current_amount(self) -> float:
+        """Amount saved so far in dollars"""
+        return to_dollars(self.current_cents)
+    
+    @current_amount.setter
+    def current_amount(self, amount: float):
+        self.current_cents = to_cents(amount)
+    
+    @property
+    def created_at(self) -> datetime:
+        return from_micros(self.created_us)
+    
+    @created_at.setter
+    def created_at(self, moment: datetime):
+        self.created_us = to_micros(moment)
+    
+    @property
+    def deadline(self) -> datetime:
+        return from_micros(self.deadline_us)
+    
+    @deadline.setter
+    def deadline(self, moment: datetime):
+        self.deadline_us = to_micros(moment)
+    
+    @property
+    def completion_date(self) -> Optional[datetime]:
+        return from_micros(self.completion_us) if self.completion_us is not None else None
+    
+    @completion_date.setter
+    def completion_date(self, moment: datetime):
+        self.completion_us = to_micros(moment) if moment is not None else None
     
     def add_progress(self, amount: float) -> bool:
         """Add progress towards the goal"""
-        if amount > 0:
-            self.current_amount += amount
-            if self.current_amount >= self.target_amount and not self.is_completed:
+        return self.add_progress_cents(to_cents(amount))
+    
+    def add_progress_cents(self, cents: Cents) -> bool:
+        """Add progress in cents towards the goal"""
+        if cents > 0:
+            self.current_cents += cents
+            if self.current_cents >= self.target_cents and not self.is_completed:
                 self.is_completed = True
-                self.completion_date = datetime.now()
+                self.completion_us = now_micros()
                 return True  # Goal completed
             return False  # Progress added but not completed
         return False
     
     def get_progress_percentage(self) -> float:
         """Get completion percentage"""
-        return min((self.current_amount / self.target_amount) * 100, 100.0)
+        return min((self.current_cents / self.target_cents) * 100, 100.0)
     
     def days_remaining(self) -> int:
         """Get days remaining to deadline"""
-        return max(0, (self.deadline - datetime.now()).days)
+        return max(0, (self.deadline_us - now_micros()) // DAY_MICROS)
+    
+    def completed_on_time(self) -> bool:
+        """Check whether the goal was completed by its deadline"""
+        return self.is_completed and self.completion_us <= self.deadline_us
     
     def calculate_reward_points(self) -> int:
         """Calculate reward points based on goal completion"""
-        base_points = int(self.target_amount / 10)  # 1 point per $10
+        base_points = self.target_cents // 1000  # 1 point per $10
         if self.is_completed:
-            if self.completion_date <= self.deadline:
+            if self.completion_us <= self.deadline_us:
                 return base_points * 2  # Double points for on-time completion
             else:
                 return base_points  # Regular points for late completion
@@ -49,26 +108,38 @@ class SavingsGoal:
             'goal_id': self.goal_id,
             'user_id': self.user_id,
             'title': self.title,
-            'target_amount': self.target_amount,
-            'current_amount': self.current_amount,
-            'created_at': self.created_at.isoformat(),
-            'deadline': self.deadline.isoformat(),
+            'target_cents': self.target_cents,
+            'current_cents': self.current_cents,
+            'created_at': format_micros(self.created_us),
+            'deadline': format_micros(self.deadline_us),
             'is_completed': self.is_completed,
-            'completion_date': self.completion_date.isoformat() if self.completion_date else None
+            'completion_date': format_micros(self.completion_us)
         }
     
+    def copy(self) -> "SavingsGoal":
+        """Get an independent copy"""
+        goal = SavingsGoal.__new__(SavingsGoal)
+        goal.goal_id = self.goal_id
+        goal.user_id = self.user_id
+        goal.title = self.title
+        goal.target_cents = self.target_cents
+        goal.current_cents = self.current_cents
+        goal.created_us = self.created_us
+        goal.deadline_us = self.deadline_us
+        goal.is_completed = self.is_completed
+        goal.completion_us = self.completion_us
+        return goal
+    
     @classmethod
     def from_dict(cls, data: Dict):
-        goal = cls(
-            data['user_id'], 
-            data['title'], 
-            data['target_amount'], 
-            0,  # deadline_days not needed for reconstruction
-            data['goal_id']
-        )
-        goal.current_amount = data['current_amount']
-        goal.created_at = datetime.fromisoformat(data['created_at'])
-        goal.deadline = datetime.fromisoformat(data['deadline'])
+        goal = cls.__new__(cls)  # Every slot is set below, so skip __init__
+        goal.goal_id = data['goal_id']
+        goal.user_id = data['user_id']
+        goal.title = data['title']
+        goal.target_cents = record_cents(data, 'target_cents', 'target_amount')
+        goal.current_cents = record_cents(data, 'current_cents', 'current_amount')
+        goal.created_us = parse_micros(data['created_at'])
+        goal.deadline_us = parse_micros(data['deadline'])
         goal.is_completed = data['is_completed']
-        goal.completion_date = datetime.fromisoformat(data['completion_date']) if data['completion_date'] else None
+        goal.completion_us = parse_micros(data['completion_date'])
         return goal
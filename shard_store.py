@@ -0,0 +1,394 @@
+# utils/shard_store.py
+import json
+import os
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from models.records import DataFile
+from models.timestamps import parse_micros
+from utils.metrics import METRICS
+from utils.user_index import UserIndex
+
+MANIFEST_FILE = "manifest.json"
+GOAL_INDEX_FILE = "goals.idx"
+USER_INDEX_FILE = "users.idx"
+DEADLINE_INDEX_FILE = "deadlines.idx"
+INDEX_FILES = (GOAL_INDEX_FILE, USER_INDEX_FILE, DEADLINE_INDEX_FILE)
+FORMAT_VERSION = 1
+
+
+class CorruptDataError(Exception):
+    """A data file exists but cannot be decoded; refuse to treat it as empty"""
+
+
+def shard_of(user_id: str, shard_count: int) -> int:
+    """Get the shard holding a user and their goals"""
+    return zlib.crc32(user_id.encode("utf-8")) % shard_count
+
+
+def read_data_file(path: str, codec) -> Dict:
+    """Decode a {"users": ..., "goals": ...} file, raising CorruptDataError if it is unreadable"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    METRICS.increment("storage.bytes_read", len(content))
+    try:
+        return codec.decode(content, DataFile)
+    except ValueError as exc:
+        raise CorruptDataError(f"Cannot decode {path}: {exc}") from exc
+
+
+def write_atomic(path: str, chunks: List[bytes]):
+    """Replace path with the concatenated chunks so a crash leaves either the old or the new file
+
+    The content goes to a temporary file that is fsynced before being renamed
+    over path, and the directory is fsynced so the rename itself survives.
+    """
+    temp_file = path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.writelines(chunks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    if hasattr(os, "O_DIRECTORY"):  # Directories cannot be opened for fsync on Windows
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class _Shard:
+    """One shard's records, with goal ids grouped by owning user
+
+    encoded holds each record's '"id":{...}' bytes as of the last write and
+    stale the ids put since then, so a write only encodes those again.
+    """
+
+    __slots__ = ("data", "user_goals", "encoded", "stale")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.encoded = {"users": {}, "goals": {}}
+        self.stale = {"users": set(data["users"]), "goals": set(data["goals"])}
+        self.user_goals = {}
+        for goal_id, goal in data["goals"].items():
+            self.user_goals.setdefault(goal["user_id"], []).append(goal_id)
+
+
+class ShardStore:
+    """User and goal records split across files by a hash of user_id
+
+    A directory holds a small manifest, one file per shard in the data file
+    layout ({"users": {...}, "goals": {...}}), an append-only index of
+    goal_id -> shard, an append-only log of [user_id, email, created_us]
+    feeding the UserIndex and one of [goal_id, user_id, deadline_us, completed]
+    feeding open_goals(). A user's goals live in the user's shard. Shards are
+    read on first access and kept in an LRU of at most max_loaded; a cold
+    shard with unsaved changes is written out before it is dropped. Opening
+    reads only the manifest, so startup cost does not grow with the data.
+    Writing a shard re-encodes only the records put since its last write and
+    splices in the cached bytes of the rest.
+
+    Not thread-safe; Database serializes access under its lock.
+    """
+
+    def __init__(self, directory: str, codec, shard_count: int = 64,
+                 max_loaded: int = 32, pretty: bool = False):
+        self.directory = directory
+        self.codec = codec
+        self.pretty = pretty
+        self.max_loaded = max_loaded
+        manifest = self._read_manifest()
+        # The manifest is written by the first flush, so files in a directory
+        # without one are leftovers of an interrupted migration
+        self.committed = manifest is not None
+        if not self.committed and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith("shard-") or name in INDEX_FILES:
+                    os.remove(os.path.join(directory, name))
+        self.shard_count = manifest["shard_count"] if manifest else shard_count
+        self._shards = OrderedDict()  # shard number -> _Shard, least recently used first
+        self._dirty = set()
+        self._goal_shards = None      # goal_id -> shard, read from the index on first need
+        self._pending_index = []      # goal index lines not yet written
+        self._user_index = None       # Read from its file on first need
+        self._pending_users = []      # user index lines not yet written
+        self._open_goals = None       # goal_id -> (user_id, deadline_us), read on first need
+        self._pending_deadlines = []  # deadline index lines not yet written
+        # Stores from before an index have no file for it and are scanned for one on first need
+        self._users_indexed = not self.committed or os.path.exists(os.path.join(directory, USER_INDEX_FILE))
+        self._deadlines_indexed = (not self.committed
+                                   or os.path.exists(os.path.join(directory, DEADLINE_INDEX_FILE)))
+        self.loads = self.evictions = self.writes = 0
+        self.reencoded = self.reused = 0  # Records encoded afresh / spliced from cache
+        self.last_flush = {'shards': 0, 'reencoded': 0, 'reused': 0}
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+    def _read_manifest(self) -> Optional[Dict]:
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported shard format {manifest.get('format')} in {self.directory}")
+        return manifest
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, f"shard-{number:04d}.json")
+
+    def _shard(self, number: int) -> _Shard:
+        shard = self._shards.get(number)
+        if shard is not None:
+            self._shards.move_to_end(number)
+            return shard
+        data = None
+        if os.path.exists(self._path(number)):
+            with METRICS.timer("storage.shard_load"):
+                data = read_data_file(self._path(number), self.codec)
+        shard = self._shards[number] = _Shard(data or {"users": {}, "goals": {}})
+        self.loads += 1
+        while len(self._shards) > self.max_loaded:
+            # The least recently used clean shard, so eviction rarely has to write,
+            # but never the one being loaded
+            cold = next((n for n in self._shards if n not in self._dirty and n != number),
+                        next(iter(self._shards)))
+            if cold in self._dirty:
+                self._write(cold)
+            del self._shards[cold]
+            self.evictions += 1
+        return shard
+
+    def _goal_shard(self, goal_id: str) -> Optional[int]:
+        """Find the shard holding a goal: loaded shards first, then the index"""
+        for number in reversed(self._shards):
+            if goal_id in self._shards[number].data["goals"]:
+                return number
+        if self._goal_shards is None:
+            self._goal_shards = {}
+            path = os.path.join(self.directory, GOAL_INDEX_FILE)
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    for line in f:
+                        goal, _, number = line.partition(" ")
+                        if number.endswith("\n"):  # Skip a torn last line
+                            self._goal_shards[goal] = int(number)
+        return self._goal_shards.get(goal_id)
+
+    def get(self, collection: str, record_id: str, owner: str = None) -> Optional[Dict]:
+        """Get a stored record; owner is the goal's user_id, if known"""
+        if collection == "users":
+            number = shard_of(record_id, self.shard_count)
+        elif owner is not None:
+            number = shard_of(owner, self.shard_count)
+        else:
+            number = self._goal_shard(record_id)
+            if number is None:
+                return None
+        return self._shard(number).data[collection].get(record_id)
+
+    def put(self, collection: str, record_id: str, record: Dict):
+        """Store a record in its owner's shard, to be written by the next flush"""
+        owner = record_id if collection == "users" else record["user_id"]
+        number = shard_of(owner, self.shard_count)
+        shard = self._shard(number)
+        if collection == "goals":
+            old = shard.data["goals"].get(record_id)
+            if old is None:
+                shard.user_goals.setdefault(owner, []).append(record_id)
+                self._pending_index.append(f"{record_id} {number}\n")
+                if self._goal_shards is not None:
+                    self._goal_shards[record_id] = number
+            if (not record["is_completed"] if old is None else
+                    old["deadline"] != record["deadline"] or old["is_completed"] != record["is_completed"]):
+                self._index_deadline(record_id, record)
+        else:
+            old = shard.data["users"].get(record_id)
+            if old is None or old["email"] != record["email"] or old["created_at"] != record["created_at"]:
+                self._index_user(record_id, record)
+        shard.data[collection][record_id] = record
+        shard.stale[collection].add(record_id)
+        self._dirty.add(number)
+
+    def _index_user(self, user_id: str, record: Dict):
+        created_us = parse_micros(record["created_at"])
+        self._pending_users.append(json.dumps([user_id, record["email"], created_us]) + "\n")
+        if self._user_index is not None:
+            self._user_index.update(user_id, record["email"], created_us)
+
+    def _index_deadline(self, goal_id: str, record: Dict):
+        deadline_us = parse_micros(record["deadline"])
+        self._pending_deadlines.append(
+            json.dumps([goal_id, record["user_id"], deadline_us, record["is_completed"]]) + "\n")
+        if self._open_goals is not None:
+            self._track_deadline(self._open_goals, goal_id, record["user_id"], deadline_us, record["is_completed"])
+
+    @staticmethod
+    def _track_deadline(open_goals: Dict, goal_id: str, user_id: str, deadline_us: int, completed: bool):
+        if completed:
+            open_goals.pop(goal_id, None)
+        else:
+            open_goals[goal_id] = (user_id, deadline_us)
+
+    def _read_lines(self, name: str) -> List[str]:
+        """Read an append-only index file, skipping a torn last line"""
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r') as f:
+            return [line for line in f if line.endswith("\n")]
+
+    def user_index(self) -> UserIndex:
+        """Get the email and created_at indexes, reading them on first use
+
+        Entries may name users whose shard was not written before a crash;
+        callers check the user record exists.
+        """
+        if self._user_index is not None:
+            return self._user_index
+        scan = not self._users_indexed
+        lines = []
+        if scan:
+            self._pending_users = []  # The scan covers every user put so far
+            for number in range(self.shard_count):
+                for user_id, record in self._shard(number).data["users"].items():
+                    self._index_user(user_id, record)
+        else:
+            lines = self._read_lines(USER_INDEX_FILE)
+        index = self._user_index = UserIndex(json.loads("[" + ",".join(lines + self._pending_users) + "]"))
+        if scan:
+            self._append_lines(USER_INDEX_FILE, self._pending_users)
+            self._users_indexed = True
+        return index
+
+    def open_goals(self) -> Dict[str, Tuple[str, int]]:
+        """Get goal_id -> (user_id, deadline_us) for every goal not completed, reading the index on first use
+
+        Like the user index, entries may name goals whose shard was not
+        written before a crash; callers check the goal record exists.
+        """
+        if self._open_goals is not None:
+            return self._open_goals
+        open_goals = {}
+        if not self._deadlines_indexed:
+            self._pending_deadlines = []  # The scan covers every goal put so far
+            for number in range(self.shard_count):
+                for goal_id, record in self._shard(number).data["goals"].items():
+                    if not record["is_completed"]:
+                        self._index_deadline(goal_id, record)
+            self._append_lines(DEADLINE_INDEX_FILE, self._pending_deadlines)
+            self._deadlines_indexed = True
+        lines = self._read_lines(DEADLINE_INDEX_FILE)
+        for goal_id, user_id, deadline_us, completed in json.loads("[" + ",".join(lines) + "]"):
+            if completed:
+                open_goals.pop(goal_id, None)
+            else:
+                open_goals[goal_id] = (user_id, deadline_us)
+        if len(lines) > 2 * len(open_goals) + 1024:  # Mostly completed or rescheduled goals
+            self._write_file(os.path.join(self.directory, DEADLINE_INDEX_FILE), [
+                (json.dumps([goal_id, user_id, deadline_us, False]) + "\n").encode("utf-8")
+                for goal_id, (user_id, deadline_us) in open_goals.items()])
+        for goal_id, user_id, deadline_us, completed in json.loads("[" + ",".join(self._pending_deadlines) + "]"):
+            self._track_deadline(open_goals, goal_id, user_id, deadline_us, completed)
+        self._open_goals = open_goals
+        return open_goals
+
+    def user_goals(self, user_id: str) -> List[Dict]:
+        """Get a user's goal records"""
+        shard = self._shard(shard_of(user_id, self.shard_count))
+        goals = shard.data["goals"]
+        return [goals[goal_id] for goal_id in shard.user_goals.get(user_id, ())]
+
+    def shard_records(self, number: int) -> List[Tuple[Dict, List[Dict]]]:
+        """Get (user record, goal records) for every user in a shard, in user_id order"""
+        shard = self._shard(number)
+        users, goals = shard.data["users"], shard.data["goals"]
+        return [(users[user_id], [goals[goal_id] for goal_id in shard.user_goals.get(user_id, ())])
+                for user_id in sorted(users)]
+
+    def user_ids(self, number: int) -> List[str]:
+        return list(self._shard(number).data["users"])
+
+    def flush(self, shards: Iterable[int] = None) -> int:
+        """Write the given loaded shards (default: dirty ones), then commit the manifest"""
+        numbers = sorted(self._dirty if shards is None else shards)
+        reencoded, reused = self.reencoded, self.reused
+        for number in numbers:
+            self._write(number)
+        self.last_flush = {'shards': len(numbers), 'reencoded': self.reencoded - reencoded,
+                           'reused': self.reused - reused}
+        if not self.committed:
+            # Written even when empty, to mark the indexes as kept from the start
+            self._append_lines(USER_INDEX_FILE, self._pending_users)
+            self._append_lines(DEADLINE_INDEX_FILE, self._pending_deadlines)
+            self._write_file(os.path.join(self.directory, MANIFEST_FILE), [json.dumps(
+                {"format": FORMAT_VERSION, "shard_count": self.shard_count}).encode("utf-8")])
+            self.committed = True
+        return len(numbers)
+
+    def _write(self, number: int):
+        self._write_index()  # Goals in the shard must be findable by id once it is on disk
+        with METRICS.timer("storage.shard_write"):
+            self._write_file(self._path(number), self._encode(self._shards[number]))
+        self._dirty.discard(number)
+        self.writes += 1
+
+    def _encode(self, shard: _Shard) -> List[bytes]:
+        """Encode a shard as chunks of the file, reusing the bytes of records unchanged since its last write"""
+        if self.pretty:  # Indentation depends on nesting, so cached fragments do not fit
+            for stale in shard.stale.values():
+                stale.clear()
+            self.reencoded += len(shard.data["users"]) + len(shard.data["goals"])
+            return [self.codec.encode(shard.data, True)]
+        encode = self.codec.encode
+        chunks = [b"{"]
+        for collection in ("users", "goals"):
+            records, cache, stale = shard.data[collection], shard.encoded[collection], shard.stale[collection]
+            for record_id in stale:
+                cache[record_id] = encode(record_id) + b":" + encode(records[record_id])
+            self.reencoded += len(stale)
+            self.reused += len(cache) - len(stale)
+            stale.clear()
+            # Large, so written out as chunks rather than concatenated again
+            chunks += [b'"' + collection.encode("ascii") + b'":{', b",".join(cache.values()), b"},"]
+        chunks[-1] = b"}}"
+        return chunks
+
+    def _write_index(self):
+        """Append the pending goal, user and deadline index lines"""
+        if self._pending_index:
+            self._append_lines(GOAL_INDEX_FILE, self._pending_index)
+        # Held until a scan builds the file in stores from before an index
+        if self._pending_users and self._users_indexed:
+            self._append_lines(USER_INDEX_FILE, self._pending_users)
+        if self._pending_deadlines and self._deadlines_indexed:
+            self._append_lines(DEADLINE_INDEX_FILE, self._pending_deadlines)
+
+    def _append_lines(self, name: str, lines: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), 'a') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        lines.clear()
+
+    def _write_file(self, path: str, chunks: List[bytes]):
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(path, chunks)
+        METRICS.increment("storage.bytes_written", sum(map(len, chunks)))
+
+    def stats(self) -> Dict:
+        return {
+            'shards': self.shard_count,
+            'loaded': len(self._shards),
+            'dirty': len(self._dirty),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'writes': self.writes,
+            'reencoded': self.reencoded,
+            'reused': self.reused,
+            'last_flush': dict(self.last_flush)
+        }
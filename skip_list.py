@@ -0,0 +1,135 @@
+# utils/skip_list.py
+import random
+from typing import Any, Iterator, List, Optional
+
+MAX_LEVEL = 32
+P = 0.25
+
+
+class _Node:
+    __slots__ = ("key", "forward", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward = [None] * level
+        self.width = [0] * level  # Level-0 steps from this node to forward[i]
+
+
+class SkipList:
+    """Indexable skip list of unique, ordered keys
+
+    Every link records how many level-0 steps it spans, so insert, remove,
+    rank and positional lookup all run in O(log n) expected time.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _random_level() -> int:
+        level = 1
+        while level < MAX_LEVEL and random.random() < P:
+            level += 1
+        return level
+
+    def _find_update(self, key):
+        """Get the last node before key on every level and each one's position"""
+        update = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node = self._head
+        position = 0
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                position += node.width[i]
+                node = node.forward[i]
+            update[i] = node
+            positions[i] = position
+        return update, positions
+
+    def insert(self, key):
+        """Insert key, which must not already be present"""
+        update, positions = self._find_update(key)
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+                positions[i] = 0
+                self._head.width[i] = self._size
+            self._level = level
+
+        node = _Node(key, level)
+        position = positions[0]
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            node.width[i] = update[i].width[i] - (position - positions[i])
+            update[i].width[i] = position - positions[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        """Remove key, returning whether it was present"""
+        update, _ = self._find_update(key)
+        node = update[0].forward[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """Get the 1-based position of key, or None if absent"""
+        node = self._head
+        position = 0
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                position += node.width[i]
+                node = node.forward[i]
+        return position if node is not self._head and node.key == key else None
+
+    def _node_at(self, position: int) -> Optional[_Node]:
+        if position < 1 or position > self._size:
+            return None
+        node = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and traversed + node.width[i] <= position:
+                traversed += node.width[i]
+                node = node.forward[i]
+        return node
+
+    def at(self, position: int) -> Any:
+        """Get the key at a 1-based position"""
+        node = self._node_at(position)
+        if node is None:
+            raise IndexError(position)
+        return node.key
+
+    def iter_from(self, position: int) -> Iterator:
+        """Yield keys in order starting at a 1-based position"""
+        node = self._node_at(max(position, 1))
+        while node is not None:
+            yield node.key
+            node = node.forward[0]
+
+    def range(self, position: int, count: int) -> List:
+        """Get up to count keys starting at a 1-based position"""
+        keys = []
+        for key in self.iter_from(position):
+            if len(keys) >= count:
+                break
+            keys.append(key)
+        return keys
@@ -0,0 +1,381 @@
+# utils/sqlite_database.py
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.user import User
+from models.savings_goal import SavingsGoal
+from models.money import to_cents
+from models.timestamps import format_micros, parse_micros
+from utils.database import Database, DuplicateEmailError
+from utils.metrics import METRICS
+from utils.user_index import format_cursor, normalize_email, parse_cursor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    balance_cents INTEGER NOT NULL,
+    total_points INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    achievements TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_deposit_day INTEGER NOT NULL DEFAULT 0,
+    deposit_streak_days INTEGER NOT NULL DEFAULT 0,
+    weekly_deposit_streak INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS goals (
+    goal_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    target_cents INTEGER NOT NULL,
+    current_cents INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    deadline TEXT NOT NULL,
+    is_completed INTEGER NOT NULL,
+    completion_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_goals_user_id ON goals (user_id);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (lower(trim(email)));
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at, user_id);
+CREATE INDEX IF NOT EXISTS idx_goals_open ON goals (deadline) WHERE is_completed = 0;
+"""
+
+# Columns added after the first release, with the definition used to add
+# them to databases created before they existed
+ADDED_USER_COLUMNS = [
+    ("last_deposit_day", "INTEGER NOT NULL DEFAULT 0"),
+    ("deposit_streak_days", "INTEGER NOT NULL DEFAULT 0"),
+    ("weekly_deposit_streak", "INTEGER NOT NULL DEFAULT 0"),
+    ("version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Money columns hold INTEGER cents, as the models do. Files from before
+# hold REAL dollars columns instead, converted to cents on open.
+
+# Statements are kept as constants so sqlite3's statement cache reuses
+# the compiled form on every call
+USER_COLUMNS = ("user_id, name, email, balance_cents, total_points, level, achievements, created_at, "
+                "last_deposit_day, deposit_streak_days, weekly_deposit_streak, version")
+GOAL_COLUMNS = ("goal_id, user_id, title, target_cents, current_cents, "
+                "created_at, deadline, is_completed, completion_date")
+
+SELECT_USER = f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?"
+SELECT_ALL_USERS = f"SELECT {USER_COLUMNS} FROM users"
+UPSERT_USER = f"INSERT OR REPLACE INTO users ({USER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+# Rewrites every column (user_id included) from a _user_row, guarded by the old version
+SWAP_USER = ("UPDATE users SET " + ", ".join(f"{column} = ?" for column in USER_COLUMNS.split(", "))
+             + " WHERE user_id = ? AND version = ?")
+# lower() folds ASCII only, matching normalize_email for ASCII addresses
+SELECT_USER_BY_EMAIL = f"SELECT {USER_COLUMNS} FROM users WHERE lower(trim(email)) = ? LIMIT 1"
+# created_at is isoformat() text, which sorts in time order
+SELECT_USERS_PAGE = f"SELECT {USER_COLUMNS} FROM users ORDER BY created_at, user_id LIMIT ?"
+SELECT_USERS_PAGE_AFTER = (f"SELECT {USER_COLUMNS} FROM users WHERE created_at > ? OR (created_at = ? AND user_id > ?) "
+                           "ORDER BY created_at, user_id LIMIT ?")
+SELECT_GOAL = f"SELECT {GOAL_COLUMNS} FROM goals WHERE goal_id = ?"
+SELECT_USERS_AFTER = f"SELECT {USER_COLUMNS} FROM users WHERE user_id > ? ORDER BY user_id"
+SELECT_GOALS_AFTER = f"SELECT {GOAL_COLUMNS} FROM goals WHERE user_id > ? ORDER BY user_id"
+SELECT_USER_GOALS = f"SELECT {GOAL_COLUMNS} FROM goals WHERE user_id = ?"
+SELECT_OPEN_GOALS = "SELECT goal_id, user_id, deadline FROM goals WHERE is_completed = 0"
+UPSERT_GOAL = f"INSERT OR REPLACE INTO goals ({GOAL_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def _user_row(user: User) -> tuple:
+    data = user.to_dict()
+    return (data['user_id'], data['name'], data['email'], data['balance_cents'],
+            data['total_points'], data['level'], json.dumps(data['achievements']),
+            data['created_at'], data['last_deposit_day'], data['deposit_streak_days'],
+            data['weekly_deposit_streak'], data['version'])
+
+
+def _user_from_row(row) -> User:
+    return User.from_dict(_user_dict(row))
+
+
+def _user_dict(row) -> Dict:
+    return {
+        'user_id': row[0],
+        'name': row[1],
+        'email': row[2],
+        'balance_cents': row[3],
+        'total_points': row[4],
+        'level': row[5],
+        'achievements': json.loads(row[6]),
+        'created_at': row[7],
+        'last_deposit_day': row[8],
+        'deposit_streak_days': row[9],
+        'weekly_deposit_streak': row[10],
+        'version': row[11]
+    }
+
+
+def _goal_row(goal: SavingsGoal) -> tuple:
+    data = goal.to_dict()
+    return (data['goal_id'], data['user_id'], data['title'], data['target_cents'],
+            data['current_cents'], data['created_at'], data['deadline'],
+            int(data['is_completed']), data['completion_date'])
+
+
+def _goal_from_row(row) -> SavingsGoal:
+    return SavingsGoal.from_dict(_goal_dict(row))
+
+
+def _goal_dict(row) -> Dict:
+    return {
+        'goal_id': row[0],
+        'user_id': row[1],
+        'title': row[2],
+        'target_cents': row[3],
+        'current_cents': row[4],
+        'created_at': row[5],
+        'deadline': row[6],
+        'is_completed': bool(row[7]),
+        'completion_date': row[8]
+    }
+
+
+class SqliteDatabase:
+    """Drop-in replacement for Database backed by an indexed SQLite file"""
+
+    def __init__(self, db_file: str = "data/savings_data.db"):
+        self.db_file = db_file
+        if os.path.dirname(db_file):
+            os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        # The connection is shared, so a transaction holds the lock until it ends
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self._listeners = []
+        self._pending_notifications = []
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_schema()
+
+    def _migrate_schema(self):
+        """Add columns introduced since the database file was created"""
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        with self.conn:
+            for column, definition in ADDED_USER_COLUMNS:
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+            self._migrate_amounts("users", "user_id", User.AMOUNT_FIELDS)
+            self._migrate_amounts("goals", "goal_id", SavingsGoal.AMOUNT_FIELDS)
+
+    def _migrate_amounts(self, table: str, key: str, amount_fields: Dict[str, str]):
+        """Replace a table's REAL dollars columns with INTEGER cents columns
+
+        Each step checks the columns first, so a conversion interrupted part
+        way is finished on the next open. DROP COLUMN needs SQLite 3.35.
+        """
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        for dollars, cents in amount_fields.items():
+            if dollars not in columns:
+                continue
+            if cents not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {cents} INTEGER NOT NULL DEFAULT 0")
+            rows = self.conn.execute(f"SELECT {key}, {dollars} FROM {table}").fetchall()
+            self.conn.executemany(f"UPDATE {table} SET {cents} = ? WHERE {key} = ?",
+                                  ((to_cents(amount), record_id) for record_id, amount in rows))
+            self.conn.execute(f"ALTER TABLE {table} DROP COLUMN {dollars}")
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed reads and writes in a single SQLite transaction"""
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._transaction_depth -= 1
+                return
+
+            self._transaction_depth = 1
+            try:
+                with self.conn:
+                    yield self
+                notifications = self._pending_notifications
+            finally:
+                self._transaction_depth = 0
+                self._pending_notifications = []
+        for collection, record in notifications:
+            self._notify(collection, record)
+
+    def subscribe(self, listener: Callable[[str, Dict], None]):
+        """Call listener(collection, record) after every committed user/goal write
+
+        An exception from a listener is reported on stderr and counted, never
+        raised to the writer.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, collection: str, record: Dict):
+        if self._transaction_depth:
+            self._pending_notifications.append((collection, record))
+            return
+        for listener in self._listeners:
+            try:
+                listener(collection, record)
+            except Exception as e:  # The write is committed, so the writer must not see it fail
+                METRICS.increment("database.listener_errors")
+                print(f"Listener failed on {collection} record: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _write(self, statement: str, params: tuple) -> int:
+        """Execute a write and get the number of rows it changed"""
+        with self._lock:
+            if self._transaction_depth:
+                return self.conn.execute(statement, params).rowcount
+            with self.conn:
+                return self.conn.execute(statement, params).rowcount
+
+    def _read(self, statement: str, params: tuple = ()) -> List:
+        with self._lock:
+            return self.conn.execute(statement, params).fetchall()
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        """Get user by ID"""
+        rows = self._read(SELECT_USER, (user_id,))
+        return _user_from_row(rows[0]) if rows else None
+
+    def save_user(self, user: User):
+        """Save user to database"""
+        with self._lock:
+            user.version += 1
+            self._write(UPSERT_USER, _user_row(user))
+            if self._listeners:
+                self._notify("users", user.to_dict())
+
+    def add_user(self, user: User):
+        """Save a new user, raising DuplicateEmailError if the email is taken in any case"""
+        with self._lock:
+            existing = self.get_user_by_email(user.email)
+            if existing is not None and existing.user_id != user.user_id:
+                raise DuplicateEmailError(f"Email {user.email} is already registered")
+            self.save_user(user)
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Get the user registered with email, in any case"""
+        rows = self._read(SELECT_USER_BY_EMAIL, (normalize_email(email),))
+        return _user_from_row(rows[0]) if rows else None
+
+    def list_users(self, limit: int = 20, cursor: str = None) -> Tuple[List[User], Optional[str]]:
+        """Get a page of users in created_at order and the cursor of the next page (None after the last)"""
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        if cursor:
+            created_us, user_id = parse_cursor(cursor)
+            created_at = format_micros(created_us)
+            rows = self._read(SELECT_USERS_PAGE_AFTER, (created_at, created_at, user_id, limit + 1))
+        else:
+            rows = self._read(SELECT_USERS_PAGE, (limit + 1,))
+        users = [_user_from_row(row) for row in rows[:limit]]
+        next_cursor = format_cursor(parse_micros(rows[limit - 1][7]), rows[limit - 1][0]) if len(rows) > limit else None
+        return users, next_cursor
+
+    def get_user_for_update(self, user_id: str) -> Optional[User]:
+        """Get a user to modify and save with compare_and_swap_user"""
+        return self.get_user(user_id)
+
+    def compare_and_swap_user(self, user: User) -> bool:
+        """Save user only if the stored row is still at user.version"""
+        with self._lock:
+            expected = user.version
+            user.version += 1
+            if self._write(SWAP_USER, _user_row(user) + (user.user_id, expected)) != 1:
+                user.version = expected
+                return False
+            if self._listeners:
+                self._notify("users", user.to_dict())
+        return True
+
+    def get_all_users(self) -> List[User]:
+        """Get all users"""
+        return [_user_from_row(row) for row in self._read(SELECT_ALL_USERS)]
+
+    def get_goal(self, goal_id: str) -> Optional[SavingsGoal]:
+        """Get goal by ID"""
+        rows = self._read(SELECT_GOAL, (goal_id,))
+        return _goal_from_row(rows[0]) if rows else None
+
+    def save_goal(self, goal: SavingsGoal):
+        """Save goal to database"""
+        with self._lock:
+            self._write(UPSERT_GOAL, _goal_row(goal))
+            if self._listeners:
+                self._notify("goals", goal.to_dict())
+
+    def get_user_goals(self, user_id: str) -> List[SavingsGoal]:
+        """Get all goals for a user"""
+        return [_goal_from_row(row) for row in self._read(SELECT_USER_GOALS, (user_id,))]
+
+    def storage_order(self, user_ids: Iterable[str]) -> List[str]:
+        """Sort user ids in primary key order"""
+        return sorted(user_ids)
+
+    def open_goal_deadlines(self) -> Dict[str, Tuple[str, int]]:
+        """Get goal_id -> (user_id, deadline_us) for every goal not completed"""
+        return {goal_id: (user_id, parse_micros(deadline))
+                for goal_id, user_id, deadline in self._read(SELECT_OPEN_GOALS)}
+
+    def iter_user_records(self, after_user_id: str = None) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """Yield (user dict, goal dicts) for every user in user_id order
+
+        Users and goals are read with two ordered cursors merged in step, so
+        the walk is a single pass that never holds more than one user's goals.
+        """
+        start = after_user_id if after_user_id is not None else ""
+        # A separate read connection lets callers keep writing through self.conn
+        read_conn = sqlite3.connect(self.db_file)
+        try:
+            goal_rows = read_conn.execute(SELECT_GOALS_AFTER, (start,))
+            pending = goal_rows.fetchone()
+            for row in read_conn.execute(SELECT_USERS_AFTER, (start,)):
+                user_id = row[0]
+                while pending is not None and pending[1] < user_id:
+                    pending = goal_rows.fetchone()  # Orphaned goal
+                goals = []
+                while pending is not None and pending[1] == user_id:
+                    goals.append(_goal_dict(pending))
+                    pending = goal_rows.fetchone()
+                yield _user_dict(row), goals
+        finally:
+            read_conn.close()
+
+    def close(self):
+        self.conn.close()
+
+
+def migrate_json_to_sqlite(json_file: str = "data/savings_data.json",
+                           db_file: str = "data/savings_data.db") -> Dict[str, int]:
+    """Copy every user and goal from a JSON database into a SQLite database
+
+    Reads through Database, so a single data file is sharded first and
+    shards are streamed one at a time.
+    """
+    source = Database(json_file)
+    counts = {"users": 0, "goals": 0}
+    db = SqliteDatabase(db_file)
+    try:
+        with db.conn:
+            for user_data, goal_data in source.iter_user_records():
+                db.conn.execute(UPSERT_USER, _user_row(User.from_dict(user_data)))
+                db.conn.executemany(UPSERT_GOAL, (_goal_row(SavingsGoal.from_dict(g)) for g in goal_data))
+                counts["users"] += 1
+                counts["goals"] += len(goal_data)
+    finally:
+        db.close()
+        source.close()
+
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+    counts = migrate_json_to_sqlite(*sys.argv[1:3])
+    print(f"Migrated {counts['users']} users and {counts['goals']} goals")
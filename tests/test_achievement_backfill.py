@@ -0,0 +1,27 @@
+from controllers import achievement_backfill
+from controllers.achievement_backfill import AchievementBackfill
+from utils.database import Database
+from models.user import User
+
+
+def test_backfill_keeps_writes_made_while_a_chunk_is_evaluated(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / "savings_data.json"), journaled=True)
+    user = User("saver", "saver@example.com", "saver")
+    user.balance_cents = 500
+    db.add_user(user)
+    evaluate = achievement_backfill._evaluate_chunk
+
+    def evaluate_during_deposit(chunk, manager=None):
+        earned = evaluate(chunk, manager)
+        live = db.get_user_for_update("saver")
+        live.add_cents(10000)
+        assert db.compare_and_swap_user(live)
+        return earned
+
+    monkeypatch.setattr(achievement_backfill, "_evaluate_chunk", evaluate_during_deposit)
+    stats = AchievementBackfill(db).run()
+    saved = db.get_user("saver")
+    assert stats["awarded_users"] == 1
+    assert saved.balance_cents == 10500
+    assert "first_deposit" in saved.achievements and saved.total_points > 0
+    db.close()
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pytest
+from api_server import MAX_HEADER_LINES, ApiError, ApiServer, SavingsApi, _read_headers
+from utils.database import Database
+
+
+@pytest.fixture
+def api(tmp_path):
+    db = Database(str(tmp_path / "savings_data.json"))
+    api = SavingsApi(db, max_workers=2)
+    asyncio.run(api.handle("POST", "/users", {"name": "saver", "email": "saver@example.com", "user_id": "saver"}))
+    yield api
+    api.executor.shutdown()
+    db.close()
+
+
+def _call(api, method, path, body):
+    return asyncio.run(api.handle(method, path, body))
+
+
+@pytest.mark.parametrize("days", [0, -1, 36501, 1e18, float("nan"), float("inf"), "30", True])
+def test_goal_deadline_must_be_a_sane_number_of_days(api, days):
+    status, payload = _call(api, "POST", "/users/saver/goals",
+                            {"title": "Bike", "target_amount": 300, "deadline_days": days})
+    assert status == 400, payload
+
+
+def test_goal_deadline_within_range_is_accepted(api):
+    status, payload = _call(api, "POST", "/users/saver/goals",
+                            {"title": "Bike", "target_amount": 300, "deadline_days": 36500})
+    assert status == 201, payload
+
+
+@pytest.mark.parametrize("query", [{"email": 5}, {"email": ["saver@example.com"]}, {"limit": [1]},
+                                   {"limit": float("inf")}, {"cursor": 7}])
+def test_list_users_rejects_wrongly_typed_parameters(api, query):
+    status, payload = _call(api, "GET", "/users", query)
+    assert status == 400, payload
+
+
+def _exchange(api, request: bytes) -> bytes:
+    async def run():
+        server = ApiServer(api)
+        await server.start("127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+    return asyncio.run(run())
+
+
+def test_too_many_header_lines_get_431(api):
+    headers = b"".join(b"X-Filler-%d: 1\r\n" % i for i in range(MAX_HEADER_LINES + 1))
+    response = _exchange(api, b"GET /users/saver HTTP/1.1\r\n" + headers + b"\r\n")
+    assert response.startswith(b"HTTP/1.1 431 ")
+
+
+def test_oversized_header_line_is_rejected():
+    async def read_head():
+        reader = asyncio.StreamReader(limit=1024)
+        reader.feed_data(b"Host: example.com\r\nX-Big: " + b"a" * 4096 + b"\r\n\r\n")
+        reader.feed_eof()
+        return await _read_headers(reader)
+
+    with pytest.raises(ApiError) as raised:
+        asyncio.run(read_head())
+    assert raised.value.status == 431
+
+
+def test_requests_within_limits_are_served(api):
+    headers = b"".join(b"X-Filler-%d: 1\r\n" % i for i in range(MAX_HEADER_LINES - 1))
+    response = _exchange(api, b"GET /users/saver HTTP/1.1\r\nConnection: close\r\n" + headers + b"\r\n")
+    assert response.startswith(b"HTTP/1.1 200 ")
+    assert json.loads(response.partition(b"\r\n\r\n")[2])["user_id"] == "saver"
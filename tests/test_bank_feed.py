@@ -0,0 +1,66 @@
+import json
+import time
+from datetime import datetime
+from controllers.bank_feed import DepositImporter, _parse_date
+from models.user import User
+from utils.database import Database
+from utils.ledger import Ledger
+
+
+def _importer(tmp_path, db, ledger=None):
+    return DepositImporter(db, ledger, keys_file=str(tmp_path / "imported.keys"))
+
+
+def _setup(tmp_path):
+    db = Database(str(tmp_path / "savings_data.json"))
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    return db
+
+
+def test_reimporting_a_file_applies_each_deposit_once(tmp_path):
+    db = _setup(tmp_path)
+    feed = tmp_path / "feed.csv"
+    # The two identical rows are separate deposits
+    feed.write_text("user_id,amount,date\n"
+                    "saver,10.00,2024-01-01\n"
+                    "saver,10.00,2024-01-01\n"
+                    "SAVER@example.com,2.50,2024-01-02\n")
+    ledger = Ledger(str(tmp_path / "ledger.bin"))
+    stats = _importer(tmp_path, db, ledger).import_file(str(feed))
+    assert (stats["imported"], stats["duplicates"]) == (3, 0)
+    assert db.get_user("saver").balance_cents == 2250
+
+    # A later run, with one more row appended to the export
+    with open(feed, 'a') as f:
+        f.write("saver,10.00,2024-01-01\n")
+    stats = _importer(tmp_path, db, ledger).import_file(str(feed))
+    assert (stats["imported"], stats["duplicates"]) == (1, 3)
+    assert db.get_user("saver").balance_cents == 3250
+    assert [e.amount for e in ledger.history("saver") if e.kind == 1] == [1000, 1000, 250, 1000]
+    ledger.close()
+    db.close()
+
+
+def test_malformed_ndjson_rows_are_rejected(tmp_path):
+    db = _setup(tmp_path)
+    feed = tmp_path / "feed.ndjson"
+    rows = [[1, 2], "x", 3, {"user_id": "saver", "amount": True}, {"user_id": "saver", "amount": "abc"},
+            {"user_id": "saver", "amount": 5, "date": 20240101}, {"user_id": "nobody", "amount": 5},
+            {"user_id": "saver", "amount": 1.005}]
+    feed.write_text("\n".join(json.dumps(row) for row in rows) + "\n{not json\n")
+    stats = _importer(tmp_path, db).import_file(str(feed))
+    assert stats["rows"] == len(rows) + 1
+    assert (stats["imported"], stats["rejected"]) == (1, len(rows))
+    assert db.get_user("saver").balance_cents == 101
+    db.close()
+
+
+def test_offset_dates_become_naive_local_time(monkeypatch):
+    monkeypatch.setenv("TZ", "LOCAL-3")  # POSIX zone three hours ahead of UTC
+    time.tzset()
+    try:
+        assert _parse_date("2024-03-01T23:30:00-05:00") == datetime(2024, 3, 2, 7, 30)
+        assert _parse_date(" 2024-03-01T12:00:00 ") == datetime(2024, 3, 1, 12)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
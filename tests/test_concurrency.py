@@ -0,0 +1,49 @@
+import sys
+import threading
+import pytest
+from controllers.game_controller import GameController
+from controllers.savings_controller import SavingsController
+from models.level_curve import LevelCurve, set_curve
+from utils.database import Database
+
+THREADS = 4
+ROUNDS = 200
+
+
+@pytest.fixture
+def fast_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Interleave threads between every few bytecodes
+    set_curve(LevelCurve.linear())
+    yield
+    set_curve(None)
+    sys.setswitchinterval(interval)
+
+
+def test_concurrent_updates_to_one_user_are_never_lost(tmp_path, fast_switching):
+    db = Database(str(tmp_path / "savings_data.json"), journaled=True)
+    savings = SavingsController(db)
+    game = GameController(db)
+    user = savings.create_user("saver", "saver@example.com")
+    goal = savings.create_savings_goal(user.user_id, "Bike", 10 ** 6, 30)
+
+    def work():
+        for _ in range(ROUNDS):
+            assert savings.deposit_money(user.user_id, 1)
+            assert game.award_points(user.user_id, 2)[0]
+            savings.add_progress_to_goal(goal.goal_id, 1)
+            game.check_and_award_achievements(user.user_id)
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    saved = db.get_user(user.user_id)
+    achievement_points = sum(game.achievement_manager.get_achievement(a).points_reward for a in saved.achievements)
+    assert saved.balance_cents == THREADS * ROUNDS * 100
+    assert saved.total_points == THREADS * ROUNDS * 2 + achievement_points
+    assert saved.level == LevelCurve.linear().level_for(saved.total_points)
+    assert db.get_goal(goal.goal_id).current_cents == THREADS * ROUNDS * 100
+    db.close()
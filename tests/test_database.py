@@ -0,0 +1,84 @@
+import os
+import threading
+from utils.database import Database
+from models.user import User
+
+
+def test_group_writers_get_flush_errors_instead_of_hanging(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / "savings_data.json"), journaled=True, durability="group")
+    db.add_user(User("before", "before@example.com", "before"))
+    real_fsync = os.fsync
+
+    def failing_fsync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    errors = []
+
+    def write(i):
+        try:
+            db.add_user(User(f"user{i}", f"user{i}@example.com", f"user{i}"))
+        except OSError as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(i,), daemon=True) for i in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=10)
+    assert not any(writer.is_alive() for writer in writers)
+    assert len(errors) == 4 and all(e.errno == 5 for e in errors)
+
+    # The flusher keeps retrying after its back-off and recovers with the disk
+    monkeypatch.setattr(os, "fsync", real_fsync)
+    db.add_user(User("after", "after@example.com", "after"))
+    db.close()
+    db = Database(str(tmp_path / "savings_data.json"), journaled=True)
+    assert db.get_user("after") is not None and db.get_user("user3") is not None
+    db.close()
+
+
+def test_cached_records_are_not_shared_with_callers(tmp_path):
+    db = Database(str(tmp_path / "savings_data.json"))
+    db.add_user(User("reader", "reader@example.com", "reader"))
+    first = db.get_user("reader")
+    first.balance_cents = 999
+    first.achievements.append("unsaved")
+    second = db.get_user("reader")
+    assert second is not first
+    assert second.balance_cents == 0 and second.achievements == []
+    assert db.cache_stats()['hits'] >= 1
+    db.close()
+
+
+def test_listener_errors_do_not_fail_committed_writes(tmp_path, capsys):
+    db = Database(str(tmp_path / "savings_data.json"))
+    seen = []
+
+    def failing_listener(collection, record):
+        raise KeyError("boom")
+
+    db.subscribe(failing_listener)
+    db.subscribe(lambda collection, record: seen.append(record['user_id']))
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    with db.transaction():
+        db.add_user(User("other", "other@example.com", "other"))
+
+    assert seen == ["saver", "other"]  # Later listeners still run
+    assert db.get_user("other").email == "other@example.com"
+    assert "KeyError" in capsys.readouterr().err
+    db.close()
+
+
+def test_reads_hit_the_cache_but_hand_out_copies(tmp_path):
+    db = Database(str(tmp_path / "savings_data.json"))
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    first = db.get_user("saver")
+    first.add_cents(100)  # Unsaved
+    second = db.get_user("saver")
+    assert second is not first
+    assert second.balance_cents == 0
+    assert db.cache_stats()['hits'] >= 1
+    with db.transaction():
+        assert db.get_user("saver") is db.get_user("saver")
+    db.close()
@@ -0,0 +1,71 @@
+import pytest
+from controllers.deadline_scheduler import EXPIRY, REMINDER, DeadlineScheduler
+from controllers.game_controller import MISSED_DEADLINE_FORFEIT, GameController
+from models.savings_goal import SavingsGoal
+from models.timestamps import DAY_MICROS
+from models.user import User
+from utils.database import Database
+
+
+def _start(tmp_path):
+    """Open the storage and a scheduler over it, as the app does on startup"""
+    db = Database(str(tmp_path / "savings_data.json"))
+    scheduler = DeadlineScheduler.attach(GameController(db), state_file=str(tmp_path / "deadlines.json"))
+    return db, scheduler
+
+
+def _kinds(fired):
+    return [event.kind for event, _ in fired]
+
+
+def test_hooks_fire_exactly_once_across_restarts(tmp_path):
+    db, scheduler = _start(tmp_path)
+    user = User("saver", "saver@example.com", "saver")
+    user.total_points = 100
+    db.add_user(user)
+    goal = SavingsGoal("saver", "Bike", 300, 10)
+    db.save_goal(goal)
+    start = scheduler.fired_until
+    assert _kinds(scheduler.run_due(start + 8 * DAY_MICROS)) == [REMINDER]
+    db.close()
+
+    db, scheduler = _start(tmp_path)
+    assert scheduler.run_due(start + 9 * DAY_MICROS) == []
+    assert _kinds(scheduler.run_due(start + 11 * DAY_MICROS)) == [EXPIRY]
+    db.close()
+
+    db, scheduler = _start(tmp_path)
+    assert scheduler.run_due(start + 30 * DAY_MICROS) == []
+    assert scheduler.stats()['open_goals'] == 0
+    assert db.get_user("saver").total_points == 100 - MISSED_DEADLINE_FORFEIT
+    db.close()
+
+
+def test_a_failed_hook_is_fired_again_on_the_next_run(tmp_path, monkeypatch):
+    db, scheduler = _start(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    db.save_goal(SavingsGoal("saver", "Bike", 300, 5))
+    due = scheduler.fired_until + 6 * DAY_MICROS
+
+    def failing_hook(goal):
+        raise OSError("storage unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(scheduler.game_controller, "goal_deadline_missed", failing_hook)
+        with pytest.raises(OSError):
+            scheduler.run_due(due)
+    assert _kinds(scheduler.run_due(due)) == [EXPIRY]  # The reminder went through before the failure
+    assert scheduler.fired == {REMINDER: 1, EXPIRY: 1}
+    assert scheduler.run_due(due) == []
+    db.close()
+
+
+def test_completed_goals_never_fire(tmp_path):
+    db, scheduler = _start(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    goal = SavingsGoal("saver", "Bike", 300, 10)
+    db.save_goal(goal)
+    goal.is_completed = True
+    db.save_goal(goal)
+    assert scheduler.run_due(scheduler.fired_until + 30 * DAY_MICROS) == []
+    db.close()
@@ -0,0 +1,66 @@
+import json
+import os
+import pytest
+from utils.database import DURABILITY_MODES, Database
+from utils.shard_store import write_atomic
+from models.user import User
+
+
+def _write_legacy_file(data_file):
+    """Write a single data file from before sharding, with float dollar amounts"""
+    user = User("saver", "saver@example.com", "saver").to_dict()
+    del user['balance_cents']
+    user['balance'] = 12.34
+    goal = {'goal_id': "bike", 'user_id': "saver", 'title': "Bike", 'target_amount': 300.0,
+            'current_amount': 19.99, 'created_at': user['created_at'], 'deadline': user['created_at'],
+            'is_completed': False, 'completion_date': None}
+    with open(data_file, 'w') as f:
+        json.dump({"users": {"saver": user}, "goals": {"bike": goal}}, f)
+
+
+@pytest.mark.parametrize("journaled", [False, True])
+@pytest.mark.parametrize("durability", DURABILITY_MODES)
+def test_legacy_file_round_trips_in_every_mode(tmp_path, durability, journaled):
+    data_file = str(tmp_path / "savings_data.json")
+    _write_legacy_file(data_file)
+
+    db = Database(data_file, journaled=journaled, durability=durability, flush_interval=0.01)
+    user = db.get_user("saver")
+    assert user.balance_cents == 1234
+    assert db.get_goal("bike").current_cents == 1999
+    user.add_cents(66)
+    db.save_user(user)
+    db.add_user(User("other", "other@example.com", "other"))
+    db.close()
+
+    reopened = Database(data_file, journaled=journaled, durability=durability)
+    assert reopened.get_user("saver").balance_cents == 1300
+    assert reopened.get_user("other").email == "other@example.com"
+    assert reopened.get_goal("bike").target_cents == 30000
+    reopened.close()
+
+
+@pytest.mark.parametrize("durability", DURABILITY_MODES)
+def test_flushed_writes_survive_a_crash(tmp_path, durability):
+    data_file = str(tmp_path / "savings_data.json")
+    db = Database(data_file, journaled=True, durability=durability, flush_interval=60)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    db.flush()
+    # No close(): only what flush() made durable is on disk
+    reopened = Database(data_file, journaled=True)
+    assert reopened.get_user("saver").name == "saver"
+    reopened.close()
+
+
+def test_failed_atomic_write_leaves_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "shard-0000.json")
+    write_atomic(path, [b'{"users":{},', b'"goals":{}}'])
+
+    def failing_replace(src, dst):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        write_atomic(path, [b'{"users":{"new":{}},"goals":{}}'])
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"users":{},"goals":{}}'
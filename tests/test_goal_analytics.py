@@ -0,0 +1,55 @@
+import threading
+from models.savings_goal import SavingsGoal
+from models.user import User
+from utils.database import Database
+from utils.goal_analytics import GoalAnalytics
+
+
+def _goal(user_id, target, saved, completed=False):
+    goal = SavingsGoal(user_id, "Goal", target, 30)
+    goal.current_cents = saved
+    goal.is_completed = completed
+    return goal
+
+
+def test_totals_follow_database_writes(tmp_path):
+    db = Database(str(tmp_path / "savings_data.json"))
+    for user_id in ("alice", "bob"):
+        db.add_user(User(user_id, f"{user_id}@example.com", user_id))
+    db.save_goal(_goal("alice", 100, 2500))
+    analytics = GoalAnalytics.attach(db)
+    bike = _goal("bob", 300, 30000, completed=True)
+    db.save_goal(bike)
+    bike.current_cents = 15000
+    db.save_goal(bike)
+
+    totals = analytics.totals()
+    assert (totals['goal_count'], totals['completed'], totals['total_saved']) == (2, 1, 175.0)
+    assert analytics.user_totals("bob")['total_target'] == 300.0
+    assert analytics.per_user_saved() == {"alice": 25.0, "bob": 150.0}
+    assert analytics.progress_distribution(bins=4) == [0, 1, 1, 0]
+    db.close()
+
+
+def test_aggregates_run_while_writers_upsert():
+    analytics = GoalAnalytics()
+    errors = []
+
+    def upsert(user_id):
+        try:
+            for _ in range(2000):
+                analytics.upsert(_goal(user_id, 10, 100).to_dict())
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=upsert, args=(f"user{i}",)) for i in range(2)]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        analytics.totals()
+        analytics.per_user_saved()
+    for writer in writers:
+        writer.join()
+    assert errors == []
+    assert analytics.totals()['goal_count'] == 4000
+    assert analytics.per_user_saved() == {"user0": 2000.0, "user1": 2000.0}
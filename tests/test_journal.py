@@ -0,0 +1,54 @@
+import os
+from utils.database import Database
+from utils.journal import Journal
+from models.user import User
+
+
+def _open(tmp_path, **kwargs):
+    return Database(str(tmp_path / "savings_data.json"), journaled=True, compact_threshold=10 ** 6, **kwargs)
+
+
+def test_journaled_writes_survive_a_crash_before_compaction(tmp_path):
+    db = _open(tmp_path)
+    user = User("saver", "saver@example.com", "saver")
+    db.add_user(user)
+    user.add_cents(2500)
+    db.save_user(user)
+    # No close(): the shards were never written, only the journal
+    assert os.path.getsize(str(tmp_path / "savings_data.json.log")) > 0
+
+    reopened = _open(tmp_path)
+    assert reopened.get_user("saver").balance_cents == 2500
+    reopened.close()
+
+
+def test_replay_stops_at_a_torn_last_line_and_truncates_it(tmp_path):
+    db = _open(tmp_path)
+    db.add_user(User("first", "first@example.com", "first"))
+    db.add_user(User("second", "second@example.com", "second"))
+    log_file = str(tmp_path / "savings_data.json.log")
+    intact = os.path.getsize(log_file)
+    with open(log_file, 'ab') as f:
+        f.write(b'{"collection": "users", "id": "torn", "rec')  # Crash mid-append
+
+    reopened = _open(tmp_path)
+    assert reopened.get_user("first") and reopened.get_user("second")
+    assert reopened.get_user("torn") is None
+    assert os.path.getsize(log_file) == intact
+    reopened.add_user(User("third", "third@example.com", "third"))
+
+    assert [record_id for _, record_id, _ in Journal(log_file).entries()] == ["first", "second", "third"]
+    again = _open(tmp_path)
+    assert again.get_user("third").email == "third@example.com"
+    again.close()
+
+
+def test_close_folds_the_journal_into_shards(tmp_path):
+    db = _open(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    db.close()
+    assert os.path.getsize(str(tmp_path / "savings_data.json.log")) == 0
+
+    reopened = Database(str(tmp_path / "savings_data.json"))  # Unjournaled: shards only
+    assert reopened.get_user("saver").name == "saver"
+    reopened.close()
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+import pytest
+from controllers.leaderboard import WEEKLY, Leaderboard, LeaderboardService
+
+
+def test_keep_periods_must_keep_the_current_period():
+    with pytest.raises(ValueError):
+        LeaderboardService(keep_periods=0)
+
+
+def test_windowed_boards_are_pruned_to_keep_periods():
+    now = [datetime(2024, 1, 1)]
+    service = LeaderboardService(keep_periods=1, clock=lambda: now[0])
+    service.record_points("alice", 0)
+    for week in range(5):
+        now[0] = datetime(2024, 1, 1) + timedelta(weeks=week)
+        service.record_points("alice", (week + 1) * 10)
+    assert len(service._windows[WEEKLY]) == 1
+    assert service.board(WEEKLY).get_points("alice") == 10
+
+
+def test_ranks_follow_score_changes():
+    board = Leaderboard()
+    for user_id, points in (("alice", 30), ("bob", 20), ("carol", 10), ("dave", 20)):
+        board.set_points(user_id, points)
+    assert board.top(4) == [(1, "alice", 30), (2, "bob", 20), (3, "dave", 20), (4, "carol", 10)]
+    board.add_points("carol", 25)
+    board.set_points("alice", 5)
+    assert board.rank("carol") == 1
+    assert board.rank("alice") == 4
+    assert board.around("bob", radius=1) == [(1, "carol", 35), (2, "bob", 20), (3, "dave", 20)]
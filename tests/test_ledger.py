@@ -0,0 +1,54 @@
+import uuid
+import pytest
+from utils.ledger import DEPOSIT, GROWTH_BYTES, HEADER, POINTS_AWARD, RECORD, Ledger, key_to_id, record_key
+
+
+def test_reopen_rebuilds_the_per_user_index(tmp_path):
+    ledger_file = str(tmp_path / "ledger.bin")
+    alice, bob = str(uuid.uuid4()), "bob"  # bob is not a UUID and is stored hashed
+    ledger = Ledger(ledger_file)
+    for cents in (100, 250, 75):
+        ledger.record_deposit(alice, cents)
+        ledger.record_points(bob, cents // 5)
+    ledger.record_withdrawal(alice, 50)
+    ledger.close()
+
+    reopened = Ledger(ledger_file)
+    assert len(reopened) == 7
+    assert [e.amount for e in reopened.history(alice)] == [100, 250, 75, 50]
+    assert [(e.kind, e.amount) for e in reopened.history(bob)] == [(POINTS_AWARD, 20), (POINTS_AWARD, 50),
+                                                                   (POINTS_AWARD, 15)]
+    assert reopened.rebuild_balances() == {alice: 375}
+    assert key_to_id(record_key(bob)) not in reopened.rebuild_balances()
+    # Appends after reopening land after the old records and in the index
+    reopened.record_deposit(alice, 1)
+    assert [e.amount for e in reopened.history(alice)][-1] == 1
+    reopened.close()
+
+
+def test_scan_survives_appends_that_grow_the_map(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.bin"))
+    fill = (GROWTH_BYTES - RECORD.size) // RECORD.size
+    for _ in range(fill):
+        ledger.append("saver", DEPOSIT, 1)
+    entries = ledger.scan()
+    next(entries)
+    # Grows the map while the scan is part way through
+    for _ in range(10):
+        ledger.append("saver", DEPOSIT, 1)
+    assert len(ledger._map) > HEADER.size + GROWTH_BYTES
+    assert sum(1 for _ in entries) == fill - 1
+    ledger.close()
+
+
+def test_deferred_appends_are_dropped_when_the_block_raises(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.bin"))
+    with pytest.raises(RuntimeError):
+        with ledger.deferred():
+            ledger.record_deposit("saver", 100)
+            raise RuntimeError("transaction failed")
+    with ledger.deferred():
+        assert ledger.record_deposit("saver", 200) is None
+        assert len(ledger) == 0
+    assert [e.amount for e in ledger.history("saver")] == [200]
+    ledger.close()
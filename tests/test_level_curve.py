@@ -0,0 +1,112 @@
+import threading
+import pytest
+from controllers.game_controller import GameController
+from models.level_curve import LevelCurve, set_curve
+from models.user import User
+from utils.database import Database
+
+
+@pytest.fixture
+def curve():
+    curve = LevelCurve([0, 100, 250, 500], rewards={3: 50, 5: 1000})
+    set_curve(curve)
+    yield curve
+    set_curve(None)
+
+
+@pytest.fixture
+def linear():
+    curve = LevelCurve.linear(step=100)
+    set_curve(curve)
+    yield curve
+    set_curve(None)
+
+
+def test_levels_at_and_around_each_threshold(curve):
+    assert [curve.level_for(p) for p in (0, 99, 100, 249, 250, 499, 500, 749, 750, 1000)] == \
+        [1, 1, 2, 2, 3, 3, 4, 4, 5, 6]
+    # Past the table each level costs the final step
+    assert [curve.threshold(level) for level in (0, 1, 4, 5, 6)] == [0, 0, 500, 750, 1000]
+    assert list(curve.levels_for(range(0, 2000, 7))) == [curve.level_for(p) for p in range(0, 2000, 7)]
+    assert curve.reward_between(1, 5) == 1050
+    assert curve.reward_between(3, 4) == 0
+
+
+def test_curve_specs_are_validated():
+    assert LevelCurve.from_spec({"type": "linear", "step": 10}).level_for(25) == 3
+    assert LevelCurve.from_spec({"type": "exponential", "base": 10, "growth": 2, "levels": 4}).thresholds == \
+        [0, 10, 30, 70]
+    for thresholds in ([0], [5, 10], [0, 10, 10]):
+        with pytest.raises(ValueError):
+            LevelCurve(thresholds)
+    with pytest.raises(ValueError):
+        LevelCurve.from_spec({"type": "cubic"})
+
+
+def test_rewards_can_carry_a_user_over_further_levels(curve):
+    user = User("saver", "saver@example.com", "saver")
+    assert user.add_points(700) == 8  # Level 3's 50 points reach level 5, whose 1000 reach level 9
+    assert user.total_points == 1750
+    assert user.level == 9
+    user.add_points(-1700)
+    assert user.level == 9  # Levels never drop on their own
+
+
+def test_recompute_keeps_points_saved_after_the_scan(tmp_path, linear):
+    db = Database(str(tmp_path / "savings_data.json"))
+    game = GameController(db)
+    for i in range(5):
+        user = User(f"user{i}", f"user{i}@example.com", f"user{i}")
+        user.total_points = 300 * i
+        user.level = 9  # Reached on an older, cheaper curve
+        db.add_user(user)
+    set_levels = game._set_levels
+    awarded = []
+
+    def award_then_set(curve, user_ids):
+        if not awarded:  # Another writer saves after the scan read the levels
+            awarded.append(user_ids[0])
+            writer = threading.Thread(target=game.award_points, args=(user_ids[0], 50))
+            writer.start()
+            writer.join()
+        return set_levels(curve, user_ids)
+
+    game._set_levels = award_then_set
+    stats = game.recompute_levels(chunk_size=2)
+    assert stats["users"] == 5
+    expected = {f"user{i}": linear.level_for(300 * i) for i in range(5)}
+    expected[awarded[0]] = linear.level_for(300 * int(awarded[0][-1]) + 50)
+    assert {user_id: db.get_user(user_id).level for user_id in expected} == expected
+    assert db.get_user(awarded[0]).total_points == 300 * int(awarded[0][-1]) + 50
+    db.close()
+
+
+def test_recompute_retries_a_chunk_that_loses_a_race(tmp_path, linear):
+    db = Database(str(tmp_path / "savings_data.json"))
+    game = GameController(db)
+    user = User("saver", "saver@example.com", "saver")
+    user.total_points = 600
+    db.add_user(user)
+    get_for_update = db.get_user_for_update
+    raced = []
+
+    def deposit(user_id):
+        depositor = get_for_update(user_id)
+        depositor.add_cents(500)
+        assert db.compare_and_swap_user(depositor)
+
+    def racing_get_for_update(user_id):
+        found = get_for_update(user_id)
+        if not raced:
+            raced.append(user_id)
+            writer = threading.Thread(target=deposit, args=(user_id,))
+            writer.start()
+            writer.join()
+        return found
+
+    db.get_user_for_update = racing_get_for_update
+    assert game.recompute_levels()["changed"] == 1
+    assert raced == ["saver"]
+    saved = db.get_user("saver")
+    assert (saved.balance_cents, saved.total_points, saved.level) == (500, 600, 7)
+    db.close()
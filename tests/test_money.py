@@ -0,0 +1,22 @@
+import pytest
+from models.money import InvalidAmountError, MAX_DOLLARS, format_money, to_cents
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (1.005, 101), (-1.005, -101), (2.675, 268), (0.1, 10), (19.99, 1999),
+    ("1.005", 101), (" 12.345 ", 1235), (7, 700), (MAX_DOLLARS, MAX_DOLLARS * 100),
+])
+def test_amounts_round_half_up_as_written(amount, cents):
+    assert to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("amount", [True, False, float("nan"), float("inf"), "inf", "1e400", "abc",
+                                    MAX_DOLLARS + 1, float(MAX_DOLLARS * 10)])
+def test_invalid_amounts_are_rejected(amount):
+    with pytest.raises(InvalidAmountError):
+        to_cents(amount)
+
+
+def test_format_money_never_goes_through_a_float():
+    assert format_money(to_cents("9007199254740.99")) == "$9007199254740.99"
+    assert format_money(-5) == "-$0.05"
@@ -0,0 +1,87 @@
+import json
+import os
+from utils.codec import get_codec
+from utils.database import Database
+from utils.shard_store import ShardStore, shard_of
+from models.savings_goal import SavingsGoal
+from models.user import User
+
+SHARD_COUNT = 8
+
+
+def _store(tmp_path, max_loaded=2):
+    return ShardStore(str(tmp_path / "data.shards"), get_codec(), SHARD_COUNT, max_loaded)
+
+
+def _users_in_every_shard():
+    """Get one user id per shard, in shard order"""
+    ids = {}
+    i = 0
+    while len(ids) < SHARD_COUNT:
+        ids.setdefault(shard_of(f"user{i}", SHARD_COUNT), f"user{i}")
+        i += 1
+    return [ids[number] for number in range(SHARD_COUNT)]
+
+
+def test_dirty_shards_are_written_before_eviction(tmp_path):
+    store = _store(tmp_path)
+    user_ids = _users_in_every_shard()
+    for user_id in user_ids:
+        store.put("users", user_id, User(user_id, f"{user_id}@example.com", user_id).to_dict())
+    stats = store.stats()
+    assert stats["loaded"] == 2
+    assert stats["evictions"] == SHARD_COUNT - 2
+    assert stats["writes"] == SHARD_COUNT - 2  # Every evicted shard had unsaved changes
+    # The evicted shards come back from disk with their records
+    assert store.get("users", user_ids[0])["email"] == f"{user_ids[0]}@example.com"
+    store.flush()
+
+    reopened = _store(tmp_path)
+    assert [reopened.get("users", user_id)["user_id"] for user_id in user_ids] == user_ids
+
+
+def test_goals_are_found_by_id_after_their_shard_is_evicted(tmp_path):
+    store = _store(tmp_path, max_loaded=1)
+    user_ids = _users_in_every_shard()
+    goal = SavingsGoal(user_ids[0], "Bike", 300, 30)
+    store.put("goals", goal.goal_id, goal.to_dict())
+    for user_id in user_ids[1:]:
+        store.put("users", user_id, User(user_id, f"{user_id}@example.com", user_id).to_dict())
+    assert store.get("goals", goal.goal_id)["title"] == "Bike"
+    store.flush()
+
+    reopened = _store(tmp_path, max_loaded=1)
+    assert reopened.get("goals", goal.goal_id)["target_cents"] == 30000
+    assert reopened.stats()["loads"] == 1  # Only the goal's shard, found through the index
+
+
+def test_interrupted_migration_leftovers_are_discarded(tmp_path):
+    store = _store(tmp_path, max_loaded=1)
+    for user_id in _users_in_every_shard()[:2]:
+        store.put("users", user_id, User(user_id, f"{user_id}@example.com", user_id).to_dict())
+    # One shard went to disk on eviction, but the manifest never did
+    assert not ShardStore.exists(str(tmp_path / "data.shards"))
+
+    reopened = _store(tmp_path)
+    assert not [name for name in os.listdir(str(tmp_path / "data.shards")) if name.startswith("shard-")]
+    assert all(reopened.get("users", user_id) is None for user_id in _users_in_every_shard())
+
+
+def test_single_data_file_is_split_into_shards(tmp_path):
+    data_file = str(tmp_path / "savings_data.json")
+    user = User("saver", "saver@example.com", "saver")
+    goal = SavingsGoal("saver", "Bike", 300, 30)
+    with open(data_file, 'w') as f:
+        json.dump({"users": {"saver": user.to_dict()}, "goals": {goal.goal_id: goal.to_dict()}}, f)
+
+    db = Database(data_file, shard_count=SHARD_COUNT, max_loaded_shards=1)
+    assert not os.path.exists(data_file)
+    assert os.path.exists(data_file + ".migrated")
+    assert db.get_user("saver").email == "saver@example.com"
+    assert [g.goal_id for g in db.get_user_goals("saver")] == [goal.goal_id]
+    db.close()
+
+    reopened = Database(data_file)  # The shard count comes from the manifest
+    assert reopened.store.shard_count == SHARD_COUNT
+    assert reopened.get_goal(goal.goal_id).title == "Bike"
+    reopened.close()
@@ -0,0 +1,54 @@
+import random
+from utils.skip_list import SkipList
+
+
+def _check(skip_list, expected):
+    assert len(skip_list) == len(expected)
+    assert list(skip_list.iter_from(1)) == expected
+    for position, key in enumerate(expected, 1):
+        assert skip_list.rank(key) == position
+        assert skip_list.at(position) == key
+
+
+def test_rank_and_range_stay_exact_after_deletes():
+    rng = random.Random(7)
+    random.seed(7)  # Node levels
+    skip_list, expected = SkipList(), []
+    for key in rng.sample(range(10000), 2000):
+        skip_list.insert(key)
+        expected.append(key)
+    expected.sort()
+    _check(skip_list, expected)
+
+    for key in rng.sample(expected, 1500):
+        assert skip_list.remove(key)
+        expected.remove(key)
+    _check(skip_list, expected)
+    assert skip_list.range(100, 50) == expected[99:149]
+    assert skip_list.range(len(expected) - 2, 10) == expected[-3:]
+    assert skip_list.range(len(expected) + 1, 10) == []
+
+
+def test_removed_and_missing_keys_have_no_rank():
+    skip_list = SkipList()
+    for key in (5, 1, 3):
+        skip_list.insert(key)
+    assert not skip_list.remove(2)
+    assert skip_list.remove(3)
+    assert skip_list.rank(3) is None
+    assert skip_list.rank(0) is None
+    assert skip_list.range(1, 10) == [1, 5]
+
+
+def test_emptying_the_list_lowers_its_level():
+    random.seed(1)
+    skip_list = SkipList()
+    for key in range(500):
+        skip_list.insert(key)
+    for key in range(500):
+        skip_list.remove(key)
+    assert len(skip_list) == 0
+    assert skip_list._level == 1
+    assert skip_list.range(1, 5) == []
+    skip_list.insert(42)
+    assert skip_list.rank(42) == 1
@@ -0,0 +1,135 @@
+import sqlite3
+import pytest
+from utils.database import Database, DuplicateEmailError
+from utils.sqlite_database import SqliteDatabase, migrate_json_to_sqlite
+from models.savings_goal import SavingsGoal
+from models.user import User
+
+USER_IDS = ["carol", "alice", "bob", "dave"]
+
+
+def _records():
+    """Build users and goals once, so both backends get identical timestamps"""
+    users, goals = [], []
+    for i, user_id in enumerate(USER_IDS):
+        user = User(user_id, f"{user_id.title()}@Example.com ", user_id)
+        user.add_cents(1001 * (i + 1))
+        user.add_points(40 * i)
+        user.add_achievement("first_deposit")
+        users.append(user)
+        goal = SavingsGoal(user_id, f"{user_id}'s bike", 250.5, 30, goal_id=f"goal-{user_id}")
+        goal.current_cents = 333 * i
+        goals.append(goal)
+    return users, goals
+
+
+def _fill(db, records):
+    """Make the same writes to either backend"""
+    users, goals = records
+    for user, goal in zip(users, goals):
+        db.add_user(user.copy())
+        db.save_goal(goal.copy())
+    completed = goals[0].copy()
+    completed.is_completed = True
+    db.save_goal(completed)
+    with db.transaction():
+        user = db.get_user_for_update("bob")
+        user.add_cents(7)
+        db.compare_and_swap_user(user)
+
+
+def _snapshot(db):
+    users, cursor = db.list_users(limit=3)
+    pages = [[u.user_id for u in users]]
+    while cursor:
+        users, cursor = db.list_users(limit=3, cursor=cursor)
+        pages.append([u.user_id for u in users])
+    return {
+        "users": {u.user_id: u.to_dict() for u in db.get_all_users()},
+        "goals": {user_id: [g.to_dict() for g in db.get_user_goals(user_id)] for user_id in USER_IDS},
+        "records": list(db.iter_user_records()),
+        "by_email": db.get_user_by_email("ALICE@example.com").user_id,
+        "pages": pages,
+        "open_goals": db.open_goal_deadlines(),
+        "storage_order": set(db.storage_order(USER_IDS)),
+    }
+
+
+@pytest.fixture
+def backends(tmp_path):
+    json_db = Database(str(tmp_path / "savings_data.json"))
+    sqlite_db = SqliteDatabase(str(tmp_path / "savings_data.db"))
+    yield json_db, sqlite_db
+    json_db.close()
+    sqlite_db.close()
+
+
+def test_sqlite_matches_the_json_backend(backends):
+    json_db, sqlite_db = backends
+    records = _records()
+    for db in backends:
+        _fill(db, records)
+    json_state, sqlite_state = _snapshot(json_db), _snapshot(sqlite_db)
+    assert sqlite_state.pop("records") == sorted(json_state.pop("records"), key=lambda r: r[0]['user_id'])
+    assert sqlite_state == json_state
+    assert sqlite_state["users"]["bob"]["balance_cents"] == 3010
+
+
+def test_both_backends_reject_duplicate_emails_and_stale_versions(backends):
+    records = _records()
+    for db in backends:
+        _fill(db, records)
+        with pytest.raises(DuplicateEmailError):
+            db.add_user(User("imposter", "alice@example.com", "imposter"))
+        first, second = db.get_user_for_update("alice"), db.get_user_for_update("alice")
+        first.add_cents(1)
+        assert db.compare_and_swap_user(first)
+        assert not db.compare_and_swap_user(second)
+        assert db.get_user("alice").balance_cents == 2003
+
+
+def test_migration_copies_every_record(tmp_path):
+    json_file = str(tmp_path / "savings_data.json")
+    json_db = Database(json_file)
+    _fill(json_db, _records())
+    expected = _snapshot(json_db)
+    json_db.close()
+
+    counts = migrate_json_to_sqlite(json_file, str(tmp_path / "savings_data.db"))
+    assert counts == {"users": len(USER_IDS), "goals": len(USER_IDS)}
+    sqlite_db = SqliteDatabase(str(tmp_path / "savings_data.db"))
+    migrated = _snapshot(sqlite_db)
+    assert migrated["users"] == expected["users"]
+    assert migrated["goals"] == expected["goals"]
+    sqlite_db.close()
+
+
+def test_dollar_columns_of_older_files_become_cents(tmp_path):
+    db_file = str(tmp_path / "savings_data.db")
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute("CREATE TABLE users (user_id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL, "
+                     "balance REAL NOT NULL, total_points INTEGER NOT NULL, level INTEGER NOT NULL, "
+                     "achievements TEXT NOT NULL, created_at TEXT NOT NULL)")
+        conn.execute("CREATE TABLE goals (goal_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, title TEXT NOT NULL, "
+                     "target_amount REAL NOT NULL, current_amount REAL NOT NULL, created_at TEXT NOT NULL, "
+                     "deadline TEXT NOT NULL, is_completed INTEGER NOT NULL, completion_date TEXT)")
+        conn.execute("INSERT INTO users VALUES ('saver', 'saver', 'saver@example.com', 1.005, 10, 1, '[]', "
+                     "'2024-01-01T00:00:00')")
+        conn.execute("INSERT INTO goals VALUES ('bike', 'saver', 'Bike', 300.1, 19.99, '2024-01-01T00:00:00', "
+                     "'2024-02-01T00:00:00', 0, NULL)")
+    conn.close()
+
+    db = SqliteDatabase(db_file)
+    assert db.get_user("saver").balance_cents == 101
+    goal = db.get_goal("bike")
+    assert (goal.target_cents, goal.current_cents) == (30010, 1999)
+    db.save_user(db.get_user("saver"))
+    db.close()
+
+    conn = sqlite3.connect(db_file)
+    columns = {row[1]: row[2] for table in ("users", "goals")
+               for row in conn.execute(f"PRAGMA table_info({table})")}
+    conn.close()
+    assert "balance" not in columns and "target_amount" not in columns
+    assert columns["balance_cents"] == columns["target_cents"] == "INTEGER"
@@ -0,0 +1,91 @@
+import os
+import threading
+import pytest
+from utils.database import ConcurrentUpdateError, Database
+from models.user import User
+
+
+def _files(directory):
+    """Get the bytes of every file under directory"""
+    contents = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                contents[os.path.relpath(path, directory)] = f.read()
+    return contents
+
+
+def _open(tmp_path):
+    return Database(str(tmp_path / "savings_data.json"), journaled=True)
+
+
+def test_rollback_leaves_cache_and_files_unchanged(tmp_path):
+    db = _open(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    db.get_user("saver")  # Cached
+    before = _files(str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            user = db.get_user("saver")
+            user.add_cents(5000)
+            db.save_user(user)
+            db.add_user(User("other", "other@example.com", "other"))
+            raise RuntimeError("abort")
+
+    assert db.get_user("saver").balance_cents == 0
+    assert db.get_user("other") is None
+    assert _files(str(tmp_path)) == before
+    db.close()
+
+
+def test_transaction_commits_every_write_together(tmp_path):
+    db = _open(tmp_path)
+    with db.transaction():
+        db.add_user(User("a", "a@example.com", "a"))
+        db.add_user(User("b", "b@example.com", "b"))
+        assert db.get_user("a") is db.get_user("a")  # One object per id inside the block
+    reopened = _open(tmp_path)
+    assert reopened.get_user("a") and reopened.get_user("b")
+    reopened.close()
+
+
+def test_compare_and_swap_detects_a_stale_version(tmp_path):
+    db = _open(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    first = db.get_user_for_update("saver")
+    second = db.get_user_for_update("saver")
+    first.add_cents(100)
+    assert db.compare_and_swap_user(first)
+    second.add_cents(200)
+    assert not db.compare_and_swap_user(second)
+    assert db.get_user("saver").balance_cents == 100
+    db.close()
+
+
+def test_transaction_losing_a_race_writes_nothing(tmp_path):
+    db = _open(tmp_path)
+    db.add_user(User("saver", "saver@example.com", "saver"))
+    db.add_user(User("bystander", "bystander@example.com", "bystander"))
+
+    def concurrent_deposit():
+        user = db.get_user_for_update("saver")
+        user.add_cents(700)
+        assert db.compare_and_swap_user(user)
+
+    with pytest.raises(ConcurrentUpdateError):
+        with db.transaction():
+            bystander = db.get_user_for_update("bystander")
+            bystander.add_cents(100)
+            db.compare_and_swap_user(bystander)
+            user = db.get_user_for_update("saver")
+            writer = threading.Thread(target=concurrent_deposit)
+            writer.start()
+            writer.join()
+            user.add_cents(300)
+            db.compare_and_swap_user(user)
+
+    assert db.get_user("saver").balance_cents == 700
+    assert db.get_user("bystander").balance_cents == 0
+    db.close()
@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from utils.database import Database
+from utils.sqlite_database import SqliteDatabase
+from utils.user_index import UserIndex, parse_cursor
+from models.timestamps import to_micros
+from models.user import User
+
+# Whole seconds, which isoformat() writes without a fraction
+TIED_US = to_micros(datetime(2024, 1, 1))
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "json":
+        db = Database(str(tmp_path / "savings_data.json"))
+    else:
+        db = SqliteDatabase(str(tmp_path / "savings_data.db"))
+    yield db
+    db.close()
+
+
+def _add(db, user_id, created_us):
+    user = User(user_id, f"{user_id}@example.com", user_id)
+    user.created_us = created_us
+    db.add_user(user)
+
+
+def _all_pages(db, limit):
+    pages, cursor = [], None
+    while True:
+        users, cursor = db.list_users(limit=limit, cursor=cursor)
+        pages.append([user.user_id for user in users])
+        if cursor is None:
+            return pages
+
+
+def test_paging_through_tied_created_at_lists_every_user_once(db):
+    _add(db, "late", TIED_US + 1)
+    for user_id in ("e", "b", "d", "a", "c"):
+        _add(db, user_id, TIED_US)
+    _add(db, "early", TIED_US - 1)
+    assert _all_pages(db, 2) == [["early", "a"], ["b", "c"], ["d", "e"], ["late"]]
+    assert _all_pages(db, 7) == [["early", "a", "b", "c", "d", "e", "late"]]
+
+
+def test_cursor_resumes_after_users_added_to_the_tie(db):
+    for user_id in ("a", "c"):
+        _add(db, user_id, TIED_US)
+    users, cursor = db.list_users(limit=1)
+    assert [user.user_id for user in users] == ["a"]
+    _add(db, "b", TIED_US)
+    _add(db, "0", TIED_US)  # Sorts before the cursor, so it is not listed
+    users, cursor = db.list_users(limit=5, cursor=cursor)
+    assert [user.user_id for user in users] == ["b", "c"]
+    assert cursor is None
+
+
+def test_email_changes_do_not_repeat_users():
+    index = UserIndex([("a", "a@example.com", TIED_US), ("b", "b@example.com", TIED_US)])
+    index.update("a", "new@example.com", TIED_US)
+    assert index.page(10) == [(TIED_US, "a"), (TIED_US, "b")]
+    assert index.page(10, (TIED_US, "a")) == [(TIED_US, "b")]
+    assert index.find_email("NEW@example.com ") == "a"
+    assert index.find_email("a@example.com") is None
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        parse_cursor("yesterday:a")
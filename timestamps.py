@@ -0,0 +1,32 @@
+# models/timestamps.py
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Models keep timestamps as integer microseconds since 1970-01-01 on the same
+# naive local clock as datetime.now(), so converting is exact and needs no
+# timezone lookup. datetime objects are only built when a caller asks.
+EPOCH = datetime(1970, 1, 1)
+DAY_MICROS = 86400 * 10 ** 6
+
+
+def to_micros(moment: datetime) -> int:
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(0, 0, micros)
+
+
+def now_micros() -> int:
+    return to_micros(datetime.now())
+
+
+def parse_micros(text: Optional[str]) -> Optional[int]:
+    """Parse an isoformat() string, passing None through"""
+    return to_micros(datetime.fromisoformat(text)) if text else None
+
+
+def format_micros(micros: Optional[int]) -> Optional[str]:
+    """Format as isoformat(), passing None through"""
+    return from_micros(micros).isoformat() if micros is not None else None
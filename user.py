@@ -2,44 +2,113 @@ import json
 import uuid
 from datetime import datetime
 from typing import Dict, List
+from models.level_curve import get_curve
+from models.money import Cents, record_cents, to_cents, to_dollars
+from models.timestamps import format_micros, from_micros, now_micros, parse_micros, to_micros
 
 class User:
+    __slots__ = ('user_id', 'name', 'email', 'balance_cents', 'total_points', 'level',
+                 'achievements', 'created_us', 'last_deposit_day', 'deposit_streak_days',
+                 'weekly_deposit_streak', 'version')
+    
+    # Float dollars fields of older records -> the cents fields replacing them
+    AMOUNT_FIELDS = {'balance': 'balance_cents'}
+
     def __init__(self, name: str, email: str, user_id: str = None):
         self.user_id = user_id or str(uuid.uuid4())
         self.name = name
         self.email = email
-        self.balance = 0.0
+        self.balance_cents = 0
         self.total_points = 0
         self.level = 1
         self.achievements = []
-        self.created_at = datetime.now().isoformat()
+        self.created_us = now_micros()  # Epoch microseconds; see created_at
+        # Deposit streaks, kept current on every deposit
+        self.last_deposit_day = 0  # date ordinal, 0 if never deposited
+        self.deposit_streak_days = 0
+        self.weekly_deposit_streak = 0
+        # Bumped on every stored write, for compare-and-swap saves
+        self.version = 0
         
-    def add_money(self, amount: float) -> bool:
+    @property
+    def balance(self) -> float:
+        """Balance in dollars"""
+        return to_dollars(self.balance_cents)
+    
+    @balance.setter
+    def balance(self, amount: float):
+        self.balance_cents = to_cents(amount)
+    
+    @property
+    def created_at(self) -> datetime:
+        return from_micros(self.created_us)
+    
+    @created_at.setter
+    def created_at(self, moment: datetime):
+        self.created_us = to_micros(moment)
+    
+    def add_money(self, amount: float, at: datetime = None) -> bool:
         """Add money to user's savings"""
-        if amount > 0:
-            self.balance += amount
+        return self.add_cents(to_cents(amount), at)
+    
+    def add_cents(self, cents: Cents, at: datetime = None) -> bool:
+        """Add an amount in cents to user's savings"""
+        if cents > 0:
+            self.balance_cents += cents
+            self._update_streaks(at or datetime.now())
             return True
         return False
     
+    def _update_streaks(self, at: datetime):
+        """Advance the daily and weekly deposit streaks in O(1)"""
+        today = at.date().toordinal()
+        last = self.last_deposit_day
+        if last >= today:
+            return  # Already counted today (or an older backdated deposit)
+        
+        # Ordinal 1 is a Monday, so (ordinal - 1) // 7 numbers ISO weeks
+        this_week, last_week = (today - 1) // 7, (last - 1) // 7
+        self.deposit_streak_days = self.deposit_streak_days + 1 if last and last == today - 1 else 1
+        if not last or this_week > last_week + 1:
+            self.weekly_deposit_streak = 1
+        elif this_week == last_week + 1:
+            self.weekly_deposit_streak += 1
+        self.last_deposit_day = today
+    
     def withdraw_money(self, amount: float) -> bool:
         """Withdraw money from savings"""
-        if amount > 0 and self.balance >= amount:
-            self.balance -= amount
+        return self.withdraw_cents(to_cents(amount))
+    
+    def withdraw_cents(self, cents: Cents) -> bool:
+        """Withdraw an amount in cents from savings"""
+        if cents > 0 and self.balance_cents >= cents:
+            self.balance_cents -= cents
             return True
         return False
     
-    def add_points(self, points: int):
-        """Add points and check for level up"""
+    def add_points(self, points: int) -> int:
+        """Add points, plus the reward of each level they reach, getting how many levels were gained
+
+        Levels never drop when points are taken away, and each level's
+        reward is granted the first time it is reached.
+        """
+        curve = get_curve()
+        start = self.level
         self.total_points += points
-        new_level = self.calculate_level()
-        if new_level > self.level:
-            self.level = new_level
-            return True  # Level up occurred
-        return False
+        level = curve.level_for(self.total_points)
+        while level > self.level:
+            self.total_points += curve.reward_between(self.level, level)  # Rewards can reach further levels
+            self.level = level
+            level = curve.level_for(self.total_points)
+        return self.level - start
     
     def calculate_level(self) -> int:
         """Calculate user level based on points"""
-        return (self.total_points // 100) + 1
+        return get_curve().level_for(self.total_points)
+    
+    def points_to_next_level(self) -> int:
+        """Points still needed to reach the next level"""
+        return max(get_curve().threshold(self.level + 1) - self.total_points, 0)
     
     def add_achievement(self, achievement_id: str):
         """Add achievement to user's collection"""
@@ -53,19 +122,47 @@ class User:
             'user_id': self.user_id,
             'name': self.name,
             'email': self.email,
-            'balance': self.balance,
+            'balance_cents': self.balance_cents,
             'total_points': self.total_points,
             'level': self.level,
             'achievements': self.achievements,
-            'created_at': self.created_at
+            'created_at': format_micros(self.created_us),
+            'last_deposit_day': self.last_deposit_day,
+            'deposit_streak_days': self.deposit_streak_days,
+            'weekly_deposit_streak': self.weekly_deposit_streak,
+            'version': self.version
         }
     
+    def copy(self) -> "User":
+        """Get an independent copy, sharing no mutable state"""
+        user = User.__new__(User)
+        user.user_id = self.user_id
+        user.name = self.name
+        user.email = self.email
+        user.balance_cents = self.balance_cents
+        user.total_points = self.total_points
+        user.level = self.level
+        user.achievements = list(self.achievements)
+        user.created_us = self.created_us
+        user.last_deposit_day = self.last_deposit_day
+        user.deposit_streak_days = self.deposit_streak_days
+        user.weekly_deposit_streak = self.weekly_deposit_streak
+        user.version = self.version
+        return user
+    
     @classmethod
     def from_dict(cls, data: Dict):
-        user = cls(data['name'], data['email'], data['user_id'])
-        user.balance = data['balance']
+        user = cls.__new__(cls)  # Every slot is set below, so skip __init__
+        user.user_id = data['user_id']
+        user.name = data['name']
+        user.email = data['email']
+        user.balance_cents = record_cents(data, 'balance_cents', 'balance')
         user.total_points = data['total_points']
         user.level = data['level']
-        user.achievements = data['achievements']
-        user.created_at = data['created_at']
+        user.achievements = list(data['achievements'])
+        user.created_us = parse_micros(data['created_at'])
+        user.last_deposit_day = data.get('last_deposit_day', 0)
+        user.deposit_streak_days = data.get('deposit_streak_days', 0)
+        user.weekly_deposit_streak = data.get('weekly_deposit_streak', 0)
+        user.version = data.get('version', 0)
         return user
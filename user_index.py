@@ -0,0 +1,64 @@
+# utils/user_index.py
+import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used to match emails: surrounding spaces dropped, lower case"""
+    return email.strip().lower()
+
+
+def format_cursor(created_us: int, user_id: str) -> str:
+    """Opaque page cursor pointing just past a user in created_at order"""
+    return f"{created_us}:{user_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, str]:
+    created, _, user_id = cursor.partition(":")
+    try:
+        return int(created), user_id
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+
+
+class UserIndex:
+    """Users by normalized email, and ordered by (created_at, user_id) for paging
+
+    Each update replaces the user's previous entry, so a changed email stops
+    matching. If two users share an email the latest update owns it. The
+    order is a sorted list: new users sort last, so inserts are appends.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, int]] = ()):
+        """Build from (user_id, email, created_us) updates in the order they were made"""
+        self._entries: Dict[str, Tuple[str, int]] = {}  # user_id -> (normalized email, created_us)
+        for user_id, email, created_us in entries:
+            self._entries.pop(user_id, None)  # Re-inserted last, so email owners follow update order
+            self._entries[user_id] = (normalize_email(email), created_us)
+        self._by_email = {email: user_id for user_id, (email, _) in self._entries.items()}
+        self._by_created = sorted((created_us, user_id) for user_id, (_, created_us) in self._entries.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, user_id: str, email: str, created_us: int):
+        entry = (normalize_email(email), created_us)
+        old = self._entries.get(user_id)
+        if old == entry:
+            return
+        if old is not None:
+            if self._by_email.get(old[0]) == user_id:
+                del self._by_email[old[0]]
+            del self._by_created[bisect.bisect_left(self._by_created, (old[1], user_id))]
+        self._entries[user_id] = entry
+        self._by_email[entry[0]] = user_id
+        bisect.insort(self._by_created, (created_us, user_id))
+
+    def find_email(self, email: str) -> Optional[str]:
+        """Get the id of the user registered with email, in any case"""
+        return self._by_email.get(normalize_email(email))
+
+    def page(self, limit: int, after: Optional[Tuple[int, str]] = None) -> List[Tuple[int, str]]:
+        """Get up to limit (created_us, user_id) keys in order, starting after the key after"""
+        start = bisect.bisect_right(self._by_created, after) if after is not None else 0
+        return self._by_created[start:start + limit]